@@ -0,0 +1,71 @@
+"""Background thread for writing output while the simulation runs."""
+
+
+import queue
+import threading
+from typing import Callable, Optional
+
+
+class BackgroundWriterError(Exception):
+    """Error while writing output in the background"""
+
+
+class BackgroundWriter:
+    """Run write jobs one at a time in a background thread.
+
+    Jobs are run in the order they were submitted. Jobs may read buffers
+    that must not be modified until the job has finished; use `join` to
+    wait for submitted jobs before reusing them.
+
+    Exceptions raised by jobs are re-raised by `join` and `close`. Jobs
+    submitted after a failed job are discarded.
+    """
+
+    def __init__(self) -> None:
+        self._queue = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="BackgroundWriter", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                if self._error is None:
+                    func, args = job
+                    func(*args)
+            except BaseException as e:  # Re-raised in the submitting thread
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise BackgroundWriterError("Background write failed") from self._error
+
+    def submit(self, func: Callable, *args) -> None:
+        """Add a write job to the queue"""
+        if not self._thread.is_alive():
+            raise BackgroundWriterError("Writer is closed")
+        self._raise_error()
+        self._queue.put((func, args))
+
+    def join(self) -> None:
+        """Wait until all submitted jobs have finished"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Finish all submitted jobs and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
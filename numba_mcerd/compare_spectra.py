@@ -0,0 +1,150 @@
+"""Statistical comparison of ERD energy spectra of two runs.
+
+Runs with settings that shouldn't change the physics, such as
+config.FLOAT32_TABLES, follow different trajectories, so their output files
+are not identical. Their spectra should still be statistically compatible:
+
+    python compare_spectra.py float64.101.erd float32.101.erd
+
+Energies of detected recoils (scaling ions are left out) are compared with a
+two-sample Kolmogorov-Smirnov test and a chi-square test of histograms with
+config.HISTOGRAM_ENERGY_BINS binning. Text (.erd, also compressed) and binary
+(.erdb) files are supported.
+"""
+
+import math
+import sys
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from numba_mcerd import config, list_conversion as lc
+
+
+# Spectra are reported as different if a test gives a lower p-value
+SIGNIFICANCE_LEVEL = 0.01
+
+# Bins with fewer expected events are left out of the chi-square test
+MIN_BIN_EVENTS = 5
+
+
+class SpectrumComparison(NamedTuple):
+    """Results of comparing two energy spectra"""
+    counts: Tuple[int, int]
+    means: Tuple[float, float]  # MeV
+    ks_statistic: float
+    ks_p_value: float
+    chi2: float
+    chi2_ndf: int
+    chi2_p_value: float
+
+    @property
+    def compatible(self) -> bool:
+        return min(self.ks_p_value, self.chi2_p_value) >= SIGNIFICANCE_LEVEL
+
+
+def read_erd_energies(file) -> np.ndarray:
+    """Read energies (MeV) of non-scaling events from an ERD output file"""
+    if Path(file).suffix == ".erdb":
+        _, records = lc.read_binary_file(file)
+        return np.asarray(records["E"][records["scale"] != ord("S")], dtype=np.float64)
+
+    energies = []
+    for lines in lc.read_chunks(file):
+        for line in lines:
+            columns = line.split()
+            if not columns or columns[0] == "S":
+                continue
+            # The track ID column is before energy if trackpoints are enabled
+            energies.append(float(columns[3] if len(columns) == 11 else columns[4]))
+    return np.array(energies, dtype=np.float64)
+
+
+def ks_test(a: np.ndarray, b: np.ndarray) -> Tuple[float, float]:
+    """Two-sample Kolmogorov-Smirnov test
+
+    Returns:
+        Maximum distance between the empirical distribution functions and
+        its asymptotic p-value
+    """
+    a = np.sort(a)
+    b = np.sort(b)
+    values = np.concatenate((a, b))
+    cdf_a = np.searchsorted(a, values, side="right") / len(a)
+    cdf_b = np.searchsorted(b, values, side="right") / len(b)
+    d = float(np.max(np.abs(cdf_a - cdf_b)))
+
+    en = math.sqrt(len(a) * len(b) / (len(a) + len(b)))
+    lam = (en + 0.12 + 0.11 / en) * d
+    if lam < 0.2:
+        return d, 1.0  # p rounds to 1 and the series converges slowly
+    p = 2.0 * sum((-1) ** (k - 1) * math.exp(-2.0 * k * k * lam * lam) for k in range(1, 101))
+    return d, min(max(p, 0.0), 1.0)
+
+
+def chi2_test(hist_a: np.ndarray, hist_b: np.ndarray) -> Tuple[float, int, float]:
+    """Chi-square test of two histograms with different total counts
+
+    Returns:
+        Chi-square, degrees of freedom and p-value
+    """
+    n_a = hist_a.sum()
+    n_b = hist_b.sum()
+    used = (hist_a + hist_b) >= MIN_BIN_EVENTS
+    a = hist_a[used]
+    b = hist_b[used]
+
+    chi2 = float(np.sum((math.sqrt(n_b / n_a) * a - math.sqrt(n_a / n_b) * b) ** 2 / (a + b)))
+    ndf = int(used.sum()) - 1
+    if ndf < 1:
+        return chi2, 0, 1.0
+
+    # Wilson-Hilferty approximation of the chi-square distribution
+    k = 2.0 / (9.0 * ndf)
+    z = ((chi2 / ndf) ** (1.0 / 3.0) - (1.0 - k)) / math.sqrt(k)
+    return chi2, ndf, 0.5 * math.erfc(z / math.sqrt(2.0))
+
+
+def compare_energies(a: np.ndarray, b: np.ndarray, bins=config.HISTOGRAM_ENERGY_BINS) -> SpectrumComparison:
+    """Compare two samples of event energies
+
+    Args:
+        a: energies of the reference run (MeV)
+        b: energies of the compared run (MeV)
+        bins: histogram binning as (low edge, high edge, bin count)
+    """
+    edges = np.linspace(*bins[:2], bins[2] + 1)
+    ks_statistic, ks_p_value = ks_test(a, b)
+    chi2, chi2_ndf, chi2_p_value = chi2_test(np.histogram(a, edges)[0], np.histogram(b, edges)[0])
+    return SpectrumComparison(
+        counts=(len(a), len(b)),
+        means=(float(a.mean()), float(b.mean())),
+        ks_statistic=ks_statistic,
+        ks_p_value=ks_p_value,
+        chi2=chi2,
+        chi2_ndf=chi2_ndf,
+        chi2_p_value=chi2_p_value)
+
+
+def format_comparison(result: SpectrumComparison) -> str:
+    return "\n".join([
+        f"events: {result.counts[0]} / {result.counts[1]}",
+        f"mean energy: {result.means[0]:.4f} / {result.means[1]:.4f} MeV",
+        f"KS: D={result.ks_statistic:.5f} p={result.ks_p_value:.3f}",
+        f"chi2: {result.chi2:.1f} / {result.chi2_ndf} p={result.chi2_p_value:.3f}",
+        "Spectra are compatible" if result.compatible else "Spectra differ"])
+
+
+def main(args):
+    """Compare ERD spectrum of file args[2] to that of file args[1]"""
+    if len(args) != 3:
+        print(f"Usage: {args[0]} <reference ERD file> <ERD file>")
+        return 2
+    result = compare_energies(read_erd_energies(args[1]), read_erd_energies(args[2]))
+    print(format_comparison(result))
+    return 0 if result.compatible else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -4,12 +4,13 @@ from pathlib import Path
 # For Numba, import random_jit.py directly.
 import numba_mcerd.mcerd.random_numpy as rand
 
-PROJECT_ROOT = str(Path.cwd().parent)  # Automatic path
+PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)  # Automatic path
 # PROJECT_ROOT = r"C:/path/to/numba_mcerd"  # Manual path
 DATA_ROOT = rf"{PROJECT_ROOT}/data"
 CONSTANTS_ROOT = rf"{DATA_ROOT}/constants"
 EXPORT_ROOT = rf"{DATA_ROOT}/export"
 PICKLE_ROOT = rf"{DATA_ROOT}/pickled"
+CACHE_ROOT = rf"{DATA_ROOT}/cache"
 
 # Choose if pickled objects should be used instead of recalculating them.
 # Objects must be generated once before using. See pickler.py for more information.
@@ -17,10 +18,94 @@ LOAD_PICKLE = False
 
 # TODO: Add DUMP_PICKLE for more granularity
 
+# Choose if JIBAL element and isotope tables are loaded from a binary cache in
+# CACHE_ROOT. The cache is built on first use and rebuilt if the constants
+# files change.
+JIBAL_CACHE = True
+
+# Choose the seed number of the random number generator. If set to None, the
+# seed number of the input file is used.
+SEED = None
+
 # Choose how many threads to use in parallel mode.
 # Must be between 1 and NUMBA_NUM_THREADS. If set to None, Numba defaults are used.
 PARALLEL_THREAD_COUNT = None
 
+# Choose how many ions are simulated per batch in parallel mode. Output of
+# the previous batch is written in a background thread while the next batch
+# is simulated, so output buffers only need to hold one batch. main_jit.py
+# only writes trackpoints after each batch.
+# If set to None, all ions are simulated in a single batch.
+OUTPUT_BATCH_SIZE = 100_000
+
+# Choose how many characters of run log output (.out, .dat and .pre files) are
+# collected per file before writing them in the JIT versions.
+RUN_LOG_BUFFER_SIZE = 1 << 20
+
+# Choose if ion directions are transported as direction cosines (unit vectors)
+# instead of angles. This avoids most trigonometric functions in multiple
+# scattering, but results are not bit-identical to angle-based transport.
+# Only supported by the JIT versions.
+DIRECTION_COSINES = False
+
+# Choose if the scattering angle, cross section and stopping power tables are
+# stored as float32 instead of float64. The tables are interpolated from
+# coarse grids, so float32 precision is enough, and the tables take half the
+# memory bandwidth. Positions and energies are still calculated in float64,
+# but results are not bit-identical. Spectra can be compared to a float64 run
+# with compare_spectra.py.
+# Only supported by the JIT versions.
+FLOAT32_TABLES = False
+
+# Choose the format of ERD output: "text" for the original .erd text file or
+# "binary" for a .erdb file of structured NumPy records. Binary files can be
+# converted to the text format with list_conversion.py.
+# "mmap" (main_jit_mt.py only) writes a .erdb file of float64 records through
+# a memory map directly from the simulation threads, so output doesn't need to
+# fit in memory. Event order depends on thread timing.
+# Only supported by the JIT versions.
+OUTPUT_FORMAT = "text"
+
+# Choose compression of .erd, .range and .pre text files: "gz", "xz", "bz2"
+# or None. The compression suffix is added to the file names. Compressed files
+# can be read in chunks with list_conversion.read_chunks().
+# Only supported by the JIT versions.
+OUTPUT_COMPRESSION = None
+
+# Choose if ERD output is accumulated into histograms instead of being
+# written event by event. ERD events are weighted by ion weight and binned
+# into ToF vs energy and depth vs energy histograms. Histograms are written to
+# a .hist.npz file and the .erd and .range files are left empty.
+# Only supported by main_jit_mt.py.
+OUTPUT_HISTOGRAMS = False
+
+# Choose how many stopped or transmitted ion events are kept in a range
+# output buffer (per thread and batch in parallel mode), so that memory use
+# doesn't grow with the number of ions. Events are independent, so the kept
+# events are a random sample of all events. Dropped events are counted and
+# logged, and every event is included in the range histograms written to a
+# .range.npz file. If set to None, buffers are large enough for all events
+# and the .range file is complete, as in the original MCERD.
+# Only affects the JIT versions.
+RANGE_BUFFER_SIZE = 100_000
+
+# Histogram binning as (low edge, high edge, bin count), also used for range histograms.
+# Energies are in MeV, times of flight in ns and depths in nm.
+HISTOGRAM_ENERGY_BINS = (0.0, 20.0, 400)
+HISTOGRAM_TOF_BINS = (0.0, 200.0, 400)
+HISTOGRAM_DEPTH_BINS = (0.0, 1000.0, 500)
+
+# Trackpoint output is enabled with "Trackpoint output: true" in the input
+# file, before the detector description file. Tracks of 1 in
+# TRACKPOINT_SAMPLING primary ions and their recoils are recorded to a binary
+# .trackb file. Track IDs are (primary ion index + 1) * 10000 + recoil number.
+# Points are thinned by energy loss as set by the TRACKPOINT_* constants.
+# TRACKPOINT_BUFFER_SIZE points are kept per batch (and thread in parallel
+# mode) before writing; the oldest points are dropped if it fills up.
+# Only supported by the JIT versions.
+TRACKPOINT_SAMPLING = 1000
+TRACKPOINT_BUFFER_SIZE = 100_000
+
 # Set arguments here.
 # mcerd.exe is unused but included for similarity with original MCERD.
 MAIN_ARGS = ["mcerd.exe", rf"{PROJECT_ROOT}/data/input/O-Default"]
@@ -1,11 +1,22 @@
 """Utilities for working around the lack of I/O in Numba."""
 
 
+import bz2
+import functools
+import gzip
+import json
+import lzma
+import re
+import struct
+import sys
 from enum import IntEnum
-from typing import Any
+from pathlib import Path
+from typing import IO, Any, Iterator, List, Tuple
 
 import numba as nb
+import numpy as np
 
+from numba_mcerd import config
 from numba_mcerd.mcerd import objects_dtype as od
 
 
@@ -28,25 +39,340 @@ def from_float(type_int: int, value: float) -> Any:
     return _conversion_map[type_int](value)
 
 
+# Python format specs that give the same result with printf-style formatting.
+# "-" is left out on purpose, it means left alignment in printf-style.
+_printf_compatible = re.compile(r"[+ 0]?\d*(\.\d+)?[deEf]")
+
+# Vectorized chr() for STR columns
+_chr_table = np.array([chr(i) for i in range(256)], dtype=object)
+
+# Number of rows formatted and written at once
+FORMAT_CHUNK_SIZE = 100_000
+
+
+def _convert_column(values: np.ndarray, type_int: int, fmt: str) -> Tuple[str, list]:
+    """Convert a float-coded column once for the whole buffer.
+
+    Returns:
+        printf-style conversion specifier for the column and column values
+    """
+    if type_int == TypeInt.STR.value:
+        converted = _chr_table[values.astype(np.int64)]
+    elif type_int == TypeInt.INT.value:
+        converted = values.astype(np.int64)  # Truncates like int()
+    else:
+        converted = values
+
+    if type_int == TypeInt.STR.value and fmt == "":
+        return "%s", converted.tolist()
+    if type_int != TypeInt.STR.value and _printf_compatible.fullmatch(fmt):
+        return f"%{fmt}", converted.tolist()
+    # Fall back to format() for anything else
+    return "%s", [format(value, fmt) for value in converted.tolist()]
+
+
+def format_rows(rows: np.ndarray, types: np.ndarray, formats: np.ndarray) -> Iterator[str]:
+    """Format float-coded rows into text, column by column.
+
+    Yields:
+        Text for up to FORMAT_CHUNK_SIZE lines at a time
+    """
+    for start in range(0, len(rows), FORMAT_CHUNK_SIZE):
+        chunk = rows[start:start + FORMAT_CHUNK_SIZE]
+
+        specifiers, columns = zip(*(
+            _convert_column(chunk[:, i], int(types[i]), str(formats[i])) for i in range(len(types))))
+        template = " ".join(specifiers) + "\n"
+
+        yield "".join([template % row for row in zip(*columns)])
+
+
+# Compressed output files are selected by suffix
+_compressed_openers = {
+    ".gz": functools.partial(gzip.open, compresslevel=6),  # Default level 9 is much slower for little gain
+    ".xz": lzma.open,
+    ".bz2": bz2.open
+}
+
+
+def add_compression_suffix(file: str) -> str:
+    """Add suffix of compression selected in config to output file name"""
+    if config.OUTPUT_COMPRESSION is None:
+        return file
+    suffix = f".{config.OUTPUT_COMPRESSION}"
+    if suffix not in _compressed_openers:
+        raise ValueError(f"Unknown output compression: {config.OUTPUT_COMPRESSION}")
+    return file + suffix
+
+
+def remove_compression_suffix(file) -> Path:
+    """Remove compression suffix from output file name, if it has one"""
+    path = Path(file)
+    if path.suffix in _compressed_openers:
+        return path.with_suffix("")
+    return path
+
+
+def open_text(file, mode: str = "r") -> IO[str]:
+    """Open a text file, compressed or not depending on its suffix.
+
+    Compressed files can be appended to. Each append adds a new stream to
+    the file, which is read back as if it was one stream.
+    """
+    path = Path(file)
+    opener = _compressed_openers.get(path.suffix)
+    if opener is None:
+        return path.open(mode)
+    return opener(path, mode + "t")
+
+
+def read_chunks(file, chunk_size: int = FORMAT_CHUNK_SIZE) -> Iterator[List[str]]:
+    """Read lines of a text output file in chunks of at most chunk_size lines.
+
+    Compressed files are decompressed while reading, so the whole file is
+    never in memory.
+    """
+    with open_text(file) as f:
+        while True:
+            lines = [line for _, line in zip(range(chunk_size), f)]
+            if not lines:
+                return
+            yield lines
+
+
+def encode_strings(strings: List[str], length: int) -> np.ndarray:
+    """Encode ASCII strings as rows of zero-padded character codes"""
+    codes = np.zeros((len(strings), length), dtype=np.uint8)
+    for i, string in enumerate(strings):
+        encoded = string.encode("ascii")
+        if len(encoded) > length:
+            raise ValueError(f"'{string}' is longer than {length} characters")
+        codes[i, :len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+    return codes
+
+
+def decode_strings(codes: np.ndarray) -> List[str]:
+    """Decode rows of zero-padded character codes to strings"""
+    return [bytes(row).rstrip(b"\0").decode("ascii") for row in codes]
+
+
+def set_columns(buf: od.Buffer, types: List[int], formats: List[str], names: List[str]) -> None:
+    """Set types, format specs and names of buffer columns"""
+    buf["types"] = types
+    buf["formats"] = encode_strings(formats, buf["formats"].shape[-1])
+    buf["names"] = encode_strings(names, buf["names"].shape[-1])
+
+
 def buffer_to_file(buf: od.Buffer, file) -> None:
     """Format and append buffer contents to file."""
-    lines = []
-    types = buf["types"]
-    formats = buf["formats"]
-    length = len(buf["types"])
+    with open_text(file, "a") as f:
+        for text in format_rows(buf["buf"][:buf["row_i"]], buf["types"], decode_strings(buf["formats"])):
+            f.write(text)
+
+
+class BinaryFileError(Exception):
+    """Error in binary output file"""
+
+
+BINARY_MAGIC = b"MCERDBIN"
+BINARY_VERSION = 1
+
+# Floats are kept as float64, so that the text can be reproduced exactly
+_binary_types = {
+    TypeInt.FLOAT.value: "<f8",
+    TypeInt.INT.value: "<i4",
+    TypeInt.STR.value: "u1"
+}
+
+
+def _get_column_names(buf: od.Buffer) -> List[str]:
+    return [name if name else f"col{i}" for i, name in enumerate(decode_strings(buf["names"]))]
+
+
+def get_binary_dtype(buf: od.Buffer) -> np.dtype:
+    """Create a structured dtype for the rows of buffer"""
+    return np.dtype([(name, _binary_types[type_int])
+                     for name, type_int in zip(_get_column_names(buf), buf["types"])])
+
+
+def buffer_to_records(buf: od.Buffer) -> np.ndarray:
+    """Convert filled buffer rows to a structured array"""
+    dtype = get_binary_dtype(buf)
+    rows = buf["buf"][:buf["row_i"]]
 
-    for row in buf["buf"][:buf["row_i"]]:
-        converted = (from_float(types[i], row[i]) for i in range(length))
-        formatted = (format(val, formats[i]) for i, val in enumerate(converted))
+    records = np.empty(len(rows), dtype=dtype)
+    for i, name in enumerate(dtype.names):
+        records[name] = rows[:, i]
 
-        # Single-line versions:
-        # formatted = (format(_conversion_map[types[i]](row[i]), formats[i]) for i in range(length))
-        # formatted = (format(from_float(types[i], row[i]), formats[i]) for i in range(length))
+    return records
 
-        lines.append(" ".join(formatted) + "\n")
 
-    with open(file, "a") as f:
-        f.writelines(lines)
+def _create_binary_header(buf: od.Buffer, run_info: dict, storage_dtype: str = None) -> bytes:
+    columns = [{"name": name, "type": int(type_int), "format": str(fmt)}
+               for name, type_int, fmt in zip(_get_column_names(buf), buf["types"], decode_strings(buf["formats"]))]
+    if storage_dtype is not None:
+        for column in columns:
+            column["dtype"] = storage_dtype
+    header = {
+        "version": BINARY_VERSION,
+        "columns": columns,
+        "run": run_info if run_info is not None else {}
+    }
+
+    return _pack_header(BINARY_MAGIC, header)
+
+
+def _pack_header(magic: bytes, header: dict) -> bytes:
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    # Pad with whitespace so that records start at an aligned offset
+    prefix_length = len(magic) + struct.calcsize("<I")
+    header_bytes += b" " * (-(prefix_length + len(header_bytes)) % 8)
+
+    return magic + struct.pack("<I", len(header_bytes)) + header_bytes
+
+
+def _unpack_header(data: bytes, magic: bytes, file) -> Tuple[dict, int]:
+    """Unpack header from file contents and return it with the offset of records"""
+    if data[:len(magic)] != magic:
+        raise BinaryFileError(f"Not a {magic.decode()} file: {file}")
+    offset = len(magic)
+    (header_length,) = struct.unpack_from("<I", data, offset)
+    offset += struct.calcsize("<I")
+    header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+    offset += header_length
+
+    if header["version"] != BINARY_VERSION:
+        raise BinaryFileError(f"Unsupported binary file version {header['version']}")
+
+    return header, offset
+
+
+def buffer_to_binary_file(buf: od.Buffer, file, run_info: dict = None) -> None:
+    """Append buffer contents to a binary file with a single write.
+
+    The header is written first if the file is empty. Buffers appended
+    to the same file must have the same columns.
+
+    Args:
+        buf: buffer to write
+        file: file to append to
+        run_info: run configuration to store in the header
+    """
+    records = buffer_to_records(buf)
+
+    with open(file, "ab") as f:
+        if f.tell() == 0:
+            f.write(_create_binary_header(buf, run_info))
+        f.write(records.tobytes())
+
+
+def read_binary_file(file) -> Tuple[dict, np.ndarray]:
+    """Read header and records from a binary file"""
+    data = Path(file).read_bytes()
+    header, offset = _unpack_header(data, BINARY_MAGIC, file)
+
+    # Columns may have an explicit storage dtype (event files)
+    dtype = np.dtype([(col["name"], col.get("dtype", _binary_types[col["type"]])) for col in header["columns"]])
+    records = np.frombuffer(data, dtype=dtype, offset=offset)
+
+    return header, records
+
+
+TRACK_MAGIC = b"MCERDTRK"
+
+
+def trackpoints_to_binary_file(points: np.ndarray, file, run_info: dict = None) -> None:
+    """Append trackpoint records to a binary track file.
+
+    The header is written first if the file is empty. It stores the dtype
+    of the records, so that they can be read without knowing the layout.
+    """
+    with open(file, "ab") as f:
+        if f.tell() == 0:
+            header = {
+                "version": BINARY_VERSION,
+                "dtype": [[name, points.dtype.fields[name][0].str, points.dtype.fields[name][1]]
+                          for name in points.dtype.names],
+                "itemsize": points.dtype.itemsize,
+                "run": run_info if run_info is not None else {}
+            }
+            f.write(_pack_header(TRACK_MAGIC, header))
+        f.write(points.tobytes())
+
+
+def read_track_file(file) -> Tuple[dict, np.ndarray]:
+    """Read header and trackpoint records from a binary track file"""
+    data = Path(file).read_bytes()
+    header, offset = _unpack_header(data, TRACK_MAGIC, file)
+
+    names, formats, offsets = zip(*header["dtype"])
+    dtype = np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": header["itemsize"]})
+    points = np.frombuffer(data, dtype=dtype, offset=offset)
+
+    return header, points
+
+
+class EventFile:
+    """Binary output file written in place through a memory map.
+
+    The file has the same format as buffer_to_binary_file output, but all
+    columns are stored as float64 so that rows can be copied from buffers
+    as they are. Space for `capacity` rows is allocated up front (sparsely,
+    if the file system allows it). Threads reserve rows by atomically
+    incrementing `cursor[0]`, see output_jit.output_erd_event. Rows
+    reserved beyond capacity are dropped.
+    """
+
+    def __init__(self, buf: od.Buffer, file, capacity: int, run_info: dict = None) -> None:
+        self.file = Path(file)
+        header = _create_binary_header(buf, run_info, storage_dtype="<f8")
+        self.header_length = len(header)
+        self.width = buf["buf"].shape[1]
+        self.capacity = capacity
+
+        with self.file.open("wb") as f:
+            f.write(header)
+            f.truncate(self.header_length + capacity * self.width * 8)
+        self._memmap = np.memmap(self.file, dtype=np.float64, mode="r+", offset=self.header_length,
+                                 shape=(capacity, self.width))
+
+        self.rows = self._memmap.view(np.ndarray)  # Plain array for Numba
+        self.cursor = np.zeros(1, dtype=np.int64)
+
+    @property
+    def row_count(self) -> int:
+        """Number of rows written"""
+        return min(int(self.cursor[0]), self.capacity)
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of rows that did not fit in the file"""
+        return max(int(self.cursor[0]) - self.capacity, 0)
+
+    def close(self) -> None:
+        """Flush written rows and truncate unused space from the file"""
+        if self._memmap is None:
+            return
+        self._memmap.flush()
+        self.rows = None
+        self._memmap = None  # Memory map must be closed before truncating on some platforms
+        with self.file.open("r+b") as f:
+            f.truncate(self.header_length + self.row_count * self.width * 8)
+
+
+def binary_to_text(binary_file, text_file) -> None:
+    """Convert a binary output file to the legacy text format"""
+    header, records = read_binary_file(binary_file)
+    columns = header["columns"]
+
+    types = np.array([col["type"] for col in columns])
+    formats = np.array([col["format"] for col in columns])
+    rows = np.column_stack([records[col["name"]].astype(np.float64) for col in columns])
+
+    with open_text(text_file, "w") as f:
+        for text in format_rows(rows, types, formats):
+            f.write(text)
 
 
 @nb.njit(cache=True, nogil=True)
@@ -57,3 +383,16 @@ def set_buf(buf: od.Buffer, value: float) -> None:
     """
     buf["buf"][buf["row_i"], buf["col_i"]] = value
     buf["col_i"] += 1
+
+
+def main(args):
+    """Convert binary output file args[1] to text file args[2]"""
+    if len(args) != 3:
+        print(f"Usage: {args[0]} <binary file> <text file>")
+        return 2
+    binary_to_text(args[1], args[2])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
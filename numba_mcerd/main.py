@@ -3,7 +3,7 @@ import logging
 
 import numpy as np
 
-from numba_mcerd import config, pickler, timer
+from numba_mcerd import config, manifest, pickler, timer
 from numba_mcerd.mcerd import (
     cross_section,
     debug,
@@ -51,6 +51,10 @@ def setup_logging():
 
 def main(args):
     # Misc setup
+    if config.OUTPUT_FORMAT != "text" or config.OUTPUT_COMPRESSION is not None:
+        # Checked before init_io creates the output files
+        raise NotImplementedError("Binary, memory-mapped and compressed output are only supported by the JIT versions")
+
     setup_logging()
 
     # Variables
@@ -90,6 +94,7 @@ def main(args):
 
     logging.info("Initializing input files")
     read_input.read_input(g, primary_ion, secondary_ion, previous_trackpoint_ion, target, detector)
+    run_manifest = manifest.RunManifest("main", args[1])
 
     if g.nions == 2:
         ions = [primary_ion, secondary_ion]
@@ -130,6 +135,7 @@ def main(args):
         pickler.dump(scat, "scat")
 
         print(f"table_timer: {table_timer}")
+        run_manifest.add_stage("table", table_timer)
         # Times (03f95b0559f2c0eea3d92eb34eb8a37306a39231)
         # print(table_timer.start_time, table_timer.elapsed_laps)
         # 1.8580092 [4.2860329, 28.060028000000003] (run)
@@ -171,6 +177,7 @@ def main(args):
 
     initialization_timer.stop()
     print(f"initialization_timer: {initialization_timer}")
+    run_manifest.add_stage("initialization", initialization_timer)
 
     logging.info("Starting simulation")
 
@@ -178,23 +185,30 @@ def main(args):
     trackid, ion_i, new_track = simulation_loop(g, ions, target, scat, snext, detector, trackid, ion_i, new_track)
     presimu_timer.stop()
     print(f"presimu_timer: {presimu_timer}")
+    run_manifest.add_stage("presimu", presimu_timer, g.npresimu)
 
     analysis_timer = timer.SplitTimer.init_and_start()
     pre_simulation.analyze_presimulation(g, target, detector)
     init_params.init_recoiling_angle(target)
     analysis_timer.stop()
     print(f"analysis_timer: {analysis_timer}")
+    run_manifest.add_stage("analysis", analysis_timer)
 
     main_simu_timer = timer.SplitTimer.init_and_start()
     simulation_loop(g, ions, target, scat, snext, detector, trackid, ion_i, new_track)
     main_simu_timer.stop()
     print(f"main_sim_timer: {main_simu_timer}")
+    run_manifest.add_stage("main_simu", main_simu_timer, g.nsimu - g.npresimu)
 
     print_timer = timer.SplitTimer.init_and_start()
     finalize.finalize(g)
     print(g.finstat)
     print_timer.stop()
     print(f"print_timer: {print_timer}")
+    run_manifest.add_stage("print", print_timer)
+
+    run_manifest.set_results(g)
+    run_manifest.write(manifest.get_manifest_path(g.master.fpout))
 
 
 def simulation_loop(g, ions, target, scat, snext, detector,
@@ -5,8 +5,9 @@ import logging
 import numba as nb
 import numpy as np
 
-from numba_mcerd import config, timer, patch_numba, logging_jit, list_conversion
+from numba_mcerd import config, manifest, run_log, timer, patch_numba, logging_jit, list_conversion
 from numba_mcerd.mcerd import (
+    counters_jit,
     cross_section_jit,
     elsto,
     enums,
@@ -57,6 +58,10 @@ def setup_logging():
 def main(args):
     # Misc setup
 
+    if config.OUTPUT_FORMAT == "mmap":
+        # Checked before init_io creates the output files
+        raise NotImplementedError("Memory-mapped output is only supported by main_jit_mt.py")
+
     setup_logging()
     patch_numba.patch_nested_array()
 
@@ -98,6 +103,7 @@ def main(args):
 
     logging.info("Initializing input files")
     read_input.read_input(g_o, primary_ion_o, secondary_ion_o, previous_trackpoint_ion_o, target_o, detector_o)
+    run_manifest = manifest.RunManifest("main_cuda", args[1])
 
     # TODO: read_input needlessly seeds built-in random
     # TODO: Non-JIT modules may use random_vanilla, how to fix this without
@@ -113,6 +119,7 @@ def main(args):
 
     logging.info("Initializing output files")
     init_params.init_io(g_o, primary_ion_o, target_o)
+    log = run_log.RunLog()  # .out, .dat and .pre output
 
     pot = potential_jit.make_screening_table_dtype()
 
@@ -130,13 +137,14 @@ def main(args):
         ions_o[i].scatindex = i
         scat_o.append([o.Scattering() for _ in range(c.MAXELEMENTS)])
         for j in range(target_o.natoms):
-            init_simu_jit.scattering_table(g_o, ions_o[i], target_o, scat_o[i][j], pot, j)
+            init_simu_jit.scattering_table(g_o, ions_o[i], target_o, scat_o[i][j], pot, j, log)
             cross_section_jit.calc_cross_sections(g_o, scat_o[i][j], pot)
 
     del pot
 
     table_timer.stop()
     print(f"table_timer: {table_timer}")
+    run_manifest.add_stage("table", table_timer)
 
     gsto_index = -1
     for j in range(target_o.nlayers):
@@ -162,6 +170,7 @@ def main(args):
 
     initialization_timer.stop()
     print(f"initialization_timer: {initialization_timer}")
+    run_manifest.add_stage("initialization", initialization_timer)
 
     for ion in ions_o:
         ion.status = enums.IonStatus.NOT_FINISHED
@@ -177,7 +186,7 @@ def main(args):
     master = ocd.convert_master(g_o)
     g = ocd.convert_global(g_o)
     del g_o
-    ions = np.array([ocd.convert_ion(ion) for ion in ions_o])
+    ions = ocd.convert_ions(ions_o, detector_o)
     for ion in ions_o:
         del ion
     del ions_o
@@ -192,6 +201,8 @@ def main(args):
 
     erd_buf = output_jit.create_erd_buffer(g)
     range_buf = finish_ion_jit.create_range_buffer(g)
+    counters_arr = counters_jit.create_counters(1)
+    counters = counters_arr[0]
 
     # TODO: Kernel config should be in config
     blocks_per_grid = 1
@@ -202,40 +213,54 @@ def main(args):
 
     dtype_conversion_timer.stop()
     print(f"dtype_conversion_timer: {dtype_conversion_timer}")
+    run_manifest.add_stage("dtype_conversion", dtype_conversion_timer)
 
     presimu_timer = timer.SplitTimer.init_and_start()
     trackid, ion_i, new_track = simulation_loop(
-        g, presimus, master, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf, range_buf,
-        kernel_config, rng_states)
+        g, counters, presimus, master, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf,
+        range_buf, kernel_config, rng_states)
     presimu_timer.stop()
     print(f"presimu_timer: {presimu_timer}")
+    run_manifest.add_stage("presimu", presimu_timer, g.npresimu)
 
     return  # TODO: Remove once the main loop is done
 
+    counters_jit.store_counters(g, counters_arr)
+
     analysis_timer = timer.SplitTimer.init_and_start()
-    pre_simulation_jit.analyze_presimulation(g, presimus, master, target, detector)
+    pre_simulation_jit.analyze_presimulation(g, presimus, master, target, detector, log)
     init_params_jit.init_recoiling_angle(target)
     analysis_timer.stop()
     print(f"analysis_timer: {analysis_timer}")
+    run_manifest.add_stage("analysis", analysis_timer)
 
     main_simu_timer = timer.SplitTimer.init_and_start()
     simulation_loop(
-        g, presimus, master, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf, range_buf,
-        kernel_config, rng_states)
+        g, counters, presimus, master, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf,
+        range_buf, kernel_config, rng_states)
     main_simu_timer.stop()
     print(f"main_sim_timer: {main_simu_timer}")
+    run_manifest.add_stage("main_simu", main_simu_timer, g.nsimu - g.npresimu)
+
+    counters_jit.store_counters(g, counters_arr)
 
     print_timer = timer.SplitTimer.init_and_start()
-    list_conversion.buffer_to_file(erd_buf, master["fperd"])
+    output_jit.write_erd_buffer(g, erd_buf, master["fperd"])
     list_conversion.buffer_to_file(range_buf, master["fprange"])
-    finalize_jit.finalize(g, master)
+    finish_ion_jit.write_range_stats(range_buf, finish_ion_jit.get_range_stats_path(master["fprange"]))
+    finalize_jit.finalize(g, master, log)
+    log.close()
     print(g.finstat)
     print_timer.stop()
     print(f"print_timer: {print_timer}")
+    run_manifest.add_stage("print", print_timer)
+
+    run_manifest.set_results(g)
+    run_manifest.write(manifest.get_manifest_path(master["fpout"]))
 
 
 # @nb.njit(cache=True, nogil=True)  # TODO: Add back later, if possible
-def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
+def simulation_loop(g, counters, presimus, master, ions, target, scat, snext, detector,
                     trackid, ion_i, new_track, erd_buf, range_buf, kernel_config, rng_states):
     # logging_jit.info("Starting simulation")
 
@@ -251,13 +276,13 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
         if i % 10000 == 0:
             print(i)
 
-        g.cion = i  # TODO: Replace/remove for MT
+        counters.cion = i
 
         # output.output_data(g)  # Only prints status info
 
         cur_ion = ions[PRIMARY]
 
-        ion_simu_jit.create_ion(g, cur_ion, target)
+        ion_simu_jit.create_ion(g, counters, cur_ion, target)
         if g.rough:
             ion_simu_jit.move_target(target)
 
@@ -273,7 +298,7 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
     #
     #         if cur_ion.status == enums.IonStatus.FIN_RECOIL or cur_ion.status == enums.IonStatus.FIN_OUT_DET:
     #             if g.simstage == enums.SimStage.PRE:
-    #                 pre_simulation_jit.finish_presimulation(g, presimus, detector, cur_ion)
+    #                 pre_simulation_jit.finish_presimulation(g, counters, presimus, detector, cur_ion)
     #                 cur_ion = ions[PRIMARY]
     #             else:
     #                 erd_detector_jit.move_to_erd_detector(g, cur_ion, target, detector)
@@ -314,7 +339,7 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
     #             raise NotImplementedError
     #
     #         if cur_ion.type == SECONDARY and cur_ion.status != enums.IonStatus.NOT_FINISHED:
-    #             g.finstat[SECONDARY, cur_ion.status] += 1
+    #             counters.finstat[SECONDARY, cur_ion.status] += 1
     #
     #         while ion_simu_jit.ion_finished(g, cur_ion, target):
     #             # logging_jit.debug(...)
@@ -339,7 +364,7 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
 
         # logging_jit.debug(...)
 
-        g.finstat[PRIMARY, cur_ion.status] += 1
+        counters.finstat[PRIMARY, cur_ion.status] += 1
         finish_ion_jit.finish_ion(g, cur_ion, range_buf)  # Output info if FIN_STOP or FIN_TRANS
 
     return trackid, ion_i, new_track
@@ -1,10 +1,13 @@
 import logging
+import tempfile
+from pathlib import Path
 
 import numba as nb
 import numpy as np
 
-from numba_mcerd import config, timer, patch_numba, logging_jit, list_conversion
+from numba_mcerd import config, manifest, run_log, timer, patch_numba, logging_jit, list_conversion
 from numba_mcerd.mcerd import (
+    counters_jit,
     cross_section_jit,
     elsto,
     enums,
@@ -28,6 +31,7 @@ from numba_mcerd.mcerd import (
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects as o
 import numba_mcerd.mcerd.objects_convert_dtype as ocd
+import numba_mcerd.mcerd.objects_dtype as od
 
 
 # These are too annoying to type
@@ -52,9 +56,14 @@ def setup_logging():
                         format=logging_format, datefmt=date_format)
 
 
-def main(args):
+def main(args, warmup=False):
+    """Run the simulation, or only compile the simulation loop if warmup is True"""
     # Misc setup
 
+    if config.OUTPUT_FORMAT == "mmap":
+        # Checked before init_io creates the output files
+        raise NotImplementedError("Memory-mapped output is only supported by main_jit_mt.py")
+
     setup_logging()
     patch_numba.patch_nested_array()
 
@@ -96,6 +105,7 @@ def main(args):
 
     logging.info("Initializing input files")
     read_input.read_input(g_o, primary_ion_o, secondary_ion_o, previous_trackpoint_ion_o, target_o, detector_o)
+    run_manifest = manifest.RunManifest("main_jit", args[1])
 
     # TODO: read_input needlessly seeds built-in random
     # TODO: Non-JIT modules may use random_vanilla, how to fix this without
@@ -110,7 +120,13 @@ def main(args):
         raise NotImplementedError
 
     logging.info("Initializing output files")
-    init_params.init_io(g_o, primary_ion_o, target_o)
+    if warmup:
+        # Outputs of earlier runs are kept. Types of JIT functions don't depend on output paths.
+        warmup_dir = tempfile.TemporaryDirectory()
+        init_params.init_io(g_o, primary_ion_o, target_o, Path(warmup_dir.name) / Path(args[1]).name)
+    else:
+        init_params.init_io(g_o, primary_ion_o, target_o)
+    log = run_log.RunLog()  # .out, .dat and .pre output
 
     pot = potential_jit.make_screening_table_dtype()
 
@@ -128,13 +144,14 @@ def main(args):
         ions_o[i].scatindex = i
         scat_o.append([o.Scattering() for _ in range(c.MAXELEMENTS)])
         for j in range(target_o.natoms):
-            init_simu_jit.scattering_table(g_o, ions_o[i], target_o, scat_o[i][j], pot, j)
+            init_simu_jit.scattering_table(g_o, ions_o[i], target_o, scat_o[i][j], pot, j, log)
             cross_section_jit.calc_cross_sections(g_o, scat_o[i][j], pot)
 
     del pot
 
     table_timer.stop()
     print(f"table_timer: {table_timer}")
+    run_manifest.add_stage("table", table_timer)
 
     gsto_index = -1
     for j in range(target_o.nlayers):
@@ -160,6 +177,7 @@ def main(args):
 
     initialization_timer.stop()
     print(f"initialization_timer: {initialization_timer}")
+    run_manifest.add_stage("initialization", initialization_timer)
 
     for ion in ions_o:
         ion.status = enums.IonStatus.NOT_FINISHED
@@ -175,7 +193,7 @@ def main(args):
     master = ocd.convert_master(g_o)
     g = ocd.convert_global(g_o)
     del g_o
-    ions = np.array([ocd.convert_ion(ion) for ion in ions_o])
+    ions = ocd.convert_ions(ions_o, detector_o)
     for ion in ions_o:
         del ion
     del ions_o
@@ -190,61 +208,93 @@ def main(args):
 
     erd_buf = output_jit.create_erd_buffer(g)
     range_buf = finish_ion_jit.create_range_buffer(g)
+    track_buf = output_jit.create_track_buffer(g)
+    counters_arr = counters_jit.create_counters(1)
+    counters = counters_arr[0]
 
     dtype_conversion_timer.stop()
     print(f"dtype_conversion_timer: {dtype_conversion_timer}")
+    print(od.format_record_sizes({
+        "g": g, "counters": counters_arr, "ions": ions, "snext": snext, "presimus": presimus, "erd_buf": erd_buf,
+        "range_buf": range_buf, "track_buf": track_buf, "target": target, "scat": scat, "detector": detector}))
+    run_manifest.add_stage("dtype_conversion", dtype_conversion_timer)
+
+    if warmup:
+        simulation_loop(
+            g, counters, presimus, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf,
+            range_buf, track_buf, 0, 0)  # Compiles without simulating ions
+        log.close()
+        warmup_dir.cleanup()
+        return
 
     presimu_timer = timer.SplitTimer.init_and_start()
     trackid, ion_i, new_track = simulation_loop(
-        g, presimus, master, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf, range_buf)
+        g, counters, presimus, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf,
+        range_buf, track_buf, 0, g.npresimu)
     presimu_timer.stop()
     print(f"presimu_timer: {presimu_timer}")
+    run_manifest.add_stage("presimu", presimu_timer, g.npresimu)
+
+    counters_jit.store_counters(g, counters_arr)
 
     analysis_timer = timer.SplitTimer.init_and_start()
-    pre_simulation_jit.analyze_presimulation(g, presimus, master, target, detector)
+    pre_simulation_jit.analyze_presimulation(g, presimus, master, target, detector, log)
     init_params_jit.init_recoiling_angle(target)
     analysis_timer.stop()
     print(f"analysis_timer: {analysis_timer}")
+    run_manifest.add_stage("analysis", analysis_timer)
 
     main_simu_timer = timer.SplitTimer.init_and_start()
-    simulation_loop(g, presimus, master, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf, range_buf)
+    # Trackpoints are written after each batch so that the ring buffer only needs to hold one batch
+    batch_size = config.OUTPUT_BATCH_SIZE or g.nsimu
+    for batch_start in range(g.npresimu, g.nsimu, batch_size):
+        batch_stop = min(batch_start + batch_size, g.nsimu)
+        trackid, ion_i, new_track = simulation_loop(
+            g, counters, presimus, ions, target, scat, snext, detector, trackid, ion_i, new_track, erd_buf,
+            range_buf, track_buf, batch_start, batch_stop)
+        if g.output_trackpoints:
+            output_jit.write_track_buffer(g, track_buf, output_jit.get_track_path(master["fptrack"]))
     main_simu_timer.stop()
     print(f"main_sim_timer: {main_simu_timer}")
+    run_manifest.add_stage("main_simu", main_simu_timer, g.nsimu - g.npresimu)
+
+    counters_jit.store_counters(g, counters_arr)
 
     print_timer = timer.SplitTimer.init_and_start()
-    list_conversion.buffer_to_file(erd_buf, master["fperd"])
+    output_jit.write_erd_buffer(g, erd_buf, master["fperd"])
     list_conversion.buffer_to_file(range_buf, master["fprange"])
-    finalize_jit.finalize(g, master)
+    finish_ion_jit.write_range_stats(range_buf, finish_ion_jit.get_range_stats_path(master["fprange"]))
+    finalize_jit.finalize(g, master, log)
+    log.close()
     print(g.finstat)
     print_timer.stop()
     print(f"print_timer: {print_timer}")
+    run_manifest.add_stage("print", print_timer)
+
+    run_manifest.set_results(g)
+    run_manifest.write(manifest.get_manifest_path(master["fpout"]))
 
 
 @nb.njit(cache=True, nogil=True)
-def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
-                    trackid, ion_i, new_track, erd_buf, range_buf):
+def simulation_loop(g, counters, presimus, ions, target, scat, snext, detector,
+                    trackid, ion_i, new_track, erd_buf, range_buf, track_buf, start, stop):
     # logging_jit.info("Starting simulation")
 
-    if g.simstage == enums.SimStage.PRE:
-        start = 0
-        stop = g.npresimu
-    else:
-        start = g.npresimu
-        stop = g.nsimu
-
     for i in range(start, stop):
         if i % 10000 == 0:
             print(i)
 
-        g.cion = i  # TODO: Replace/remove for MT
+        counters.cion = i
 
         # output.output_data(g)  # Only prints status info
 
         cur_ion = ions[PRIMARY]
 
-        ion_simu_jit.create_ion(g, cur_ion, target)
+        ion_simu_jit.create_ion(g, counters, cur_ion, target)
         if g.rough:
             ion_simu_jit.move_target(target)
+        if g.output_trackpoints:
+            output_jit.start_track(g, counters, cur_ion, target, track_buf)
 
         primary_finished = False
         while not primary_finished:
@@ -255,10 +305,12 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
                 if erd_scattering_jit.erd_scattering(
                         g, ions[PRIMARY], ions[SECONDARY], target, detector):
                     cur_ion = ions[SECONDARY]
+                    if g.output_trackpoints:
+                        output_jit.start_track(g, counters, cur_ion, target, track_buf)
 
             if cur_ion.status == enums.IonStatus.FIN_RECOIL or cur_ion.status == enums.IonStatus.FIN_OUT_DET:
                 if g.simstage == enums.SimStage.PRE:
-                    pre_simulation_jit.finish_presimulation(g, presimus, detector, cur_ion)
+                    pre_simulation_jit.finish_presimulation(g, counters, presimus, detector, cur_ion)
                     cur_ion = ions[PRIMARY]
                 else:
                     erd_detector_jit.move_to_erd_detector(g, cur_ion, target, detector)
@@ -267,7 +319,7 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
                     and cur_ion.status == enums.IonStatus.NOT_FINISHED
                     and not g.nomc):
                 if ion_simu_jit.mc_scattering(
-                        g, cur_ion, ions[SECONDARY], target, detector, scat, snext):  # ion_stack.next_ion()
+                        g, counters, cur_ion, ions[SECONDARY], target, detector, scat, snext):  # ion_stack.next_ion()
                     # This block is never reached in ERD mode
                     cur_ion = ions[SECONDARY]  # ion_stack.next_ion()
                     found = False
@@ -296,21 +348,22 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
             # debug: loop over layers, print cur_ion.tlayer and set prev_layer_debug
 
             if g.output_trackpoints:
-                raise NotImplementedError
+                output_jit.output_trackpoint(g, counters, cur_ion, target, track_buf, False)
 
             if cur_ion.type == SECONDARY and cur_ion.status != enums.IonStatus.NOT_FINISHED:
-                g.finstat[SECONDARY, cur_ion.status] += 1
+                counters.finstat[SECONDARY, cur_ion.status] += 1
 
             while ion_simu_jit.ion_finished(g, cur_ion, target):
                 # logging_jit.debug(...)
 
-                if g.output_trackpoints:
-                    raise NotImplementedError
-
                 cur_ion.trackid = trackid if not new_track else 0
                 # No new track is made if ion doesn't make it to the
                 # energy detector or if it's a scaling ion
 
+                if g.output_trackpoints:
+                    output_jit.output_trackpoint(g, counters, cur_ion, target, track_buf, True)
+                    cur_ion.trackid = output_jit.get_trackid(g, counters, cur_ion, track_buf)
+
                 if cur_ion.type <= SECONDARY:
                     output_jit.output_erd(g, cur_ion, target, detector, erd_buf)
                 if cur_ion.type == PRIMARY:
@@ -322,7 +375,7 @@ def simulation_loop(g, presimus, master, ions, target, scat, snext, detector,
 
         # logging_jit.debug(...)
 
-        g.finstat[PRIMARY, cur_ion.status] += 1
+        counters.finstat[PRIMARY, cur_ion.status] += 1
         finish_ion_jit.finish_ion(g, cur_ion, range_buf)  # Output info if FIN_STOP or FIN_TRANS
 
     return trackid, ion_i, new_track
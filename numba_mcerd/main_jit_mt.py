@@ -1,11 +1,13 @@
-import copy
 import logging
+import tempfile
+from pathlib import Path
 
 import numba as nb
 import numpy as np
 
-from numba_mcerd import config, timer, patch_numba, logging_jit, list_conversion, threading_info
+from numba_mcerd import background_writer, config, manifest, run_log, timer, patch_numba, logging_jit, list_conversion, threading_info
 from numba_mcerd.mcerd import (
+    counters_jit,
     cross_section_jit,
     elsto,
     enums,
@@ -13,6 +15,7 @@ from numba_mcerd.mcerd import (
     erd_scattering_jit,
     finalize_jit,
     finish_ion_jit,
+    histogram_jit,
     init_detector,
     init_params,
     init_params_jit,
@@ -29,6 +32,7 @@ from numba_mcerd.mcerd import (
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects as o
 import numba_mcerd.mcerd.objects_convert_dtype as ocd
+import numba_mcerd.mcerd.objects_dtype as od
 
 
 # These are too annoying to type
@@ -53,7 +57,8 @@ def setup_logging():
                         format=logging_format, datefmt=date_format)
 
 
-def main(args):
+def main(args, warmup=False):
+    """Run the simulation, or only compile the simulation loop if warmup is True"""
     # Misc setup
 
     setup_logging()
@@ -100,6 +105,7 @@ def main(args):
 
     logging.info("Initializing input files")
     read_input.read_input(g_o, primary_ion_o, secondary_ion_o, previous_trackpoint_ion_o, target_o, detector_o)
+    run_manifest = manifest.RunManifest("main_jit_mt", args[1])
 
     # TODO: read_input needlessly seeds built-in random
     # TODO: Non-JIT modules may use random_vanilla, how to fix this without
@@ -114,7 +120,13 @@ def main(args):
         raise NotImplementedError
 
     logging.info("Initializing output files")
-    init_params.init_io(g_o, primary_ion_o, target_o)
+    if warmup:
+        # Outputs of earlier runs are kept. Types of JIT functions don't depend on output paths.
+        warmup_dir = tempfile.TemporaryDirectory()
+        init_params.init_io(g_o, primary_ion_o, target_o, Path(warmup_dir.name) / Path(args[1]).name)
+    else:
+        init_params.init_io(g_o, primary_ion_o, target_o)
+    log = run_log.RunLog()  # .out, .dat and .pre output
 
     pot = potential_jit.make_screening_table_dtype()
 
@@ -132,13 +144,14 @@ def main(args):
         ions_o[i].scatindex = i
         scat_o.append([o.Scattering() for _ in range(c.MAXELEMENTS)])
         for j in range(target_o.natoms):
-            init_simu_jit.scattering_table(g_o, ions_o[i], target_o, scat_o[i][j], pot, j)
+            init_simu_jit.scattering_table(g_o, ions_o[i], target_o, scat_o[i][j], pot, j, log)
             cross_section_jit.calc_cross_sections(g_o, scat_o[i][j], pot)
 
     del pot
 
     table_timer.stop()
     print(f"table_timer: {table_timer}")
+    run_manifest.add_stage("table", table_timer)
 
     gsto_index = -1
     for j in range(target_o.nlayers):
@@ -164,6 +177,7 @@ def main(args):
 
     initialization_timer.stop()
     print(f"initialization_timer: {initialization_timer}")
+    run_manifest.add_stage("initialization", initialization_timer)
 
     for ion in ions_o:
         ion.status = enums.IonStatus.NOT_FINISHED
@@ -179,7 +193,7 @@ def main(args):
     master = ocd.convert_master(g_o)
     g = ocd.convert_global(g_o)
     del g_o
-    ions = np.array([ocd.convert_ion(ion) for ion in ions_o])
+    ions = ocd.convert_ions(ions_o, detector_o)
     for ion in ions_o:
         del ion
     del ions_o
@@ -195,157 +209,253 @@ def main(args):
     # Arrays for multithreading
 
     thread_count = threading_info.get_thread_count()
+    run_manifest.thread_count = thread_count
     # The multiplier is a bit bigger to account for variance in smaller runs
     # TODO: Make the multiplier a constant/configurable
     thread_overallocation = (1 / thread_count) * 1.2
-    thread_offset = min(threading_info.get_thread_ids())  # Also checks if thread IDs are continuous
-
-    erd_buf = output_jit.create_erd_buffer(g, additional_multiplier=thread_overallocation)
-    range_buf = finish_ion_jit.create_range_buffer(g, additional_multiplier=thread_overallocation)
-
-    # TODO: Would explicit dtype be useful?
-    g_arr = np.array([copy.deepcopy(g) for _ in range(thread_count)])
-    ions_arr = np.array([copy.deepcopy(ions) for _ in range(thread_count)])
-    snext_arr = np.array([copy.deepcopy(snext) for _ in range(thread_count)])
-    erd_buf_arr = np.array([copy.deepcopy(erd_buf) for _ in range(thread_count)])
-    range_buf_arr = np.array([copy.deepcopy(range_buf) for _ in range(thread_count)])
-
-    split_presimus = presimus[:int(presimus.shape[0] / thread_count)]  # round down
-    presimus_arr = np.array([copy.deepcopy(split_presimus) for _ in range(thread_count)])
 
-    # Read-only objects wrapped in an array
-    target_wrap = np.array([target])
-    scat_wrap = np.array([scat])
-    detector_wrap = np.array([detector])
+    if config.OUTPUT_HISTOGRAMS:
+        output_mode = enums.OutputMode.HISTOGRAM
+    elif config.OUTPUT_FORMAT == "mmap":
+        output_mode = enums.OutputMode.EVENT_FILE
+    else:
+        output_mode = enums.OutputMode.BUFFER
+
+    if output_mode == enums.OutputMode.HISTOGRAM:
+        # Events are not buffered, so there is nothing to write in batches
+        batch_size = g.nsimu
+        batch_multiplier = 0.0
+        hist = histogram_jit.create_histograms(
+            config.HISTOGRAM_ENERGY_BINS, config.HISTOGRAM_TOF_BINS, config.HISTOGRAM_DEPTH_BINS)
+    else:
+        # Buffers only need to hold one batch
+        batch_size = config.OUTPUT_BATCH_SIZE or g.nsimu
+        batch_multiplier = min(batch_size, g.nsimu) / g.nsimu * thread_overallocation
+        hist = histogram_jit.create_histograms((0.0, 1.0, 1), (0.0, 1.0, 1), (0.0, 1.0, 1))  # Unused
+
+    if output_mode == enums.OutputMode.EVENT_FILE:
+        # Each event is formatted in the first row of the buffer and then copied to the event file
+        erd_buf = output_jit.create_erd_buffer(g, length=1)
+        # Primary ions make at most one recoil. The file is allocated sparsely if possible.
+        event_file = output_jit.create_event_file(g, master["fperd"], g.nsimu)
+        event_rows = event_file.rows
+        event_cursor = event_file.cursor
+    else:
+        erd_buf = output_jit.create_erd_buffer(g, additional_multiplier=batch_multiplier)
+        event_file = None
+        event_rows = np.zeros((0, erd_buf["buf"].shape[1]))  # Unused
+        event_cursor = np.zeros(1, dtype=np.int64)  # Unused
+    range_buf = finish_ion_jit.create_range_buffer(g, additional_multiplier=batch_multiplier)
+    track_buf = output_jit.create_track_buffer(g)
+
+    counters_arr = counters_jit.create_counters(thread_count)
+    ions_arr = replicate(ions, thread_count)
+    snext_arr = replicate(snext, thread_count)
+    # Two sets of output buffers: one is filled while the other is written
+    buffer_sets = [
+        (replicate(erd_buf, thread_count), replicate(range_buf, thread_count), replicate(track_buf, thread_count))
+        for _ in range(2)]
+    hist_arr = replicate(hist, thread_count)
+    del erd_buf
+    del range_buf
+    del track_buf
+    del hist
+
+    # Each thread simulates a slot of the presimulation ions, see simulation_loop
+    split_presimus = presimus[:threading_info.get_slot_length(thread_count, presimus.shape[0])]
+    presimus_arr = replicate(split_presimus, thread_count)
+
+    # Objects that are read-only in the simulation loop are shared by all
+    # threads. g and target are updated between stages through the views.
+    shared = threading_info.share_records({"g": g, "target": target, "scat": scat, "detector": detector})
+    g = shared["g"][0]
+    target = shared["target"][0]
+    scat = shared["scat"][0]
+    detector = shared["detector"][0]
 
     dtype_conversion_timer.stop()
     print(f"dtype_conversion_timer: {dtype_conversion_timer}")
+    print(od.format_record_sizes({
+        "g": g, "counters": counters_arr, "ions": ions_arr, "snext": snext_arr, "presimus": presimus_arr,
+        "hist": hist_arr, "erd_buf": buffer_sets[0][0], "range_buf": buffer_sets[0][1],
+        "track_buf": buffer_sets[0][2], "target": target, "scat": scat, "detector": detector}))
+    run_manifest.add_stage("dtype_conversion", dtype_conversion_timer)
+
+    writer = background_writer.BackgroundWriter()
+
+    def simulate_batch(start, stop, erd_buf_arr, range_buf_arr, track_buf_arr):
+        simulation_loop(
+            shared["g"], counters_arr, presimus_arr, ions_arr, shared["target"], shared["scat"], snext_arr,
+            shared["detector"], trackid, ion_i, new_track, erd_buf_arr, range_buf_arr, hist_arr, event_rows,
+            event_cursor, output_mode, track_buf_arr, start, stop)
+
+    if warmup:
+        simulate_batch(0, 0, *buffer_sets[0])  # Compiles without simulating ions
+        writer.close()
+        if event_file is not None:
+            del event_rows
+            event_file.close()
+        log.close()
+        warmup_dir.cleanup()
+        return
 
     presimu_timer = timer.SplitTimer.init_and_start()
-    trackid, ion_i, new_track = simulation_loop(
-        g, thread_offset, g_arr, presimus_arr, master, ions_arr, target_wrap, scat_wrap, snext_arr,
-        detector_wrap, trackid, ion_i, new_track, erd_buf_arr, range_buf_arr)
+    run_batches(g, master, writer, buffer_sets, 0, g.npresimu, batch_size, simulate_batch)
     presimu_timer.stop()
     print(f"presimu_timer: {presimu_timer}")
+    run_manifest.add_stage("presimu", presimu_timer, g.npresimu)
 
-    combine_presimus(g, g_arr, presimus, presimus_arr)
-    combine_g(g, g_arr)
+    combine_presimus(presimus, presimus_arr, counters_arr)
+    counters_jit.store_counters(g, counters_arr)
 
     analysis_timer = timer.SplitTimer.init_and_start()
-    pre_simulation_jit.analyze_presimulation(g, presimus, master, target, detector)
+    pre_simulation_jit.analyze_presimulation(g, presimus, master, target, detector, log)
     init_params_jit.init_recoiling_angle(target)
     analysis_timer.stop()
     print(f"analysis_timer: {analysis_timer}")
-
-    g_arr["simstage"] = enums.SimStage.REAL
-
-    # Re-wrap to copy changes
-    target_wrap = np.array([target])
-    # scat_wrap = np.array([scat])  # Doesn't change
-    # detector_wrap = np.array([detector])  # Doesn't change
+    run_manifest.add_stage("analysis", analysis_timer)
 
     main_simu_timer = timer.SplitTimer.init_and_start()
-    simulation_loop(
-        g, thread_offset, g_arr, presimus_arr, master, ions_arr, target_wrap, scat_wrap, snext_arr,
-        detector_wrap, trackid, ion_i, new_track, erd_buf_arr, range_buf_arr)
+    run_batches(g, master, writer, buffer_sets, g.npresimu, g.nsimu, batch_size, simulate_batch)
     main_simu_timer.stop()
     print(f"main_sim_timer: {main_simu_timer}")
+    run_manifest.add_stage("main_simu", main_simu_timer, g.nsimu - g.npresimu)
 
-    combine_g(g, g_arr)
+    counters_jit.store_counters(g, counters_arr)
 
     print_timer = timer.SplitTimer.init_and_start()
-    for buf in erd_buf_arr:
-        list_conversion.buffer_to_file(buf, master["fperd"])
-    for buf in range_buf_arr:
-        list_conversion.buffer_to_file(buf, master["fprange"])
-    finalize_jit.finalize(g, master)
+    writer.close()  # Only the last batch is still being written
+    if event_file is not None:
+        del event_rows
+        event_file.close()
+        if event_file.dropped_count:
+            logging.warning(f"{event_file.dropped_count} events did not fit in the event file")
+    range_bufs = np.concatenate([range_buf_arr for _, range_buf_arr, _ in buffer_sets])
+    finish_ion_jit.write_range_stats(
+        finish_ion_jit.combine_range_stats(range_bufs), finish_ion_jit.get_range_stats_path(master["fprange"]))
+    if output_mode == enums.OutputMode.HISTOGRAM:
+        hist_file = list_conversion.remove_compression_suffix(master["fprange"]).with_suffix(".hist.npz")
+        histogram_jit.write_histograms(histogram_jit.combine_histograms(hist_arr), hist_file)
+    finalize_jit.finalize(g, master, log)
+    log.close()
     print(g.finstat)
     print_timer.stop()
     print(f"print_timer: {print_timer}")
+    run_manifest.add_stage("print", print_timer)
 
-
-def combine_presimus(g_main, g_arr, presimus, presimus_arr):
-    threads = g_arr.shape[0]
-
-    i = 0
-    for thread_index in range(threads):
-        g = g_arr[thread_index]
-        presimu = presimus_arr[thread_index]
-
-        presimus[i:i + g.cpresimu] = presimu[:g.cpresimu]
-        i += g.cpresimu
+    run_manifest.set_results(g)
+    run_manifest.write(manifest.get_manifest_path(master["fpout"]))
 
 
-def combine_g(g_main, g_arr):
-    g_main.cion = max(g_arr["cion"])
+def replicate(obj, count: int) -> np.ndarray:
+    """Create an array of count copies of a record or an array of records.
 
-    g_main.finstat[:] = 0
-    g_main.nmc = 0
-    g_main.cpresimu = 0
+    The copies are filled with one broadcast assignment, and have the same
+    dtype as obj so that JIT functions get the same types.
+    """
+    obj = np.asarray(obj)
+    copies = np.empty((count,) + obj.shape, dtype=obj.dtype)
+    copies[...] = obj
+    return copies
 
-    for g in g_arr:
-        g_main.finstat += g.finstat
-        g_main.nmc += g.nmc
-        g_main.cpresimu += g.cpresimu
 
+def write_buffers(g, master, erd_buf_arr, range_buf_arr, track_buf_arr):
+    """Write per-thread output buffers to files and empty them"""
+    for buf in erd_buf_arr:
+        output_jit.write_erd_buffer(g, buf, master["fperd"])
+    for buf in range_buf_arr:
+        list_conversion.buffer_to_file(buf, master["fprange"])
+    if g.output_trackpoints:
+        for buf in track_buf_arr:
+            output_jit.write_track_buffer(g, buf, output_jit.get_track_path(master["fptrack"]))
+    erd_buf_arr["row_i"] = 0
+    range_buf_arr["row_i"] = 0
+
+
+def run_batches(g, master, writer, buffer_sets, start, stop, batch_size, simulate_batch):
+    """Simulate ions from start to stop in batches.
+
+    Output of each batch is written by the background writer while the
+    next batch is simulated into the other set of buffers. Writes submitted
+    before the call are waited for first, because they may still be using
+    either set.
+
+    Args:
+        g: global settings
+        master: output files
+        writer: background writer
+        buffer_sets: two (erd_buf_arr, range_buf_arr, track_buf_arr) tuples
+        start: index of the first ion
+        stop: index after the last ion
+        batch_size: maximum number of ions per batch
+        simulate_batch: function that simulates ions from its start to its
+            stop argument into the given buffers
+    """
+    writer.join()  # Buffers may still be written from the previous call
+    for batch_i, batch_start in enumerate(range(start, stop, batch_size)):
+        batch_stop = min(batch_start + batch_size, stop)
+        buffers = buffer_sets[batch_i % 2]
+        print(batch_start)
+        simulate_batch(batch_start, batch_stop, *buffers)
+        writer.join()  # Buffers of the previous batch are free after this
+        writer.submit(write_buffers, g, master, *buffers)
 
-@nb.njit(cache=True, nogil=True)
-def update_finstat(g, index, cur_ion):
-    """Update g.finstat
 
-    Workaround for
-    g.finstat[SECONDARY, cur_ion.status] += 1
-    not working in Numba parallel mode.
-    """
-    g.finstat[index, cur_ion.status] += 1
+def combine_presimus(presimus, presimus_arr, counters_arr):
+    i = 0
+    for presimu, counters in zip(presimus_arr, counters_arr):
+        presimus[i:i + counters.cpresimu] = presimu[:counters.cpresimu]
+        i += counters.cpresimu
 
 
 @nb.njit(cache=True, parallel=True, nogil=True)
-def simulation_loop(g_main, thread_offset, g_arr, presimus_arr, master, ions_arr, target_wrap, scat_wrap, snext_arr,
-                    detector_wrap, trackid, ion_i, new_track, erd_buf_arr, range_buf_arr):
+def simulation_loop(g_shared, counters_arr, presimus_arr, ions_arr, target_shared, scat_shared, snext_arr,
+                    detector_shared, trackid, ion_i, new_track, erd_buf_arr, range_buf_arr, hist_arr, event_rows,
+                    event_cursor, output_mode, track_buf_arr, start, stop):
     # logging_jit.info("Starting simulation")
 
-    if g_main.simstage == enums.SimStage.PRE:
-        start = 0
-        stop = g_main.npresimu
-    else:
-        start = g_main.npresimu
-        stop = g_main.nsimu
-
-    for i in nb.prange(start, stop):
-        # TODO: Only track one thread or figure out per-thread progress.
-        #   The current prints are out of order
-        if i % 10000 == 0:
-            print(i)
-
-        thread_index = threading_info.get_thread_id() - thread_offset
-        g = g_arr[thread_index]
-        ions = ions_arr[thread_index]
-        snext = snext_arr[thread_index]
-        erd_buf = erd_buf_arr[thread_index]
-        range_buf = range_buf_arr[thread_index]
-        presimus = presimus_arr[thread_index]
-
-        target = target_wrap[0]
-        scat = scat_wrap[0]
-        detector = detector_wrap[0]
-
-        g.cion = i
-
-        inner_simulation_loop(g, ions, snext, erd_buf, range_buf, presimus, target, scat, detector)
+    # Each slot has its own objects and simulates a contiguous part of the ions
+    slot_count = counters_arr.shape[0]
+    for slot in nb.prange(slot_count):
+        counters = counters_arr[slot]
+        ions = ions_arr[slot]
+        snext = snext_arr[slot]
+        erd_buf = erd_buf_arr[slot]
+        range_buf = range_buf_arr[slot]
+        hist = hist_arr[slot]
+        track_buf = track_buf_arr[slot]
+        presimus = presimus_arr[slot]
+
+        g = g_shared[0]
+        target = target_shared[0]
+        scat = scat_shared[0]
+        detector = detector_shared[0]
+
+        slot_start, slot_stop = threading_info.get_slot_range(slot, slot_count, start, stop)
+        for i in range(slot_start, slot_stop):
+            # No progress prints here: printing in a cached parallel loop
+            # deadlocks when the loop is loaded from the cache. Progress is
+            # printed per batch in run_batches.
+            counters.cion = i
+
+            inner_simulation_loop(g, counters, ions, snext, erd_buf, range_buf, hist, event_rows, event_cursor,
+                                  output_mode, track_buf, presimus, target, scat, detector)
 
     return trackid, ion_i, new_track
 
 
 @nb.njit(cache=True, nogil=True)
-def inner_simulation_loop(g, ions, snext, erd_buf, range_buf, presimus, target, scat, detector):
+def inner_simulation_loop(g, counters, ions, snext, erd_buf, range_buf, hist, event_rows, event_cursor,
+                          output_mode, track_buf, presimus, target, scat, detector):
     # output.output_data(g)  # Only prints status info
 
     cur_ion = ions[PRIMARY]
 
-    ion_simu_jit.create_ion(g, cur_ion, target)
+    ion_simu_jit.create_ion(g, counters, cur_ion, target)
     if g.rough:
         ion_simu_jit.move_target(target)
+    if g.output_trackpoints:
+        output_jit.start_track(g, counters, cur_ion, target, track_buf)
 
     primary_finished = False
     while not primary_finished:
@@ -356,10 +466,12 @@ def inner_simulation_loop(g, ions, snext, erd_buf, range_buf, presimus, target,
             if erd_scattering_jit.erd_scattering(
                     g, ions[PRIMARY], ions[SECONDARY], target, detector):
                 cur_ion = ions[SECONDARY]
+                if g.output_trackpoints:
+                    output_jit.start_track(g, counters, cur_ion, target, track_buf)
 
         if cur_ion.status == enums.IonStatus.FIN_RECOIL or cur_ion.status == enums.IonStatus.FIN_OUT_DET:
             if g.simstage == enums.SimStage.PRE:
-                pre_simulation_jit.finish_presimulation(g, presimus, detector, cur_ion)
+                pre_simulation_jit.finish_presimulation(g, counters, presimus, detector, cur_ion)
                 cur_ion = ions[PRIMARY]
             else:
                 erd_detector_jit.move_to_erd_detector(g, cur_ion, target, detector)
@@ -368,7 +480,7 @@ def inner_simulation_loop(g, ions, snext, erd_buf, range_buf, presimus, target,
                 and cur_ion.status == enums.IonStatus.NOT_FINISHED
                 and not g.nomc):
             if ion_simu_jit.mc_scattering(
-                    g, cur_ion, ions[SECONDARY], target, detector, scat, snext):  # ion_stack.next_ion()
+                    g, counters, cur_ion, ions[SECONDARY], target, detector, scat, snext):  # ion_stack.next_ion()
                 # This block is never reached in ERD mode
                 cur_ion = ions[SECONDARY]  # ion_stack.next_ion()
                 found = False
@@ -401,24 +513,30 @@ def inner_simulation_loop(g, ions, snext, erd_buf, range_buf, presimus, target,
 
         # debug: loop over layers, print cur_ion.tlayer and set prev_layer_debug
 
-        #     if g.output_trackpoints:
-        #         raise NotImplementedError
+        if g.output_trackpoints:
+            output_jit.output_trackpoint(g, counters, cur_ion, target, track_buf, False)
 
         if cur_ion.type == SECONDARY and cur_ion.status != enums.IonStatus.NOT_FINISHED:
-            update_finstat(g, SECONDARY, cur_ion)
+            counters.finstat[SECONDARY, cur_ion.status] += 1
 
         while ion_simu_jit.ion_finished(g, cur_ion, target):
             # logging_jit.debug(...)
 
-            # if g.output_trackpoints:
-            #     raise NotImplementedError
+            if g.output_trackpoints:
+                output_jit.output_trackpoint(g, counters, cur_ion, target, track_buf, True)
+                cur_ion.trackid = output_jit.get_trackid(g, counters, cur_ion, track_buf)
 
             # cur_ion.trackid = trackid if not new_track else 0
             # # No new track is made if ion doesn't make it to the
             # # energy detector or if it's a scaling ion
 
             if cur_ion.type <= SECONDARY:
-                output_jit.output_erd(g, cur_ion, target, detector, erd_buf)
+                if output_mode == enums.OutputMode.HISTOGRAM:
+                    output_jit.histogram_erd(g, cur_ion, target, detector, hist)
+                elif output_mode == enums.OutputMode.EVENT_FILE:
+                    output_jit.output_erd_event(g, cur_ion, target, detector, erd_buf, event_rows, event_cursor)
+                else:
+                    output_jit.output_erd(g, cur_ion, target, detector, erd_buf)
             if cur_ion.type == PRIMARY:
                 primary_finished = True
                 break
@@ -428,7 +546,7 @@ def inner_simulation_loop(g, ions, snext, erd_buf, range_buf, presimus, target,
 
     # logging_jit.debug(...)
 
-    update_finstat(g, PRIMARY, cur_ion)
+    counters.finstat[PRIMARY, cur_ion.status] += 1
     finish_ion_jit.finish_ion(g, cur_ion, range_buf)  # Output info if FIN_STOP or FIN_TRANS
 
 
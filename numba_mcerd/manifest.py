@@ -0,0 +1,247 @@
+"""Run manifests with timings and results for comparing runs.
+
+Each run writes a JSON manifest next to its output files. Manifests can be
+compared from the command line to find performance regressions:
+
+    python manifest.py base.manifest.json new.manifest.json
+"""
+
+import datetime
+import hashlib
+import json
+import platform
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import numba as nb
+import numpy as np
+
+from numba_mcerd import config, timer
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+MANIFEST_VERSION = 1
+
+# Relative slowdown of a stage that is reported as a regression
+REGRESSION_THRESHOLD = 0.1
+
+
+def hash_file(file) -> str:
+    """Get SHA-256 hash of file contents"""
+    sha = hashlib.sha256()
+    with Path(file).open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def find_input_files(command_file) -> List[Path]:
+    """Find the command file and the files it refers to.
+
+    Files referred to by the found files (e.g. detector foils) are included
+    too. Lines with '*' in the key are disabled settings and skipped.
+    """
+    files = []
+    pending = [Path(command_file)]
+    while pending:
+        file = pending.pop(0)
+        if file in files:
+            continue
+        files.append(file)
+        for line in file.read_text(errors="replace").splitlines():
+            key, sep, value = line.partition(":")
+            words = value.split()
+            if not sep or "*" in key or not words:
+                continue
+            path = Path(words[0])
+            if path.is_file():
+                pending.append(path)
+
+    return files
+
+
+def get_config_values() -> dict:
+    """Get settings of config module, with non-JSON values as strings"""
+    values = {}
+    for name in sorted(dir(config)):
+        if not name.isupper():
+            continue
+        value = getattr(config, name)
+        try:
+            json.dumps(value)
+        except TypeError:
+            value = repr(value)
+        values[name] = value
+    return values
+
+
+def get_config_hash() -> str:
+    """Get SHA-256 hash of config settings"""
+    return hashlib.sha256(json.dumps(get_config_values(), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_peak_rss() -> Optional[int]:
+    """Get peak resident set size of the process in bytes, or None if unknown"""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_rss  # Already bytes on macOS
+    return peak_rss * 1024
+
+
+class RunManifest:
+    """Collect information about a run into a JSON manifest"""
+
+    def __init__(self, engine: str, command_file, thread_count: int = 1) -> None:
+        """Initialize manifest and hash input files
+
+        Args:
+            engine: name of the main module, e.g. "main_jit_mt"
+            command_file: path of MCERD command file
+            thread_count: number of simulation threads
+        """
+        self.engine = engine
+        self.thread_count = thread_count
+        self.started = datetime.datetime.now().astimezone().isoformat(timespec="seconds")
+        self.input_files = {str(file): hash_file(file) for file in find_input_files(command_file)}
+        self.stages = {}
+        self.results = {}
+
+    def add_stage(self, name: str, stage_timer: timer.Timer, ions: int = None) -> None:
+        """Add elapsed time of a stage and its throughput if ions are given"""
+        elapsed = stage_timer.elapsed
+        stage = {"elapsed": elapsed}
+        if ions is not None:
+            stage["ions"] = int(ions)
+            stage["ions_per_s"] = ions / elapsed if elapsed > 0.0 else None
+        self.stages[name] = stage
+
+    def set_results(self, g) -> None:
+        """Set simulation results from global settings"""
+        self.results = {
+            "finstat": np.asarray(g.finstat).tolist(),
+            "nmc": int(g.nmc)
+        }
+
+    def to_dict(self) -> dict:
+        """Get manifest contents"""
+        return {
+            "version": MANIFEST_VERSION,
+            "engine": self.engine,
+            "started": self.started,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "numba": nb.__version__,
+            "thread_count": self.thread_count,
+            "input_files": self.input_files,
+            "config_hash": get_config_hash(),
+            "config": get_config_values(),
+            "stages": self.stages,
+            "results": self.results,
+            "peak_rss": get_peak_rss()
+        }
+
+    def write(self, file) -> None:
+        """Write manifest to a JSON file"""
+        Path(file).write_text(json.dumps(self.to_dict(), indent=2))
+
+
+def get_manifest_path(out_file) -> Path:
+    """Get path of manifest file that corresponds to .out file"""
+    return Path(out_file).with_suffix(".manifest.json")
+
+
+def read_manifest(file) -> dict:
+    """Read manifest from a JSON file"""
+    return json.loads(Path(file).read_text())
+
+
+def find_regressions(base: dict, other: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Find stages that are slower in other manifest than in base manifest
+
+    Args:
+        base: reference manifest
+        other: manifest to check
+        threshold: relative slowdown that is reported
+
+    Returns:
+        Descriptions of regressions
+    """
+    regressions = []
+    for name, stage in other["stages"].items():
+        base_stage = base["stages"].get(name)
+        if base_stage is None or base_stage["elapsed"] <= 0.0:
+            continue
+        change = stage["elapsed"] / base_stage["elapsed"] - 1.0
+        if change > threshold:
+            regressions.append(
+                f"{name}: {base_stage['elapsed']:.3f} s -> {stage['elapsed']:.3f} s ({change:+.1%})")
+    return regressions
+
+
+def format_comparison(manifests: List[dict], names: List[str]) -> str:
+    """Format stage times and throughputs of manifests as a table"""
+    stage_names = list(dict.fromkeys(name for m in manifests for name in m["stages"]))
+    lines = [f"[{i}] {name}" for i, name in enumerate(names)]
+    lines.append(f"{'stage':<18}" + "".join(f"{f'[{i}]':>26}" for i in range(len(names))))
+    for stage_name in stage_names:
+        cells = []
+        for m in manifests:
+            stage = m["stages"].get(stage_name)
+            if stage is None:
+                cells.append("-")
+            elif stage.get("ions_per_s"):
+                cells.append(f"{stage['elapsed']:.3f} s {stage['ions_per_s']:.0f} ions/s")
+            else:
+                cells.append(f"{stage['elapsed']:.3f} s")
+        lines.append(f"{stage_name:<18}" + "".join(f"{cell:>26}" for cell in cells))
+
+    peak_rss = (m["peak_rss"] for m in manifests)
+    lines.append(f"{'peak_rss':<18}" + "".join(
+        f"{'-' if rss is None else f'{rss / 2**20:.0f} MiB':>26}" for rss in peak_rss))
+
+    return "\n".join(lines)
+
+
+def compare_manifests(files: list, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Print comparison of manifest files against the first one
+
+    Returns:
+        Descriptions of regressions and differences in inputs or results
+    """
+    manifests = [read_manifest(file) for file in files]
+    print(format_comparison(manifests, [str(file) for file in files]))
+
+    base = manifests[0]
+    problems = []
+    for file, m in zip(files[1:], manifests[1:]):
+        same_run = (m["input_files"] == base["input_files"] and m["config_hash"] == base["config_hash"]
+                    and m["thread_count"] == base["thread_count"])
+        if not same_run:
+            print(f"{file}: different input files, config or thread count, timings may not be comparable")
+        elif m["results"] != base["results"]:
+            problems.append(f"{file}: results differ")
+        problems.extend(f"{file}: {regression}" for regression in find_regressions(base, m, threshold))
+
+    return problems
+
+
+def main(args):
+    """Compare manifest files args[2:] to manifest file args[1]"""
+    if len(args) < 3:
+        print(f"Usage: {args[0]} <base manifest> <manifest> [<manifest> ...]")
+        return 2
+    problems = compare_manifests(args[1:])
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
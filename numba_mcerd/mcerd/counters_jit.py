@@ -0,0 +1,26 @@
+"""Per-thread simulation counters, see objects_dtype.Counters"""
+
+import numpy as np
+
+import numba_mcerd.mcerd.objects_dtype as od
+import numba_mcerd.mcerd.objects_jit as oj
+
+
+def create_counters(count: int) -> np.ndarray:
+    """Create an array of zeroed counters that starts at a cache line boundary.
+
+    Counters fill whole cache lines, so threads updating their own counters
+    don't share cache lines with each other.
+    """
+    size = count * od.Counters.itemsize
+    buffer = np.zeros(size + od.CACHE_LINE_SIZE, dtype=np.uint8)
+    offset = -buffer.ctypes.data % od.CACHE_LINE_SIZE
+    return buffer[offset:offset + size].view(od.Counters).view(np.recarray)
+
+
+def store_counters(g: oj.Global, counters_arr: np.ndarray) -> None:
+    """Store totals of per-thread counters into g"""
+    g.cion = max(counters_arr["cion"])
+    g.nmc = counters_arr["nmc"].sum()
+    g.cpresimu = counters_arr["cpresimu"].sum()
+    g.finstat[:] = counters_arr["finstat"].sum(axis=0)
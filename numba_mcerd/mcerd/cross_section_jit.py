@@ -91,9 +91,13 @@ def calc_cross(angle: float, e: float, scat: o.Scattering, pot: oj.Potential) ->
 
 
 @nb.njit(cache=True, nogil=True)
-def get_cross(ion: oj.Ion, scat: oj.Scattering) -> float:
-    """Interpolate the cross section (maximum impact parameter for current ion energy)"""
-    e = math.log(ion.E * scat.E2eps)
+def get_cross(log_E: float, scat: oj.Scattering) -> float:
+    """Interpolate the cross section (maximum impact parameter for current ion energy).
+
+    Takes the logarithm of the ion energy, so that it can be calculated
+    once for all the atoms of a layer.
+    """
+    e = log_E + scat.logE2eps
 
     i = int((e - scat.cross.emin) / scat.cross.estep)
 
@@ -109,7 +113,7 @@ def get_cross(ion: oj.Ion, scat: oj.Scattering) -> float:
         # Full print, not really compatible with Numba's prange multithreading (weird linebreaks):
         # print("Cross section seems awfully low:")
         # print(b)
-        # print(i, ion.E, scat.E2eps)
+        # print(i, log_E, scat.E2eps)
         # print(e, scat.cross.emin, scat.cross.estep)
         # print(scat.cross.b[i], scat.cross.b[i + 1], scat.a)
 
@@ -121,3 +121,10 @@ class FoilType(IntEnum):
     """Foil type/shape"""
     CIRC = 0   # Originally FOIL_CIRC
     RECT = 1   # Originally FOIL_RECT
+
+
+class OutputMode(IntEnum):
+    """Where ERD events are output in parallel mode. Own addition"""
+    BUFFER = 0      # Per-thread buffers written to file after each batch
+    HISTOGRAM = 1   # Per-thread histograms
+    EVENT_FILE = 2  # Memory-mapped event file shared by all threads
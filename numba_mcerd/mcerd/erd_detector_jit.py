@@ -7,7 +7,7 @@ import numpy as np
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects_dtype as od
 import numba_mcerd.mcerd.objects_jit as oj
-from numba_mcerd.mcerd import enums, misc_jit, rotate_jit, virtual_detector_jit
+from numba_mcerd.mcerd import enums, ion_simu_jit, misc_jit, rotate_jit, virtual_detector_jit
 
 
 class ErdDetectorError(Exception):
@@ -52,36 +52,34 @@ def move_to_erd_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, detector:
 
     foil = detector.foil[n]
 
+    if g.dircos:
+        ion_simu_jit.update_angles(ion)
+
+    # Points are kept in local scalars to avoid allocating temporary objects
     pout = misc_jit.coord_transform(
-        ion.lab.p, ion.lab.theta, ion.lab.fii, ion.p, enums.CoordTransformDirection.FORW)
+        ion.lab.p.x, ion.lab.p.y, ion.lab.p.z, ion.lab.theta, ion.lab.fii,
+        ion.p.x, ion.p.y, ion.p.z, enums.CoordTransformDirection.FORW)
 
-    direction = oj.Vector()
     out_theta, out_fii = rotate_jit.rotate(ion.lab.theta, ion.lab.fii, ion.theta, ion.fii)
-    direction.theta = out_theta
-    direction.fii = out_fii
+    direction = rotate_jit.get_direction(out_theta, out_fii)
 
-    ion_line = get_line_params(direction, pout)
-    cross = oj.Point()
-    is_cross = get_line_plane_cross(ion_line, foil.plane, cross)
+    # Foil axes are precomputed in init_detector, so the crossing and the hit
+    # point in foil coordinates need no trigonometry
+    is_cross, dist, cross = get_foil_cross(foil, pout, direction)
+    fcross = (0.0, 0.0, 0.0)
     if is_cross:
-        # ion.lab.p = cross
-        ion.lab.p.x = cross.x
-        ion.lab.p.y = cross.y
-        ion.lab.p.z = cross.z
+        ion.lab.p.x = cross[0]
+        ion.lab.p.y = cross[1]
+        ion.lab.p.z = cross[2]
         ion.p.x = 0.0
         ion.p.y = 0.0
         ion.p.z = 0.0
-        theta = detector.angle
-        fii = c.C_PI
-        fcross = misc_jit.coord_transform(
-            foil.center, theta, fii, cross, enums.CoordTransformDirection.BACK)
-        # ion.hit[n] = fcross
-        ion.hit[n].x = fcross.x
-        ion.hit[n].y = fcross.y
-        ion.hit[n].z = fcross.z
-    # TODO: is_on_right_side and is_in_foil are needlessly repeated
-    if is_cross and is_on_right_side(pout, direction, cross) and is_in_foil(fcross, foil):
-        dist = get_distance(pout, cross)
+        fcross = lab_to_foil(foil, cross)
+        ion.hit[n].x = fcross[0]
+        ion.hit[n].y = fcross[1]
+        ion.hit[n].z = fcross[2]
+    # Crossing is on the right side (not behind the ion) if dist is positive
+    if is_cross and dist > 0.0 and is_in_foil(fcross[0], fcross[1], foil):
         ion.time += dist / math.sqrt(2.0 * ion.E / ion.A)
         for i in range(2):
             if ion.tlayer == detector.tdet[i]:
@@ -89,15 +87,12 @@ def move_to_erd_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, detector:
         ion.status = enums.IonStatus.NOT_FINISHED
         ion.lab.theta = detector.angle
         ion.lab.fii = 0.0
-        ion.theta, ion.fii = rotate_jit.rotate(detector.angle, c.C_PI, out_theta, out_fii)
-        ion.opt.cos_theta = math.cos(ion.theta)
-        ion.opt.sin_theta = math.sin(ion.theta)
+        theta, fii = rotate_jit.rotate(detector.angle, c.C_PI, out_theta, out_fii)
+        ion_simu_jit.set_direction(ion, theta, fii)
     else:
-        if (n == 0 and is_cross and g.virtualdet and is_on_right_side(pout, direction, cross)
-                and is_in_foil(fcross, detector.vfoil)):
+        if (n == 0 and is_cross and g.virtualdet and dist > 0.0
+                and is_in_foil(fcross[0], fcross[1], detector.vfoil)):
             ion.status = enums.IonStatus.NOT_FINISHED
-            # TODO: Should this return cross and pout instead?
-            #       Also check if values are copied
             virtual_detector_jit.hit_virtual_detector(g, ion, target, detector, cross, pout)
             if detector.type == enums.DetectorType.TOF:
                 for i in range(2):
@@ -114,122 +109,62 @@ def move_to_erd_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, detector:
 
 
 @nb.njit(cache=True, nogil=True)
-def get_line_params(d: oj.Vector, p: oj.Point) -> oj.Line:
-    """Calculate line parameters for a line pointing to the direction d
-    and going through point p
-    """
-    k = oj.Line()
+def get_foil_cross(foil: oj.Det_foil, p: Tuple[float, float, float], d: Tuple[float, float, float]
+                   ) -> Tuple[bool, float, Tuple[float, float, float]]:
+    """Calculate where the line going through point p to the direction d
+    crosses the plane of the foil. d must be a unit vector.
 
-    z = math.cos(d.theta)
-    y = math.sin(d.theta) * math.sin(d.fii)
-    x = math.sin(d.theta) * math.cos(d.fii)
+    Returns:
+        (is_cross, distance from p to the cross along d, cross)
+    """
+    normal = foil.normal
+    nd = normal.x * d[0] + normal.y * d[1] + normal.z * d[2]
+    if nd == 0.0:
+        return False, 0.0, (0.0, 0.0, 0.0)
 
-    if z == 0.0:
-        if x == 0.0:
-            k.type = enums.LineType.Y_AXIS
-            k.a = p.x
-            k.b = p.z
-        else:
-            k.type = enums.LineType.XY_PLANE
-            k.a = y / x
-            k.b = p.y - k.a * p.x
-            k.c = p.z
-    else:
-        k.type = enums.LineType.GENERAL
-        k.a = x / z
-        k.b = p.x - k.a * p.z
-        k.c = y / z
-        k.d = p.y - k.c * p.z
+    dist = (normal.x * (foil.center.x - p[0])
+            + normal.y * (foil.center.y - p[1])
+            + normal.z * (foil.center.z - p[2])) / nd
 
-    return k
+    return True, dist, (p[0] + dist * d[0], p[1] + dist * d[1], p[2] + dist * d[2])
 
 
 @nb.njit(cache=True, nogil=True)
-def get_line_plane_cross(line: oj.Line, plane: oj.Plane, cross: oj.Point) -> bool:
-    # Cross is modified
-    p = plane
-    q = line
-    k = cross
-    is_cross = False
-
-    if p.type == enums.PlaneType.GENERAL_PLANE:
-        if q.type == enums.LineType.GENERAL:
-            if (q.a - p.b - p.a * q.c) != 0.0:
-                is_cross = True
-                k.z = (p.a * q.b + p.b * q.d + p.c) / (1.0 - p.a * q.a - p.b * q.c)
-                k.x = q.a * k.z + q.b
-                k.y = q.c * k.z + q.d
-            else:
-                is_cross = False
-        elif q.type == enums.LineType.XY_PLANE:
-            is_cross = True
-            k.x = -q.b / q.a - (-p.a * q.b - q.a * (-p.c - p.b * q.c)) / (q.a * (p.a - q.a))
-            k.y = -(-p.a * q.b - q.a * (-p.c - p.b * q.c)) / (p.a - q.a)
-            k.z = q.c
-        elif q.type == enums.LineType.Y_AXIS:
-            k.x = q.a
-            k.y = p.a * q.a + p.b * q.b + p.c
-            k.z = q.b
-            is_cross = True
-    elif p.type == enums.PlaneType.Z_PLANE:
-        if q.type == enums.LineType.GENERAL:
-            is_cross = True
-            k.x = q.c * p.a + q.d
-            k.y = q.a * p.a + q.b
-            k.z = p.a
-        elif q.type == enums.LineType.XY_PLANE:
-            is_cross = False
-        elif q.type == enums.LineType.Y_AXIS:
-            is_cross = False
-    elif p.type == enums.PlaneType.X_PLANE:
-        if q.type == enums.LineType.GENERAL:
-            is_cross = True
-            k.x = p.a
-            k.z = (p.a - q.d) / (q.c + 1.0e-20)
-            k.y = k.z * q.a + q.b
-        elif q.type == enums.LineType.XY_PLANE:
-            is_cross = True
-            k.x = p.a
-            k.y = p.a * q.a + q.b
-            k.z = q.c
-        elif q.type == enums.LineType.Y_AXIS:
-            is_cross = False
-
-    return is_cross
+def lab_to_foil(foil: oj.Det_foil, p: Tuple[float, float, float]) -> Tuple[float, float, float]:
+    """Transform point p from laboratory coordinates to foil coordinates"""
+    dx = p[0] - foil.center.x
+    dy = p[1] - foil.center.y
+    dz = p[2] - foil.center.z
+    return (foil.axis_x.x * dx + foil.axis_x.y * dy + foil.axis_x.z * dz,
+            foil.axis_y.x * dx + foil.axis_y.y * dy + foil.axis_y.z * dz,
+            foil.normal.x * dx + foil.normal.y * dy + foil.normal.z * dz)
 
 
 @nb.njit(cache=True, nogil=True)
-def get_distance(p1: oj.Point, p2: oj.Point) -> float:
-    return math.sqrt(
-        (p1.x - p2.x)**2
-        + (p1.y - p2.y)**2
-        + (p1.z - p2.z)**2)
+def foil_to_lab(foil: oj.Det_foil, x: float, y: float) -> Tuple[float, float, float]:
+    """Transform point (x, y) on the foil plane to laboratory coordinates"""
+    return (foil.center.x + x * foil.axis_x.x + y * foil.axis_y.x,
+            foil.center.y + x * foil.axis_x.y + y * foil.axis_y.y,
+            foil.center.z + x * foil.axis_x.z + y * foil.axis_y.z)
 
 
 @nb.njit(cache=True, nogil=True)
-def is_on_right_side(p1: oj.Point, d: oj.Vector, p2: oj.Point) -> int:
-    dp = oj.Point()
-
-    r1 = get_distance(p1, p2)
-
-    dp.x = p1.x + r1 * math.sin(d.theta) * math.cos(d.fii)
-    dp.y = p1.y + r1 * math.sin(d.theta) * math.sin(d.fii)
-    dp.z = p1.z + r1 * math.cos(d.theta)
-
-    r2 = get_distance(dp, p2)
-
-    return r2 < r1
+def get_distance(p1: Tuple[float, float, float], p2: Tuple[float, float, float]) -> float:
+    return math.sqrt(
+        (p1[0] - p2[0])**2
+        + (p1[1] - p2[1])**2
+        + (p1[2] - p2[2])**2)
 
 
 @nb.njit(cache=True, nogil=True)
-def is_in_foil(p: oj.Point, foil: oj.Det_foil) -> bool:
-    """(Point p is assumed to be on the plane of circle c)"""
+def is_in_foil(x: float, y: float, foil: oj.Det_foil) -> bool:
+    """(Point (x, y) is assumed to be on the plane of circle c)"""
     if foil.type == enums.FoilType.CIRC:
         if foil.virtual:
-            return math.sqrt((p.x / foil.size_[0]) ** 2 + (p.y / foil.size_[1]) ** 2) <= 1.0
-        return math.sqrt(p.x ** 2 + p.y ** 2) <= foil.size_[0]
+            return math.sqrt((x / foil.size_[0]) ** 2 + (y / foil.size_[1]) ** 2) <= 1.0
+        return math.sqrt(x ** 2 + y ** 2) <= foil.size_[0]
     if foil.type == enums.FoilType.RECT:
-        return abs(p.x) <= foil.size_[0] and abs(p.y) <= foil.size_[1]
+        return abs(x) <= foil.size_[0] and abs(y) <= foil.size_[1]
     return False
 
 
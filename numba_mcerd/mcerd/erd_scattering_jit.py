@@ -7,7 +7,7 @@ import numpy as np
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects_dtype as od
 import numba_mcerd.mcerd.objects_jit as oj
-from numba_mcerd.mcerd import copy_jit, enums, rotate_jit, random_jit
+from numba_mcerd.mcerd import copy_jit, enums, ion_simu_jit, rotate_jit, random_jit
 
 
 class ErdScatteringError(Exception):
@@ -25,6 +25,9 @@ def erd_scattering(g: oj.Global, ion: oj.Ion, recoil: oj.Ion, target: oj.Target,
     if g.simtype == enums.SimType.RBS:
         raise NotImplementedError
 
+    if g.dircos:
+        ion_simu_jit.update_angles(ion)
+
     recoil.w = ion.w
     if ion.wtmp > 0:
         recoil.w *= ion.wtmp
@@ -65,10 +68,7 @@ def erd_scattering(g: oj.Global, ion: oj.Ion, recoil: oj.Ion, target: oj.Target,
                 recoil.A = get_isotope(recoil.I)
             recoil.E = (ion.E * math.cos(sc_ion.theta)**2 * 4.0
                         * (ion.A * recoil.A) / (ion.A + recoil.A)**2)
-            recoil.theta = sc_target.theta
-            recoil.fii = sc_target.fii
-            recoil.opt.cos_theta = math.cos(recoil.theta)
-            recoil.opt.sin_theta = math.sin(recoil.theta)
+            ion_simu_jit.set_direction(recoil, sc_target.theta, sc_target.fii)
             copy_jit.copy_point(recoil.p, ion.p)
             recoil.tlayer = ion.tlayer
             recoil.nsct = 0
@@ -1,10 +1,9 @@
-from pathlib import Path
-
 import numba_mcerd.mcerd.objects_jit as oj
+from numba_mcerd import run_log
 from numba_mcerd.mcerd import enums
 
 
-def finalize(g: oj.Global, master: oj.Master) -> None:
+def finalize(g: oj.Global, master: oj.Master, log: run_log.RunLog) -> None:
     """Output statistics of ion finishes to g.master.fpout.
 
     Not njit-decorated.
@@ -18,5 +17,4 @@ def finalize(g: oj.Global, master: oj.Master) -> None:
     if g.simtype == enums.SimType.RBS:
         raise NotImplementedError
 
-    with Path(master.fpdat).open("a") as f:
-        f.writelines(dat_lines)
+    log.writelines(master.fpdat, dat_lines)
@@ -1,20 +1,38 @@
+import copy
+import logging
+import math
+from pathlib import Path
+
 import numba as nb
 import numpy as np
 
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects_jit as oj
 import numba_mcerd.mcerd.objects_dtype as od
+from numba_mcerd import config
 from numba_mcerd import list_conversion as lc
-from numba_mcerd.mcerd import enums
+from numba_mcerd.mcerd import enums, histogram_jit
 
 
 # TODO: Create another buffer type that has formats for each row.
 #  FIN_STOP is 10.3f, FIN_TRANS is 12.6f
 
 
+# Fields that are summed when combining range buffers
+RANGE_STAT_FIELDS = (
+    "stop_depth", "trans_energy", "depth_outside", "energy_outside", "dropped",
+    "stop_count", "stop_depth_sum", "stop_depth_sum_sq",
+    "trans_count", "trans_energy_sum", "trans_energy_sum_sq"
+)
+
+
 def create_range_buffer(g: oj.Global, additional_multiplier: float = 1.0) -> od.Buffer:
     """Create a buffer for range output
 
+    The buffer holds at most config.RANGE_BUFFER_SIZE events. All events
+    are included in the range statistics of the buffer, and events that
+    don't fit are counted as dropped.
+
     Args:
         g: global settings. `nsimu` affects the buffer size
         additional_multiplier: additional multiplier for buffer size (for
@@ -24,33 +42,113 @@ def create_range_buffer(g: oj.Global, additional_multiplier: float = 1.0) -> od.
         A buffer object
     """
     t = lc.TypeInt
-    width = 2
 
     # Output occurs at most once per simulated ion
     length = int(g.nsimu * additional_multiplier)
+    if config.RANGE_BUFFER_SIZE is not None:
+        length = min(length, config.RANGE_BUFFER_SIZE)
 
-    dt = od.get_buffer_dtype(length, width)
+    depth_bins = config.HISTOGRAM_DEPTH_BINS
+    energy_bins = config.HISTOGRAM_ENERGY_BINS
+    dt = od.get_range_buffer_dtype(length, depth_bins[2], energy_bins[2])
     range_buf = np.zeros(1, dtype=dt)[0]
-    range_buf["types"] = np.array([t.STR, t.FLOAT])
-    range_buf["formats"] = np.array(["", "12.6f"], dtype="U5")
+    lc.set_columns(range_buf, [t.STR, t.FLOAT], ["", "12.6f"], ["type", "value"])
+    range_buf["depth_limits"] = depth_bins[:2]
+    range_buf["energy_limits"] = energy_bins[:2]
 
     return range_buf
 
 
+@nb.njit(cache=True, nogil=True)
+def _add_range_row(range_buf: od.Buffer, type_: int, value: float) -> None:
+    if range_buf["row_i"] >= range_buf["buf"].shape[0]:
+        range_buf["dropped"] += 1  # Full, event is only included in statistics
+        return
+
+    range_buf["col_i"] = 0
+
+    lc.set_buf(range_buf, type_)
+    lc.set_buf(range_buf, value)
+
+    range_buf["row_i"] += 1
+
+
 @nb.njit(cache=True, nogil=True)
 def finish_ion(g: oj.Global, ion: oj.Ion, range_buf: od.Buffer) -> None:
     """Output information about stopped or transmitted ions to g.master.fprange"""
     if ion.status == enums.IonStatus.FIN_STOP:
-        range_buf["col_i"] = 0
+        depth = ion.p.z / c.C_NM
+        _add_range_row(range_buf, ord("R"), depth)  # 10.3f
+
+        range_buf.stop_count += 1
+        range_buf.stop_depth_sum += depth
+        range_buf.stop_depth_sum_sq += depth * depth
+        i = histogram_jit.get_bin(depth, range_buf.depth_limits, range_buf.stop_depth.shape[0])
+        if i >= 0:
+            range_buf.stop_depth[i] += 1
+        else:
+            range_buf.depth_outside += 1
+    elif ion.status == enums.IonStatus.FIN_TRANS:
+        energy = ion.E / c.C_MEV
+        _add_range_row(range_buf, ord("T"), energy)  # 12.6f
 
-        lc.set_buf(range_buf, ord("R"))
-        lc.set_buf(range_buf, ion.p.z / c.C_NM)  # 10.3f
+        range_buf.trans_count += 1
+        range_buf.trans_energy_sum += energy
+        range_buf.trans_energy_sum_sq += energy * energy
+        i = histogram_jit.get_bin(energy, range_buf.energy_limits, range_buf.trans_energy.shape[0])
+        if i >= 0:
+            range_buf.trans_energy[i] += 1
+        else:
+            range_buf.energy_outside += 1
+
+
+def combine_range_stats(range_bufs: np.ndarray) -> od.Buffer:
+    """Sum range statistics of buffers into a copy of the first buffer"""
+    range_buf = copy.deepcopy(range_bufs[0])
+    for name in RANGE_STAT_FIELDS:
+        range_buf[name] = range_bufs[name].sum(axis=0)
+
+    return range_buf
 
-        range_buf["row_i"] += 1
-    elif ion.status == enums.IonStatus.FIN_TRANS:
-        range_buf["col_i"] = 0
 
-        lc.set_buf(range_buf, ord("T"))
-        lc.set_buf(range_buf, ion.E / c.C_MEV)  # 12.6f
+def _get_mean_and_std(count: int, total: float, total_sq: float) -> tuple:
+    if count == 0:
+        return math.nan, math.nan
+    mean = total / count
+    return mean, math.sqrt(max(total_sq / count - mean**2, 0.0))
 
-        range_buf["row_i"] += 1
+
+def get_range_stats_path(range_file) -> Path:
+    """Get path of range statistics file that corresponds to range output file"""
+    return lc.remove_compression_suffix(range_file).with_suffix(".range.npz")
+
+
+def write_range_stats(range_buf: od.Buffer, file) -> None:
+    """Write range histograms, their bin edges and summary values to a .npz file
+
+    A warning is logged if range events were dropped from full buffers.
+    """
+    stop_depth_mean, stop_depth_std = _get_mean_and_std(
+        range_buf["stop_count"], range_buf["stop_depth_sum"], range_buf["stop_depth_sum_sq"])
+    trans_energy_mean, trans_energy_std = _get_mean_and_std(
+        range_buf["trans_count"], range_buf["trans_energy_sum"], range_buf["trans_energy_sum_sq"])
+
+    np.savez(
+        Path(file),
+        stop_depth=range_buf["stop_depth"],
+        trans_energy=range_buf["trans_energy"],
+        depth_outside=range_buf["depth_outside"],
+        energy_outside=range_buf["energy_outside"],
+        dropped=range_buf["dropped"],
+        depth_edges=histogram_jit.get_edges(range_buf["depth_limits"], range_buf["stop_depth"].shape[0]),
+        energy_edges=histogram_jit.get_edges(range_buf["energy_limits"], range_buf["trans_energy"].shape[0]),
+        stop_count=range_buf["stop_count"],
+        stop_depth_mean=stop_depth_mean,
+        stop_depth_std=stop_depth_std,
+        trans_count=range_buf["trans_count"],
+        trans_energy_mean=trans_energy_mean,
+        trans_energy_std=trans_energy_std)
+
+    if range_buf["dropped"] > 0:
+        logging.warning(f"{range_buf['dropped']} range events did not fit in the range buffers "
+                        f"(RANGE_BUFFER_SIZE={config.RANGE_BUFFER_SIZE}) and are only included in {Path(file).name}")
@@ -0,0 +1,88 @@
+"""Histograms accumulated during the simulation instead of per-event output"""
+
+import copy
+from pathlib import Path
+from typing import Tuple
+
+import numba as nb
+import numpy as np
+
+import numba_mcerd.mcerd.objects_dtype as od
+
+
+Bins = Tuple[float, float, int]  # Low edge, high edge and bin count
+
+
+def create_histograms(energy_bins: Bins, tof_bins: Bins, depth_bins: Bins) -> od.Histograms:
+    """Create empty histograms
+
+    Args:
+        energy_bins: energy binning (MeV)
+        tof_bins: time-of-flight binning (ns)
+        depth_bins: depth binning (nm)
+
+    Returns:
+        A histograms object
+    """
+    dt = od.get_histograms_dtype(energy_bins[2], tof_bins[2], depth_bins[2])
+    hist = np.zeros(1, dtype=dt)[0]
+    hist["energy_limits"] = energy_bins[:2]
+    hist["tof_limits"] = tof_bins[:2]
+    hist["depth_limits"] = depth_bins[:2]
+
+    return hist
+
+
+def get_edges(limits: np.ndarray, count: int) -> np.ndarray:
+    """Get bin edges for histogram axis"""
+    return np.linspace(limits[0], limits[1], count + 1)
+
+
+@nb.njit(cache=True, nogil=True)
+def get_bin(value: float, limits: np.ndarray, count: int) -> int:
+    """Get bin index of value, or -1 if value is outside limits"""
+    if not limits[0] <= value < limits[1]:
+        return -1
+    i = int((value - limits[0]) / (limits[1] - limits[0]) * count)
+    return min(i, count - 1)  # Guard against rounding up at the high edge
+
+
+@nb.njit(cache=True, nogil=True)
+def add_erd(hist: od.Histograms, energy: float, tof: float, depth: float, w: float) -> None:
+    """Add weighted ERD event to ToF-energy and depth-energy histograms"""
+    e_i = get_bin(energy, hist.energy_limits, hist.tof_energy.shape[1])
+    tof_i = get_bin(tof, hist.tof_limits, hist.tof_energy.shape[0])
+    depth_i = get_bin(depth, hist.depth_limits, hist.depth_energy.shape[0])
+
+    inside = True
+    if e_i >= 0 and tof_i >= 0:
+        hist.tof_energy[tof_i, e_i] += w
+    else:
+        inside = False
+    if e_i >= 0 and depth_i >= 0:
+        hist.depth_energy[depth_i, e_i] += w
+    else:
+        inside = False
+    if not inside:
+        hist.outside += w
+
+
+def combine_histograms(hist_arr: np.ndarray) -> od.Histograms:
+    """Sum per-thread histograms into one"""
+    hist = copy.deepcopy(hist_arr[0])
+    for name in ("tof_energy", "depth_energy", "outside"):
+        hist[name] = hist_arr[name].sum(axis=0)
+
+    return hist
+
+
+def write_histograms(hist: od.Histograms, file) -> None:
+    """Write histograms and their bin edges to a .npz file"""
+    np.savez(
+        Path(file),
+        tof_energy=hist["tof_energy"],
+        depth_energy=hist["depth_energy"],
+        outside=hist["outside"],
+        energy_edges=get_edges(hist["energy_limits"], hist["tof_energy"].shape[1]),
+        tof_edges=get_edges(hist["tof_limits"], hist["tof_energy"].shape[0]),
+        depth_edges=get_edges(hist["depth_limits"], hist["depth_energy"].shape[0]))
@@ -1,6 +1,7 @@
 import copy
 import logging
 import math
+from typing import Tuple
 
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects as o
@@ -31,6 +32,7 @@ def init_detector(g: o.Global, detector: o.Detector) -> None:
 
         foil.center = p1
         foil.plane = get_plane_params(p1, p2, p3)
+        foil.axis_x, foil.axis_y, foil.normal = get_foil_axes(detector.angle)
         foil.virtual = False
 
     if g.virtualdet:
@@ -74,6 +76,25 @@ def init_detector(g: o.Global, detector: o.Detector) -> None:
         detector.thetamax = max(tmax1, tmax2)
 
 
+def get_foil_axes(angle: float) -> Tuple[o.Point, o.Point, o.Point]:
+    """Calculate the axes of the foil coordinate system in laboratory
+    coordinates for a detector at angle. These are the rows of the
+    rotation done by coord_transform from lab to foil coordinates.
+
+    Returns:
+        First in-plane axis, second in-plane axis and plane normal
+    """
+    origin = o.Point()
+    columns = [
+        misc.coord_transform(origin, angle, c.C_PI, unit, enums.CoordTransformDirection.BACK)
+        for unit in (o.Point(x=1.0), o.Point(y=1.0), o.Point(z=1.0))]
+
+    axis_x = o.Point(columns[0].x, columns[1].x, columns[2].x)
+    axis_y = o.Point(columns[0].y, columns[1].y, columns[2].y)
+    normal = o.Point(columns[0].z, columns[1].z, columns[2].z)
+    return axis_x, axis_y, normal
+
+
 # TODO: Create a unit test
 def get_plane_params(p1: o.Point, p2: o.Point, p3: o.Point) -> o.Plane:
     """Create a plane from points"""
@@ -1,10 +1,12 @@
 import logging
 import math
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 
+from numba_mcerd import config
+from numba_mcerd import list_conversion as lc
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects as o
 from numba_mcerd.mcerd import enums
@@ -46,6 +48,7 @@ def init_params(g: o.Global, target: o.Target, argv: List[str]) -> None:
     g.cascades = False
     g.advanced_output = False
     g.nomc = False
+    g.dircos = config.DIRECTION_COSINES
 
 
 # Called once in preprocessing and after pre-simulation
@@ -137,23 +140,34 @@ def init_recoiling_angle(target: o.Target) -> None:
 
 
 # Called once in preprocessing
-def init_io(g: o.Global, ion: o.Ion, target: o.Target) -> None:
-    """Initialize paths for I/O"""
+def init_io(g: o.Global, ion: o.Ion, target: o.Target, output_base: Optional[Path] = None) -> None:
+    """Initialize paths for I/O
+
+    Output file names start with output_base, or with the command file path
+    if output_base is None.
+    """
     # TODO: Set these to data/out/
     #       Check that these paths can be opened
-    g.basename = f"{g.master.args[1]}.{g.seed}"
+    g.basename = f"{output_base if output_base is not None else g.master.args[1]}.{g.seed}"
 
     g.master.fpout = Path(g.basename + ".out")
     g.master.fpdat = Path(g.basename + ".dat")
     # g.master.fpdebug = Path(g.basename + ".debug")  # Skipped
-    g.master.fperd = Path(g.basename + ".erd")
-    g.master.fprange = Path(g.basename + ".range")
+    if config.OUTPUT_FORMAT in ("binary", "mmap"):
+        g.master.fperd = Path(g.basename + ".erdb")
+    else:
+        g.master.fperd = Path(lc.add_compression_suffix(g.basename + ".erd"))
+    g.master.fprange = Path(lc.add_compression_suffix(g.basename + ".range"))
     g.master.fptrack = Path(g.basename + ".track")
 
     # Clear previous files
     g.master.fpout.write_text("")
     g.master.fpdat.write_text("")
     # g.master.fpdebug.write_text("")  # Skipped
-    g.master.fperd.write_text("")
-    g.master.fprange.write_text("")
+    # Compressed files get an empty stream so that they can be read
+    for file in (g.master.fperd, g.master.fprange):
+        with lc.open_text(file, "w"):
+            pass
     g.master.fptrack.write_text("")
+    if g.output_trackpoints:
+        g.master.fptrack.with_suffix(".trackb").write_bytes(b"")  # Binary trackpoints, see output_jit
@@ -15,6 +15,7 @@ def scattering_table(g: o.Global, ion: o.Ion, target: o.Target, scat: o.Scatteri
     scat.a = 0.8854 * c.C_BOHR_RADIUS / (ion.Z ** 0.23 + targetZ ** 0.23)
     scat.E2eps = 4.0 * c.C_PI * c.C_EPSILON0 * scat.a * targetA /\
                  ((ion.A + targetA) * ion.Z * targetZ * c.C_E**2)
+    scat.logE2eps = math.log(scat.E2eps)
 
     emin = math.log(g.emin * scat.E2eps)
     emax = math.log(g.ionemax * scat.E2eps)
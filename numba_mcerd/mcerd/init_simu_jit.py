@@ -6,12 +6,13 @@ import numpy as np
 import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects as o
 import numba_mcerd.mcerd.objects_jit as oj
+from numba_mcerd import run_log
 # import numba_mcerd.mcerd.symbols as s
 from numba_mcerd.mcerd import scattering_angle_jit
 
 
 def scattering_table(g: o.Global, ion: o.Ion, target: o.Target, scat: o.Scattering,
-                     pot: oj.Potential, natom: int) -> None:
+                     pot: oj.Potential, natom: int, log: run_log.RunLog) -> None:
     """Create a lookup table for scattering (energies?)"""
     targetZ = target.ele[natom].Z
     targetA = target.ele[natom].A
@@ -19,6 +20,7 @@ def scattering_table(g: o.Global, ion: o.Ion, target: o.Target, scat: o.Scatteri
     scat.a = 0.8854 * c.C_BOHR_RADIUS / (ion.Z ** 0.23 + targetZ ** 0.23)
     scat.E2eps = 4.0 * c.C_PI * c.C_EPSILON0 * scat.a * targetA /\
                  ((ion.A + targetA) * ion.Z * targetZ * c.C_E**2)
+    scat.logE2eps = math.log(scat.E2eps)
 
     emin = math.log(g.emin * scat.E2eps)
     emax = math.log(g.ionemax * scat.E2eps)
@@ -35,11 +37,11 @@ def scattering_table(g: o.Global, ion: o.Ion, target: o.Target, scat: o.Scatteri
     scat.logediv = 1.0 / estep
     scat.logydiv = 1.0 / ystep
 
-    with g.master.fpout.open("a") as f:
-        f.write(f"a, E2eps {scat.a} {scat.E2eps}\n")
-        f.write(f"emin, emax: {emin} {emax}\n")
-        f.write(f"ymin, ymax: {ymin} {ymax}\n")
-        f.write(f"estep, ystep: {estep} {ystep}\n")
+    log.writelines(g.master.fpout, (
+        f"a, E2eps {scat.a} {scat.E2eps}\n",
+        f"emin, emax: {emin} {emax}\n",
+        f"ymin, ymax: {ymin} {ymax}\n",
+        f"estep, ystep: {estep} {ystep}\n"))
 
     scat_matrix = np.array(scat.angle, dtype=np.float64)  # Numba seems to do float64 instead of float32
     opt_e, opt_y = main_math(scat_matrix, pot, emin, estep, ymin, ystep)
@@ -6,7 +6,7 @@ import numpy as np
 from numba import cuda, types
 
 from numba_mcerd import logging_jit
-from numba_mcerd.mcerd import random_jit, cross_section_jit, enums, random_cuda
+from numba_mcerd.mcerd import random_jit, cross_section_jit, enums, random_cuda, rotate_jit
 import numba_mcerd.mcerd.objects_dtype as od
 import numba_mcerd.mcerd.objects_jit as oj
 import numba_mcerd.mcerd.constants as c
@@ -17,7 +17,7 @@ class IonSimulationError(Exception):
 
 
 @nb.njit(cache=True, nogil=True)
-def create_ion(g: oj.Global, ion: oj.Ion, target: oj.Target) -> None:
+def create_ion(g: oj.Global, counters: od.Counters, ion: oj.Ion, target: oj.Target) -> None:
     """Calculate parameters for ion (primary or secondary)
 
     About coordinate systems:
@@ -40,7 +40,7 @@ def create_ion(g: oj.Global, ion: oj.Ion, target: oj.Target) -> None:
     ion.lab.p.y = y
     ion.lab.p.z = z
 
-    if g.simstage == enums.SimStage.REAL.value and g.cion % (g.nscale + 1) == 0:
+    if g.simstage == enums.SimStage.REAL.value and counters.cion % (g.nscale + 1) == 0:
         # TODO: Calculating a random point goes to waste here. Move
         #       random point calculation to the else branch
         ion.scale = True
@@ -65,10 +65,7 @@ def create_ion(g: oj.Global, ion: oj.Ion, target: oj.Target) -> None:
     ion.p.z = 0.001 * c.C_ANGSTROM
     ion.E = g.E0
     ion.nsct = 0
-    ion.theta = theta
-    ion.fii = fii
-    ion.opt.cos_theta = math.cos(theta)
-    ion.opt.sin_theta = math.sin(theta)
+    set_direction(ion, theta, fii)
     ion.type = enums.IonType.PRIMARY.value
     ion.status = enums.IonStatus.NOT_FINISHED.value
 
@@ -100,9 +97,10 @@ def next_scattering(g: oj.Global, ion: oj.Ion, target: oj.Target,
     cross = 0.0
     b = np.zeros(shape=c.MAXATOMS, dtype=np.float64)
     layer = target.layer[ion.tlayer]
+    log_E = math.log(ion.E)  # Same for all atoms, only E2eps differs
     for i in range(layer.natoms):
         p = layer.atom[i]
-        b[i] = layer.N[i] * cross_section_jit.get_cross(ion, scat[ion.scatindex, p])
+        b[i] = layer.N[i] * cross_section_jit.get_cross(log_E, scat[ion.scatindex, p])
         cross += b[i]
 
     rcross = random_jit.rnd(0.0, cross, enums.RndPeriod.OPEN)
@@ -181,8 +179,12 @@ def move_ion(g: oj.Global, ion: oj.Ion, target: oj.Target, snext: oj.SNext) -> i
     d = snext.d
     layer = target.layer[ion.tlayer]
 
-    nextx = d * ion.opt.sin_theta * math.cos(ion.fii) + ion.p.x
-    nexty = d * ion.opt.sin_theta * math.sin(ion.fii) + ion.p.y
+    if g.dircos:
+        nextx = d * ion.dir.x + ion.p.x
+        nexty = d * ion.dir.y + ion.p.y
+    else:
+        nextx = d * ion.opt.sin_theta * math.cos(ion.fii) + ion.p.x
+        nexty = d * ion.opt.sin_theta * math.sin(ion.fii) + ion.p.y
     nextz = d * ion.opt.cos_theta + ion.p.z
 
     if g.rough and ion.tlayer < target.ntarget:
@@ -224,25 +226,31 @@ def move_ion(g: oj.Global, ion: oj.Ion, target: oj.Target, snext: oj.SNext) -> i
                 cross_layer = False
                 cross_recdist = False
 
-    vel1 = math.sqrt(2.0 * ion.E / ion.A)
-    sto1 = inter_sto(layer.sto[ion.scatindex], vel1, enums.IonMode.STOPPING.value)
-
-    dE = sto1 * d
-
-    vel2 = math.sqrt(2.0 * (max(ion.E - dE, 0.0) / ion.A))
-    sto2 = inter_sto(layer.sto[ion.scatindex], vel2, enums.IonMode.STOPPING.value)
+    if ion.scale:
+        # Fast path: scaling ions have no energy loss, so stopping,
+        # straggling and the stopping based step control are not needed
+        vel = math.sqrt(2.0 * ion.E / ion.A)
+        stopping = 0.0
+    else:
+        vel1 = math.sqrt(2.0 * ion.E / ion.A)
+        sto1 = inter_sto(layer.sto[ion.scatindex], vel1, enums.IonMode.STOPPING.value)
 
-    while math.fabs(sto1 - sto2) / sto1 > c.MAXELOSS or dE >= ion.E:
-        sc = enums.ScatteringType.NO_SCATTERING.value
-        cross_layer = False
-        sto_dec = True
-        d /= 2.0  # TODO: Could use *= 0.5
         dE = sto1 * d
+
         vel2 = math.sqrt(2.0 * (max(ion.E - dE, 0.0) / ion.A))
         sto2 = inter_sto(layer.sto[ion.scatindex], vel2, enums.IonMode.STOPPING.value)
 
-    stopping = 0.5 * (sto1 + sto2)
-    vel = 0.5 * (vel1 + vel2)
+        while math.fabs(sto1 - sto2) / sto1 > c.MAXELOSS or dE >= ion.E:
+            sc = enums.ScatteringType.NO_SCATTERING.value
+            cross_layer = False
+            sto_dec = True
+            d /= 2.0  # TODO: Could use *= 0.5
+            dE = sto1 * d
+            vel2 = math.sqrt(2.0 * (max(ion.E - dE, 0.0) / ion.A))
+            sto2 = inter_sto(layer.sto[ion.scatindex], vel2, enums.IonMode.STOPPING.value)
+
+        stopping = 0.5 * (sto1 + sto2)
+        vel = 0.5 * (vel1 + vel2)
 
     if sc == enums.ScatteringType.NO_SCATTERING.value:
         d += 0.01 * c.C_ANGSTROM  # To make sure that the layer surface is crossed
@@ -252,23 +260,25 @@ def move_ion(g: oj.Global, ion: oj.Ion, target: oj.Target, snext: oj.SNext) -> i
 
     # TODO: Copy comments here
 
-    straggling = math.sqrt(inter_sto(layer.sto[ion.type], vel, enums.IonMode.STRAGGLING.value) * d)
-    straggling *= random_jit.gaussian()
-
-    eloss = d * stopping
-    if math.fabs(straggling) < eloss:
-        eloss += straggling
-    elif not ion.scale:
-        eloss += eloss * straggling / math.fabs(straggling)
+    if not ion.scale:  # No energy loss for scaling ions
+        straggling = math.sqrt(inter_sto(layer.sto[ion.type], vel, enums.IonMode.STRAGGLING.value) * d)
+        straggling *= random_jit.gaussian()
 
-    if ion.scale:  # No energy loss for scaling ions
-        eloss = 0.0
+        eloss = d * stopping
+        if math.fabs(straggling) < eloss:
+            eloss += straggling
+        else:
+            eloss += eloss * straggling / math.fabs(straggling)
 
-    ion.E -= eloss
-    ion.E = max(ion.E, 0.001 * c.C_EV)
+        ion.E -= eloss
+        ion.E = max(ion.E, 0.001 * c.C_EV)
 
-    ion.p.x += d * ion.opt.sin_theta * math.cos(ion.fii)
-    ion.p.y += d * ion.opt.sin_theta * math.sin(ion.fii)
+    if g.dircos:
+        ion.p.x += d * ion.dir.x
+        ion.p.y += d * ion.dir.y
+    else:
+        ion.p.x += d * ion.opt.sin_theta * math.cos(ion.fii)
+        ion.p.y += d * ion.opt.sin_theta * math.sin(ion.fii)
     ion.p.z += d * ion.opt.cos_theta
 
     ion.time += d / vel
@@ -366,12 +376,12 @@ def ion_finished(g: oj.Global, ion: oj.Ion, target: oj.Target) -> int:  # enums.
 # detector would be used in:
 # if g.cascades and E_recoil > 2.0 * g.emin
 @nb.njit(cache=True, nogil=True)
-def mc_scattering(g: oj.Global, ion: oj.Ion, recoil: oj.Ion, target: oj.Target,
+def mc_scattering(g: oj.Global, counters: od.Counters, ion: oj.Ion, recoil: oj.Ion, target: oj.Target,
                   detector: oj.Detector, scat: np.ndarray, snext: oj.SNext) -> bool:
     """Normal elastic scattering from a potential during the slowing down process"""
     recoils = False
 
-    g.nmc += 1  # TODO: Problematic for multi-threading
+    counters.nmc += 1
     if ion.scale:
         return False
 
@@ -432,9 +442,14 @@ def mc_scattering(g: oj.Global, ion: oj.Ion, recoil: oj.Ion, target: oj.Target,
     ion.opt.e = ion.E * s.E2eps
 
     fii = random_jit.rnd(0.0, 2.0 * c.C_PI, enums.RndPeriod.RIGHT)
-    ion_rotate(ion, cos_theta, fii)
-    if recoils:
-        ion_rotate(recoil, cos_theta_recoil, math.fmod(fii + c.C_PI, 2.0 * c.C_PI))
+    if g.dircos:
+        ion_rotate_dircos(ion, cos_theta, fii)
+        if recoils:
+            ion_rotate_dircos(recoil, cos_theta_recoil, math.fmod(fii + c.C_PI, 2.0 * c.C_PI))
+    else:
+        ion_rotate(ion, cos_theta, fii)
+        if recoils:
+            ion_rotate(recoil, cos_theta_recoil, math.fmod(fii + c.C_PI, 2.0 * c.C_PI))
     ion.nsct += 1
     return recoils
 
@@ -530,6 +545,62 @@ def ion_rotate(p: oj.Ion, cos_theta: float, fii: float) -> None:
         p.fii += 2.0 * c.C_PI
 
 
+@nb.njit(cache=True, nogil=True)
+def ion_rotate_dircos(p: oj.Ion, cos_theta: float, fii: float) -> None:
+    """Direction cosine version of ion_rotate.
+
+    Rotates the unit vector p.dir directly. p.theta and p.fii are not
+    updated, use update_angles when they are needed.
+    """
+    sin_theta = math.sqrt(math.fabs(1.0 - cos_theta * cos_theta))
+
+    x = sin_theta * math.cos(fii)
+    y = sin_theta * math.sin(fii)
+    z = cos_theta
+
+    # Sine and cosine of p.fii from the direction cosines
+    sina1 = p.opt.sin_theta
+    if sina1 > 0.0:
+        cos_fii = p.dir.x / sina1
+        sin_fii = p.dir.y / sina1
+    else:  # Moving along the z-axis, fii is arbitrary
+        cos_fii = 1.0
+        sin_fii = 0.0
+
+    rx, ry, rz = rotate_jit.rotate_direction(p.dir.z, sina1, cos_fii, sin_fii, x, y, z)
+
+    # Normalize to prevent rounding errors from accumulating
+    r = math.sqrt(rx**2 + ry**2 + rz**2)
+    p.dir.x = rx / r
+    p.dir.y = ry / r
+    p.dir.z = rz / r
+
+    p.opt.cos_theta = p.dir.z
+    p.opt.sin_theta = math.sqrt(math.fabs(1.0 - p.dir.z**2))
+
+
+@nb.njit(cache=True, nogil=True)
+def set_direction(ion: oj.Ion, theta: float, fii: float) -> None:
+    """Set ion direction angles, and update ion.opt and ion.dir to match them"""
+    ion.theta = theta
+    ion.fii = fii
+    ion.opt.cos_theta = math.cos(theta)
+    ion.opt.sin_theta = math.sin(theta)
+    ion.dir.x = ion.opt.sin_theta * math.cos(fii)
+    ion.dir.y = ion.opt.sin_theta * math.sin(fii)
+    ion.dir.z = ion.opt.cos_theta
+
+
+@nb.njit(cache=True, nogil=True)
+def update_angles(ion: oj.Ion) -> None:
+    """Calculate ion.theta and ion.fii from ion.dir.
+
+    With g.dircos, angles are not updated during transport, so this must be
+    called before they are used.
+    """
+    ion.theta, ion.fii = rotate_jit.get_angles(ion.dir.x, ion.dir.y, ion.dir.z)
+
+
 @nb.njit(cache=True, nogil=True)
 def recdist_crossing(g: oj.Global, ion: oj.Ion, target: oj.Target, dist: float) -> Tuple[bool, float]:
     # TODO: Document what dreclayer is. Probably distance to next recoil layer
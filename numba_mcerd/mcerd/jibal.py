@@ -1,7 +1,11 @@
-from dataclasses import dataclass
+import hashlib
+import os
+from dataclasses import dataclass, field
 from enum import IntEnum
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from numba_mcerd import config
 import numba_mcerd.mcerd.constants as c
@@ -11,6 +15,24 @@ MASSES_FILE = f"{config.CONSTANTS_ROOT}/masses.dat"
 ABUNDANCES_FILE = f"{config.CONSTANTS_ROOT}/abundances.dat"
 ABUNDANCE_THRESHOLD = 1e-6
 
+# Binary cache of element and isotope tables. Elements are indexed by Z and
+# the isotopes of each element are stored in order starting from offset.
+CACHE_ELEMENT_DTYPE = np.dtype([
+    ("name", "U4"),
+    ("Z", np.int64),
+    ("offset", np.int64),
+    ("count", np.int64),  # 0 if element doesn't exist
+    ("avg_mass", np.float64)
+])
+CACHE_ISOTOPE_DTYPE = np.dtype([
+    ("name", "U8"),
+    ("N", np.int64),
+    ("Z", np.int64),
+    ("A", np.int64),
+    ("mass", np.float64),
+    ("abundance", np.float64)
+])
+
 
 class JibalError(Exception):
     """Error in Jibal"""
@@ -70,28 +92,136 @@ class JibalElement:
         self.concs.append(0.0)
 
 
+def get_cache_paths(masses_file: str = MASSES_FILE, abundances_file: str = ABUNDANCES_FILE,
+                    cache_root: str = None) -> Tuple[Path, Path]:
+    """Get paths of element and isotope cache files for constants files.
+
+    The paths include a hash of the constants files, so that changed files
+    get a new cache.
+    """
+    sha = hashlib.sha256()
+    for file in (masses_file, abundances_file):
+        sha.update(Path(file).read_bytes())
+    cache_root = Path(cache_root if cache_root is not None else config.CACHE_ROOT)
+    stem = f"jibal-{sha.hexdigest()[:16]}"
+    return cache_root / f"{stem}.elements.npy", cache_root / f"{stem}.isotopes.npy"
+
+
+def _save_atomic(file: Path, array: np.ndarray) -> None:
+    """Save array so that other processes never see a partially written file"""
+    tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+    with tmp_file.open("wb") as f:
+        np.save(f, array)
+    os.replace(tmp_file, file)
+
+
+def build_cache(masses_file: str = MASSES_FILE, abundances_file: str = ABUNDANCES_FILE,
+                cache_root: str = None) -> Tuple[Path, Path]:
+    """Parse constants files and save the element and isotope tables
+
+    Returns:
+        Paths of element and isotope cache files
+    """
+    jibal = Jibal()
+    jibal.load_elements(masses_file)
+    jibal.load_abundances(abundances_file)
+    jibal.update_avg_masses()
+
+    element_table = np.zeros(max(ele.Z for ele in jibal.elements) + 1, dtype=CACHE_ELEMENT_DTYPE)
+    isotope_table = np.zeros(sum(len(ele.isotopes) for ele in jibal.elements), dtype=CACHE_ISOTOPE_DTYPE)
+    offset = 0
+    for element in sorted(jibal.elements, key=lambda ele: ele.Z):
+        count = len(element.isotopes)
+        element_table[element.Z] = element.name, element.Z, offset, count, element.avg_mass
+        isotope_table[offset:offset + count] = [
+            (iso.name, iso.N, iso.Z, iso.A, iso.mass, iso.abundance) for iso in element.isotopes]
+        offset += count
+
+    element_file, isotope_file = get_cache_paths(masses_file, abundances_file, cache_root)
+    element_file.parent.mkdir(parents=True, exist_ok=True)
+    _save_atomic(element_file, element_table)
+    _save_atomic(isotope_file, isotope_table)
+    return element_file, isotope_file
+
+
 # noinspection PyPep8Naming
 @dataclass
 class Jibal:
+    """Element and isotope database.
+
+    With a cache loaded, elements are created on first access and lookups
+    by Z, name and mass number don't search through all elements.
+    """
     elements: List[JibalElement] = None
+    _element_table: np.ndarray = field(default=None, repr=False, compare=False)
+    _isotope_table: np.ndarray = field(default=None, repr=False, compare=False)
+    _cached_elements: Dict[int, JibalElement] = field(default=None, repr=False, compare=False)
+    _names: Dict[str, int] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
         if self.elements is None:
             self.elements = []
 
     def initialize(self):
+        if config.JIBAL_CACHE:
+            self.load_cache()
+            return
         self.load_elements()
         self.load_abundances()
         self.update_avg_masses()
 
+    def load_cache(self, masses_file: str = MASSES_FILE, abundances_file: str = ABUNDANCES_FILE,
+                   cache_root: str = None) -> None:
+        """Load element and isotope tables from cache, building it first if needed.
+
+        Elements are not created until they are accessed, so `elements` only
+        contains the elements accessed so far.
+        """
+        element_file, isotope_file = get_cache_paths(masses_file, abundances_file, cache_root)
+        if not element_file.exists() or not isotope_file.exists():
+            build_cache(masses_file, abundances_file, cache_root)
+
+        self._element_table = np.load(element_file, mmap_mode="r")
+        self._isotope_table = np.load(isotope_file, mmap_mode="r")
+        self._cached_elements = {}
+        self._names = {str(name): Z for Z, name in enumerate(self._element_table["name"])
+                       if self._element_table["count"][Z] > 0}
+
+    def _create_cached_element(self, Z: int) -> JibalElement:
+        row = self._element_table[Z]
+        isotopes = self._isotope_table[row["offset"]:row["offset"] + row["count"]]
+        element = JibalElement(name=str(row["name"]), Z=int(row["Z"]), avg_mass=float(row["avg_mass"]))
+        for iso in isotopes:
+            element.add_isotope(JibalIsotope(
+                name=str(iso["name"]), N=int(iso["N"]), Z=int(iso["Z"]), A=int(iso["A"]),
+                mass=float(iso["mass"]), abundance=float(iso["abundance"])))
+        self._cached_elements[Z] = element
+        self.elements.append(element)
+        return element
+
     def get_element(self, Z: int) -> Optional[JibalElement]:
         """Get element with specific Z (proton number)"""
+        if self._element_table is not None:
+            if Z in self._cached_elements:
+                return self._cached_elements[Z]
+            if not 0 <= Z < self._element_table.shape[0] or self._element_table["count"][Z] == 0:
+                return None
+            return self._create_cached_element(Z)
         return next((ele for ele in self.elements if ele.Z == Z), None)
 
     def get_element_by_name(self, name: str) -> Optional[JibalElement]:
         """Get element by name (e.g. 'Cl')"""
+        if self._names is not None:
+            Z = self._names.get(name)
+            return self.get_element(Z) if Z is not None else None
         return next((ele for ele in self.elements if ele.name == name), None)
 
+    def get_element_count(self) -> int:
+        """Get number of elements in the database"""
+        if self._element_table is not None:
+            return len(self._names)
+        return len(self.elements)
+
     def add_element(self, element: JibalElement) -> None:
         """Add element to elements"""
         self.elements.append(element)
@@ -101,6 +231,11 @@ class Jibal:
         element = self.get_element(Z)
         if element is None:
             return None
+        if self._element_table is not None and element.isotopes:
+            # Isotopes are usually listed for consecutive neutron numbers
+            i = N - element.isotopes[0].N
+            if 0 <= i < len(element.isotopes) and element.isotopes[i].N == N:
+                return element.isotopes[i]
         return element.get_isotope_by_neutron_number(N)
 
     def get_isotope_by_mass_number(self, Z, A) -> Optional[JibalIsotope]:
@@ -209,9 +344,9 @@ class Jibal:
 
 
 def main():
-    jibal = Jibal()
-    jibal.initialize()
-    pass
+    """Build the JIBAL cache"""
+    for file in build_cache():
+        print(f"Wrote {file}")
 
 
 if __name__ == '__main__':
@@ -1,5 +1,6 @@
 import copy
 import math
+from typing import Tuple
 
 import numba as nb
 import numpy as np
@@ -8,48 +9,45 @@ import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects_dtype as od
 import numba_mcerd.mcerd.objects_jit as oj
 import numba_mcerd.mcerd.symbols as s
-from numba_mcerd.mcerd import rotate_jit, enums, copy_jit
+from numba_mcerd.mcerd import rotate_jit, enums
 
 
 @nb.njit(cache=True, nogil=True)
-def coord_transform(porig: oj.Point, theta: float, fii: float, pin: oj.Point,
-                    flag: enums.CoordTransformDirection) -> oj.Point:
+def coord_transform(ox: float, oy: float, oz: float, theta: float, fii: float,
+                    x: float, y: float, z: float,
+                    flag: enums.CoordTransformDirection) -> Tuple[float, float, float]:
     # TODO: Replace copy-paste description with own words
-    """This routine will calculate the cartesian coordinates of point pin
-    in another coordinate system. The origin of pin system in this
-    other system is given by point porig. The rotation angles of pin
-    system is given by theta and fii.
+    """This routine will calculate the cartesian coordinates of point
+    (x, y, z) in another coordinate system. The origin of the point's
+    system in this other system is given by point (ox, oy, oz). The
+    rotation angles of the point's system is given by theta and fii.
     Flag says which way the conversion is done.
-    """
-    pout = oj.Point()
 
+    Points are passed and returned as plain coordinates so that no
+    temporary point objects are allocated.
+    """
     if flag == enums.CoordTransformDirection.BACK:
-        pout.x = pin.x - porig.x
-        pout.y = pin.y - porig.y
-        pout.z = pin.z - porig.z
-    else:
-        pout.x = pin.x
-        pout.y = pin.y
-        pout.z = pin.z
+        x = x - ox
+        y = y - oy
+        z = z - oz
 
-    r = math.sqrt(pout.x**2 + pout.y**2 + pout.z**2)
+    r = math.sqrt(x**2 + y**2 + z**2)
 
     if r == 0.0:
-        copy_jit.copy_point(pout, porig)
-        return pout
+        return ox, oy, oz
 
-    in_theta = math.acos(pout.z / r)
-    in_fii = math.atan2(pout.y, pout.x)
+    in_theta = math.acos(z / r)
+    in_fii = math.atan2(y, x)
 
     out_theta, out_fii = rotate_jit.rotate(theta, fii, in_theta, in_fii)
 
-    pout.x = r * math.sin(out_theta) * math.cos(out_fii)
-    pout.y = r * math.sin(out_theta) * math.sin(out_fii)
-    pout.z = r * math.cos(out_theta)
+    x = r * math.sin(out_theta) * math.cos(out_fii)
+    y = r * math.sin(out_theta) * math.sin(out_fii)
+    z = r * math.cos(out_theta)
 
     if flag == enums.CoordTransformDirection.FORW:
-        pout.x += porig.x
-        pout.y += porig.y
-        pout.z += porig.z
+        x += ox
+        y += oy
+        z += oz
 
-    return pout
+    return x, y, z
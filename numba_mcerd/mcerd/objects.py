@@ -91,6 +91,7 @@ class Global:
     advanced_output: bool = False
     jibal: Jibal = None
     nomc: bool = False
+    dircos: bool = False  # Own addition: ion direction is transported as direction cosines (Ion.dir)
 
     def __post_init__(self):
         if self.bspot is None:
@@ -201,6 +202,7 @@ class Ion:
     scatindex: int = 0  # Index of the scattering table for this ion
     ion_i: int = 0  # "i"th recoil in the track
     E_nucl_loss_det: float = 0.0
+    dir: Point = None  # Own addition: direction of the ion as a unit vector (direction cosines)
 
     def __post_init__(self):
         if self.I is None:
@@ -219,6 +221,8 @@ class Ion:
             self.Ed = [0.0] * constants.MAXLAYERS
         if self.dt is None:
             self.dt = [0.0] * constants.MAXLAYERS
+        if self.dir is None:
+            self.dir = Point()
 
 
 @dataclass
@@ -250,6 +254,7 @@ class Scattering:
     logydiv: float = 0.0  # Logarithm for difference reduced impact parameters
     a: float = 0.0  # Reduced unit for screening length
     E2eps: float = 0.0  # Constant for changing energy unit to reduced energy
+    logE2eps: float = 0.0  # Own addition: logarithm of E2eps
     # Potential *pot;  # Originally commented out
 
     def __post_init__(self):
@@ -410,6 +415,11 @@ class Det_foil:
     size_: List[float] = None  # Diameter for circular, width and height for rect.  # len 2
     plane: Plane = None  # Plane of the detector foil
     center: Point = None  # Point of the center of the foil
+    # Own addition: unit vectors of the foil coordinate system in the laboratory
+    # coordinates. Together they form the lab -> foil rotation matrix.
+    axis_x: Point = None  # First in-plane axis
+    axis_y: Point = None  # Second in-plane axis
+    normal: Point = None  # Normal of the foil plane
 
     def __post_init__(self):
         if self.size_ is None:
@@ -418,6 +428,12 @@ class Det_foil:
             self.plane = Plane()
         if self.center is None:
             self.center = Point()
+        if self.axis_x is None:
+            self.axis_x = Point()
+        if self.axis_y is None:
+            self.axis_y = Point()
+        if self.normal is None:
+            self.normal = Point()
 
 
 @dataclass
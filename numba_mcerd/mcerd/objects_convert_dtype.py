@@ -3,7 +3,7 @@
 Warning: expect conversions to modify/break original objects and for
 converted objects to share their attributes with originals.
 """
-from typing import Any, Callable
+from typing import Any, Callable, List
 
 import numpy as np
 
@@ -65,6 +65,11 @@ def _convert_array(array) -> np.ndarray:
     raise DtypeConvertError(f"Unsupported array type: '{type(array)}'")
 
 
+def _field_length(dtype: np.dtype, name: str) -> int:
+    """Get length of an array field in dtype"""
+    return dtype[name].shape[0]
+
+
 # TODO: Correct return types for instances of dtypes?
 
 def convert_point(point: o.Point) -> od.Point:
@@ -148,33 +153,42 @@ def convert_rec_hist(rec_hist: o.Rec_hist) -> od.Rec_hist:
     return _base_convert(rec_hist, od.Rec_hist, convert)
 
 
-def convert_isotopes(isotopes: o.Isotopes) -> od.Isotopes:
+def convert_isotopes(isotopes: o.Isotopes, isotopes_dtype: np.dtype = od.Isotopes) -> od.Isotopes:
     def convert(values):
-        values["A"] = _convert_array(values["A"])
-        values["c"] = _convert_array(values["c"])
+        isotope_count = _field_length(isotopes_dtype, "A")
+        values["A"] = _convert_array(values["A"])[:isotope_count]
+        values["c"] = _convert_array(values["c"])[:isotope_count]
 
-    return _base_convert(isotopes, od.Isotopes, convert)
+    return _base_convert(isotopes, isotopes_dtype, convert)
 
 
-def convert_ion(ion: o.Ion) -> od.Ion:
+def convert_ion(ion: o.Ion, ion_dtype: np.dtype = od.Ion) -> od.Ion:
     def convert(values):
-        values["I"] = convert_isotopes(values["I"])
+        foil_count = _field_length(ion_dtype, "hit")
+        values["I"] = convert_isotopes(values["I"], ion_dtype["I"])
         values["p"] = convert_point(values["p"])
         values["status"] = values["status"].value
         values["opt"] = convert_ion_opt(values["opt"])
         values["lab"] = convert_vector(values["lab"])
         values["type"] = values["type"].value
         values["hist"] = convert_rec_hist(values["hist"])
-        values["hit"] = np.array([convert_point(point) for point in values["hit"]])
-        values["Ed"] = _convert_array(values["Ed"])
-        values["dt"] = _convert_array(values["dt"])
+        values["hit"] = np.array([convert_point(point) for point in values["hit"][:foil_count]])
+        values["Ed"] = _convert_array(values["Ed"])[:foil_count]
+        values["dt"] = _convert_array(values["dt"])[:_field_length(ion_dtype, "dt")]
+        values["dir"] = convert_point(values["dir"])
+
+    return _base_convert(ion, ion_dtype, convert)
+
 
-    return _base_convert(ion, od.Ion, convert)
+def convert_ions(ions: List[o.Ion], detector: o.Detector) -> np.ndarray:  # Array of ions
+    """Convert ions to an array with arrays sized for the ions and detector"""
+    ion_dtype = od.get_ion_dtype(ions, detector)
+    return np.array([convert_ion(ion, ion_dtype) for ion in ions])
 
 
 def convert_cross_section(cross_section: o.Cross_section) -> od.Cross_section:
     def convert(values):
-        values["b"] = np.array(values["b"], dtype=np.float64)
+        values["b"] = np.array(values["b"], dtype=od.TABLE_FLOAT)
 
     return _base_convert(cross_section, od.Cross_section, convert)
 
@@ -186,7 +200,7 @@ def convert_cross_section(cross_section: o.Cross_section) -> od.Cross_section:
 
 def convert_scattering(scat: o.Scattering) -> od.Scattering:
     def convert(values):
-        values["angle"] = np.array(values["angle"], dtype=np.float64)
+        values["angle"] = np.array(values["angle"], dtype=od.TABLE_FLOAT)
         values["cross"] = convert_cross_section(values["cross"])
         # values["pot"] =  # Originally commented out
 
@@ -220,23 +234,27 @@ def convert_target_ele(ele: o.Target_ele) -> od.Target_ele:
     return _base_convert(ele, od.Target_ele, convert)
 
 
-def convert_target_sto(sto: o.Target_sto) -> od.Target_sto:
+def convert_target_sto(sto: o.Target_sto, sto_dtype: np.dtype = od.Target_sto) -> od.Target_sto:
     def convert(values):
-        values["vel"] = _convert_array(values["vel"])
-        values["sto"] = _convert_array(values["sto"])
-        values["stragg"] = _convert_array(values["stragg"])
+        sto_length = _field_length(sto_dtype, "vel")
+        values["vel"] = _convert_array(values["vel"])[:sto_length]
+        values["sto"] = _convert_array(values["sto"])[:sto_length]
+        values["stragg"] = _convert_array(values["stragg"])[:sto_length]
 
-    return _base_convert(sto, od.Target_sto, convert)
+    return _base_convert(sto, sto_dtype, convert)
 
 
-def convert_target_layer(layer: o.Target_layer) -> od.Target_layer:
+def convert_target_layer(layer: o.Target_layer, layer_dtype: np.dtype = od.Target_layer) -> od.Target_layer:
     def convert(values):
-        values["atom"] = _convert_array(values["atom"])
-        values["N"] = _convert_array(values["N"])
-        values["sto"] = np.array([convert_target_sto(sto) for sto in values["sto"]])  # dtype needed?
+        atom_count = _field_length(layer_dtype, "atom")
+        sto_dtype = layer_dtype["sto"].base
+        values["atom"] = _convert_array(values["atom"])[:atom_count]
+        values["N"] = _convert_array(values["N"])[:atom_count]
+        if values["sto"] is not None:
+            values["sto"] = np.array([convert_target_sto(sto, sto_dtype) for sto in values["sto"]], dtype=sto_dtype)
         values["type"] = values["type"].value
 
-    return _base_convert(layer, od.Target_layer, convert)
+    return _base_convert(layer, layer_dtype, convert)
 
 
 def convert_plane(plane: o.Plane) -> od.Plane:
@@ -247,10 +265,15 @@ def convert_plane(plane: o.Plane) -> od.Plane:
 
 
 def convert_target(target: o.Target) -> od.Target:
+    target_dtype = od.get_target_dtype(target)
+
     def convert(values):
-        values["ele"] = np.array([convert_target_ele(ele) for ele in values["ele"]])
+        layer_dtype = target_dtype["layer"].base
+        ele_count = _field_length(target_dtype, "ele")
+        values["ele"] = np.array([convert_target_ele(ele) for ele in values["ele"][:ele_count]])
         values["layer"] = np.array(
-            [convert_target_layer(layer) for layer in values["layer"] if layer.type is not None])
+            [convert_target_layer(layer, layer_dtype) for layer in values["layer"] if layer.type is not None],
+            dtype=layer_dtype)
 
         values["recdist"] = np.array([convert_point2(rec) for rec in values["recdist"]])
         values["plane"] = convert_plane(values["plane"])
@@ -265,7 +288,6 @@ def convert_target(target: o.Target) -> od.Target:
             # Dummy cross to prevent errors in JIT
             values["cross"] = np.zeros((1, 1), dtype=np.float64)
 
-    target_dtype = od.get_target_dtype(target)
     return _base_convert(target, target_dtype, convert)
 
 
@@ -282,22 +304,27 @@ def convert_det_foil(foil: o.Det_foil) -> od.Det_foil:
         values["size_"] = _convert_array(values["size_"])
         values["plane"] = convert_plane(values["plane"])
         values["center"] = convert_point(values["center"])
+        values["axis_x"] = convert_point(values["axis_x"])
+        values["axis_y"] = convert_point(values["axis_y"])
+        values["normal"] = convert_point(values["normal"])
 
     return _base_convert(foil, od.Det_foil, convert)
 
 
 def convert_detector(detector: o.Detector) -> od.Detector:
+    detector_dtype = od.get_detector_dtype(detector)
+
     def convert(values):
         values["type"] = values["type"].value
         values["vsize"] = _convert_array(values["vsize"])
         values["tdet"] = _convert_array(values["tdet"])
-        values["edet"] = _convert_array(values["edet"])
+        values["edet"] = _convert_array(values["edet"])[:_field_length(detector_dtype, "edet")]
         values["foil"] = np.array(
             [convert_det_foil(foil) if foil.type is not None else np.zeros(1, dtype=od.Det_foil)[0]
-             for foil in values["foil"]])
+             for foil in values["foil"][:_field_length(detector_dtype, "foil")]])
         values["vfoil"] = convert_det_foil(values["vfoil"])
 
-    return _base_convert(detector, od.Detector, convert)
+    return _base_convert(detector, detector_dtype, convert)
 
 
 def main():
@@ -157,6 +157,7 @@ def convert_ion(ion: o.Ion) -> oj.Ion:
         values["hit"] = [convert_point(point) for point in values["hit"]]
         values["Ed"] = _convert_array(values["Ed"])
         values["dt"] = _convert_array(values["dt"])
+        values["dir"] = convert_point(values["dir"])
 
     return _base_convert(ion, oj.Ion, convert)
 
@@ -298,6 +299,9 @@ def convert_det_foil(foil: o.Det_foil) -> oj.Det_foil:
         values["size_"] = _convert_array(values["size_"])
         values["plane"] = convert_plane(values["plane"])
         values["center"] = convert_point(values["center"])
+        values["axis_x"] = convert_point(values["axis_x"])
+        values["axis_y"] = convert_point(values["axis_y"])
+        values["normal"] = convert_point(values["normal"])
 
     return _base_convert(foil, oj.Det_foil, convert)
 
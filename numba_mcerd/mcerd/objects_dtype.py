@@ -1,12 +1,20 @@
+from typing import Dict
+
 import numpy as np
 
+from numba_mcerd import config
 from numba_mcerd.mcerd import constants, enums
 
 # TODO: Copy comments from original
 
+CACHE_LINE_SIZE = 64  # Bytes
+
 LAYER_STO_COUNT_ERD = 2  # One sto for each beam ion in simulation (2 for ERD, 3 for RBS)
 LAYER_STO_COUNT_RBS = 3
 
+# Float type of interpolated lookup tables, see config.FLOAT32_TABLES
+TABLE_FLOAT = np.float32 if config.FLOAT32_TABLES else np.float64
+
 
 Point = np.dtype([
     ("x", np.float64),
@@ -101,10 +109,31 @@ Global = np.dtype([
     ("cascades", bool),
     ("advanced_output", bool),
     # ( "jibal", Jibal),
-    ("nomc", bool)
+    ("nomc", bool),
+    ("dircos", bool)
 ], align=True)
 
 
+def _pad_to_cache_line(fields: list) -> list:
+    """Add padding to the end of fields so that records fill whole cache lines"""
+    itemsize = np.dtype(fields, align=True).itemsize
+    padding = -itemsize % CACHE_LINE_SIZE
+    if padding:
+        fields = fields + [("padding", np.uint8, padding)]
+    return fields
+
+
+# Own addition: counters updated during the simulation. Global is read-only
+# in simulation loops, and each thread has its own counters. Totals are
+# stored into the Global fields with the same names after each stage.
+Counters = np.dtype(_pad_to_cache_line([
+    ("cion", np.int64),
+    ("nmc", np.int64),
+    ("cpresimu", np.int64),
+    ("finstat", np.int64, (enums.IonType.SECONDARY + 1, len(enums.IonStatus)))
+]), align=True)
+
+
 Ion_opt = np.dtype([
     ("valid", bool),
     ("cos_theta", np.float64),
@@ -139,6 +168,7 @@ Rec_hist = np.dtype([
 ], align=True)
 
 
+# Use get_isotopes_dtype in code, this is just for use as a type annotation
 Isotopes = np.dtype([
     ("A", np.float64, constants.MAXISOTOPES),
     ("c", np.float64, constants.MAXISOTOPES),
@@ -148,6 +178,17 @@ Isotopes = np.dtype([
 ], align=True)
 
 
+def get_isotopes_dtype(isotope_count: int) -> np.dtype:
+    return np.dtype([
+        ("A", np.float64, isotope_count),
+        ("c", np.float64, isotope_count),
+        ("c_sum", np.float64),
+        ("n", np.int64),
+        ("Am", np.float64)
+    ], align=True)
+
+
+# Use get_ion_dtype in code, this is just for use as a type annotation
 Ion = np.dtype([
     ("Z", np.float64),
     ("A", np.float64),
@@ -176,15 +217,54 @@ Ion = np.dtype([
     ("trackid", np.int64),
     ("scatindex", np.int64),
     ("ion_i", np.int64),
-    ("E_nucl_loss_det", np.float64)
+    ("E_nucl_loss_det", np.float64),
+    ("dir", Point)
 ], align=True)
 
 
+def get_ion_dtype(ions, detector) -> np.dtype:
+    """Get Ion dtype with arrays sized for the ions and the detector layers"""
+    isotope_count = max(max(ion.I.n for ion in ions), 1)
+    foil_count = max(detector.nfoils, 1)
+
+    return np.dtype([
+        ("Z", np.float64),
+        ("A", np.float64),
+        ("E", np.float64),
+        ("I", get_isotopes_dtype(isotope_count)),
+        ("p", Point),
+        ("theta", np.float64),
+        ("fii", np.float64),
+        ("nsct", np.int64),
+        ("status", np.int64),  # enums.IonStatus
+        ("opt", Ion_opt),
+        ("w", np.float64),
+        ("wtmp", np.float64),
+        ("time", np.float64),
+        ("tlayer", np.int64),
+        ("lab", Vector),
+        ("type", np.int64),  # enums.IonType
+        ("hist", Rec_hist),
+        ("dist", np.float64),
+        ("virtual", bool),
+        ("hit", Point, foil_count),
+        ("Ed", np.float64, foil_count),
+        ("dt", np.float64, 2),  # Only the two timing detectors
+        ("scale", bool),
+        ("effrecd", np.float64),
+        ("trackid", np.int64),
+        ("scatindex", np.int64),
+        ("ion_i", np.int64),
+        ("E_nucl_loss_det", np.float64),
+        ("dir", Point)
+    ], align=True)
+
+
 Cross_section = np.dtype([
     ("emin", np.float64),
     ("emax", np.float64),
     ("estep", np.float64),
-    ("b", np.float64, constants.EPSIMP)  # TODO: Correct size?
+    ("b", TABLE_FLOAT, constants.EPSIMP)  # TODO: Correct size?
 ], align=True)
 
 
@@ -205,14 +285,15 @@ def get_potential_dtype(u_size: int) -> Potential:
 
 
 Scattering = np.dtype([
-    ("angle", np.float64, (constants.EPSNUM, constants.YNUM)),
+    ("angle", TABLE_FLOAT, (constants.EPSNUM, constants.YNUM)),
     ("cross", Cross_section),
     ("logemin", np.float64),
     ("logymin", np.float64),
     ("logediv", np.float64),
     ("logydiv", np.float64),
     ("a", np.float64),
-    ("E2eps", np.float64)
+    ("E2eps", np.float64),
+    ("logE2eps", np.float64)  # Own addition
     # ("pot", Potential)  # Originally commented out
 ], align=True)
 
@@ -230,15 +311,27 @@ Target_ele = np.dtype([
 ], align=True)
 
 
+# Use get_target_sto_dtype in code, this is just for use as a type annotation
 Target_sto = np.dtype([
-    ("vel", np.float64, constants.MAXSTO),
-    ("sto", np.float64, constants.MAXSTO),
-    ("stragg", np.float64, constants.MAXSTO),
+    ("vel", TABLE_FLOAT, constants.MAXSTO),
+    ("sto", TABLE_FLOAT, constants.MAXSTO),
+    ("stragg", TABLE_FLOAT, constants.MAXSTO),
     ("stodiv", np.float64),
     ("n_sto", np.int64)
 ], align=True)
 
 
+def get_target_sto_dtype(sto_length: int, table_float: type = TABLE_FLOAT) -> np.dtype:
+    return np.dtype([
+        ("vel", table_float, sto_length),
+        ("sto", table_float, sto_length),
+        ("stragg", table_float, sto_length),
+        ("stodiv", np.float64),
+        ("n_sto", np.int64)
+    ], align=True)
+
+
+# Use get_target_layer_dtype in code, this is just for use as a type annotation
 Target_layer = np.dtype([
     ("natoms", np.int64),
     ("dlow", np.float64),
@@ -253,6 +346,21 @@ Target_layer = np.dtype([
 ], align=True)
 
 
+def get_target_layer_dtype(atom_count: int, sto_count: int, sto_length: int, prefix_length: int) -> np.dtype:
+    return np.dtype([
+        ("natoms", np.int64),
+        ("dlow", np.float64),
+        ("dhigh", np.float64),
+        ("atom", np.int64, atom_count),
+        ("N", np.float64, atom_count),
+        ("Ntot", np.float64),
+        ("sto", get_target_sto_dtype(sto_length), sto_count),  # One for each ion
+        ("type", np.int64),  # enums.TargetType
+        ("gas", bool),
+        ("stofile_prefix", str, prefix_length)
+    ], align=True)
+
+
 Plane = np.dtype([
     ("a", np.float64),
     ("b", np.float64),
@@ -284,12 +392,20 @@ Target = np.dtype([
 
 
 def get_target_dtype(target) -> np.dtype:
-    layer_count = sum((1 for layer in target.layer if layer.type is not None))
+    """Get Target dtype with arrays sized for the layers and atoms of target"""
+    layers = [layer for layer in target.layer if layer.type is not None]
+    layer_count = len(layers)
+    stos = [sto for layer in layers for sto in layer.sto or ()]
+    layer_dtype = get_target_layer_dtype(
+        atom_count=max(max(layer.natoms for layer in layers), 1),
+        sto_count=max(max(len(layer.sto or ()) for layer in layers), 1),
+        sto_length=max(max((sto.n_sto for sto in stos), default=0), 1),
+        prefix_length=max(max(len(layer.stofile_prefix or "") for layer in layers), 1))
 
     dtype = [
         ("minN", np.float64),
-        ("ele", Target_ele, constants.MAXELEMENTS),
-        ("layer", Target_layer, layer_count),
+        ("ele", Target_ele, max(target.natoms, 1)),
+        ("layer", layer_dtype, layer_count),
         ("nlayers", np.int64),
         ("ntarget", np.int64),
         ("natoms", np.int64),
@@ -333,10 +449,14 @@ Det_foil = np.dtype([
     ("angle", np.float64),
     ("size_", np.float64, 2),
     ("plane", Plane),
-    ("center", Point)
+    ("center", Point),
+    ("axis_x", Point),  # Own addition
+    ("axis_y", Point),  # Own addition
+    ("normal", Point)  # Own addition
 ], align=True)
 
 
+# Use get_detector_dtype in code, this is just for use as a type annotation
 Detector = np.dtype([
     ("type", np.int64),  # enums.DetectorType
     ("angle", np.float64),
@@ -352,22 +472,133 @@ Detector = np.dtype([
 ], align=True)
 
 
+def get_detector_dtype(detector) -> np.dtype:
+    """Get Detector dtype with arrays sized for the foils and energy detector layers of detector"""
+    edet_count = max((i + 1 for i, layer in enumerate(detector.edet) if layer), default=1)
+
+    return np.dtype([
+        ("type", np.int64),  # enums.DetectorType
+        ("angle", np.float64),
+        ("nfoils", np.int64),
+        ("virtual", bool),
+        ("vsize", np.float64, 2),
+        ("tdet", np.int64, 2),
+        ("edet", np.int64, edet_count),
+        ("thetamax", np.float64),
+        ("vthetamax", np.float64),
+        ("foil", Det_foil, max(detector.nfoils, 1)),
+        ("vfoil", Det_foil)
+    ], align=True)
+
+
 # TODO: specific type
 Buffer = np.ndarray
 
+# Maximum lengths of buffer column formats and names. They are stored as
+# ASCII codes, because Numba can't compile records with arrays of strings.
+BUFFER_FORMAT_LENGTH = 5
+BUFFER_NAME_LENGTH = 8
 
-def get_buffer_dtype(length: int, row_width: int) -> np.dtype:
-    dtype = [
+
+def _get_buffer_fields(length: int, row_width: int) -> list:
+    return [
         ("row_i", np.int64),
         ("col_i", np.int64),
         ("types", np.int64, (row_width,)),
-        ("formats", "U5", (row_width,)),
+        ("formats", np.uint8, (row_width, BUFFER_FORMAT_LENGTH)),  # See list_conversion.set_columns
+        ("names", np.uint8, (row_width, BUFFER_NAME_LENGTH)),  # Own addition: column names for binary output
         ("buf", np.float64, (length, row_width))
     ]
 
+
+def get_buffer_dtype(length: int, row_width: int) -> np.dtype:
+    return np.dtype(_get_buffer_fields(length, row_width), align=True)
+
+
+def get_range_buffer_dtype(length: int, depth_count: int, energy_count: int) -> np.dtype:
+    """Buffer for range output with statistics of all events.
+
+    Only up to `length` events fit in the buffer, but every event is
+    included in the statistics.
+    """
+    dtype = _get_buffer_fields(length, 2) + [
+        ("depth_limits", np.float64, (2,)),  # nm
+        ("energy_limits", np.float64, (2,)),  # MeV
+        ("stop_depth", np.int64, (depth_count,)),
+        ("trans_energy", np.int64, (energy_count,)),
+        ("depth_outside", np.int64),  # Stopped events outside of histogram limits
+        ("energy_outside", np.int64),  # Transmitted events outside of histogram limits
+        ("dropped", np.int64),  # Events that didn't fit in the buffer
+        ("stop_count", np.int64),
+        ("stop_depth_sum", np.float64),
+        ("stop_depth_sum_sq", np.float64),
+        ("trans_count", np.int64),
+        ("trans_energy_sum", np.float64),
+        ("trans_energy_sum_sq", np.float64)
+    ]
+
+    return np.dtype(dtype, align=True)
+
+
+Histograms = np.ndarray
+
+
+def get_histograms_dtype(energy_count: int, tof_count: int, depth_count: int) -> np.dtype:
+    dtype = [
+        ("energy_limits", np.float64, (2,)),  # MeV
+        ("tof_limits", np.float64, (2,)),  # ns
+        ("depth_limits", np.float64, (2,)),  # nm
+        ("tof_energy", np.float64, (tof_count, energy_count)),
+        ("depth_energy", np.float64, (depth_count, energy_count)),
+        ("outside", np.float64)  # Weight of events outside of at least one histogram
+    ]
+
+    return np.dtype(dtype, align=True)
+
+
+# Own addition: compact trackpoint for binary track output
+Trackpoint = np.dtype([
+    ("trackid", np.int64),
+    ("E", np.float32),  # MeV
+    ("x", np.float32),  # nm, target coordinates in target and lab coordinates in detector
+    ("y", np.float32),
+    ("z", np.float32),
+    ("time", np.float32),  # ns
+    ("layer", np.int32)
+], align=True)
+
+
+TrackBuffer = np.ndarray
+
+
+def get_track_buffer_dtype(length: int) -> np.dtype:
+    """Ring buffer for trackpoints"""
+    dtype = [
+        ("count", np.int64),  # Points added since the buffer was emptied
+        ("sampling", np.int64),  # Record tracks of 1 in sampling primary ions
+        ("recoil_i", np.int64),  # Recoils of the current primary ion
+        ("trackid", np.int64),  # Track of the previous point
+        ("last_E", np.float64),  # Energy at the previous point
+        ("last_layer", np.int64),  # Layer at the previous point
+        ("points", Trackpoint, (length,))
+    ]
+
     return np.dtype(dtype, align=True)
 
 
+def format_record_sizes(records: Dict[str, np.ndarray]) -> str:
+    """Format bytes per record, number of records and total bytes as a table
+
+    Args:
+        records: records or arrays of records by name
+    """
+    lines = [f"{'record':<12}{'bytes':>12}{'count':>8}{'total':>14}"]
+    for name, record in records.items():
+        record = np.asarray(record)
+        lines.append(f"{name:<12}{record.dtype.itemsize:>12}{record.size:>8}{record.nbytes:>14}")
+    return "\n".join(lines)
+
+
 def main():
     # Usage examples
 
@@ -137,6 +137,7 @@ class Master:
     "advanced_output": boolean,
     # "jibal": Jibal.class_type.instance_type,
     "nomc": boolean,
+    "dircos": boolean,
 })
 class Global:
     def __init__(self):
@@ -182,6 +183,7 @@ class Global:
         self.advanced_output = False
         # self.jibal = Jibal()
         self.nomc = False
+        self.dircos = False  # Own addition: ion direction is transported as direction cosines (Ion.dir)
 
         self.presimu.clear()
 
@@ -292,7 +294,8 @@ class Isotopes:
     "trackid": int64,
     "scatindex": int64,
     "ion_i": int64,
-    "E_nucl_loss_det": float64
+    "E_nucl_loss_det": float64,
+    "dir": Point.class_type.instance_type
 })
 class Ion:
     def __init__(self):
@@ -324,6 +327,7 @@ class Ion:
         self.scatindex = 0  # Index of the scattering table for this ion
         self.ion_i = 0  # "i"th recoil in the track
         self.E_nucl_loss_det = 0.0
+        self.dir = Point()  # Own addition: direction of the ion as a unit vector (direction cosines)
 
 
 @jitclass({
@@ -363,6 +367,7 @@ class Potential:
     "logydiv": float64,
     "a": float64,
     "E2eps": float64,
+    "logE2eps": float64,
     # "pot": Potential.class_type.instance_type
 })
 class Scattering:
@@ -375,6 +380,7 @@ class Scattering:
         self.logydiv = 0.0  # Logarithm for difference reduced impact parameters
         self.a = 0.0  # Reduced unit for screening length
         self.E2eps = 0.0  # Constant for changing energy unit to reduced energy
+        self.logE2eps = 0.0  # Own addition: logarithm of E2eps
         # self.potential = Potential()  # Originally commented out
 
 
@@ -546,7 +552,10 @@ class Line:
     "angle": float64,
     "size_": float64[:],
     "plane": Plane.class_type.instance_type,
-    "center": Point.class_type.instance_type
+    "center": Point.class_type.instance_type,
+    "axis_x": Point.class_type.instance_type,
+    "axis_y": Point.class_type.instance_type,
+    "normal": Point.class_type.instance_type
 })
 class Det_foil:
     def __init__(self):
@@ -557,6 +566,9 @@ class Det_foil:
         self.size_ = np.zeros(2, dtype=np.float64)  # Diameter for circular, width and height for rect.  # len 2
         self.plane = Plane()  # Plane of the detector foil
         self.center = Point()  # Point of the center of the foil
+        self.axis_x = Point()  # Own addition: first in-plane axis of the foil in lab coordinates
+        self.axis_y = Point()  # Own addition: second in-plane axis of the foil in lab coordinates
+        self.normal = Point()  # Own addition: normal of the foil plane in lab coordinates
 
 
 @jitclass({
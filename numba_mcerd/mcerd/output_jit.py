@@ -1,4 +1,5 @@
 import logging
+from pathlib import Path
 
 import numba as nb
 import numpy as np
@@ -7,17 +8,18 @@ import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects_jit as oj
 import numba_mcerd.mcerd.objects_dtype as od
 import numba_mcerd.list_conversion as lc
-from numba_mcerd import logging_jit
-from numba_mcerd.mcerd import erd_detector_jit, enums
+from numba_mcerd import config, logging_jit, threading_info
+from numba_mcerd.mcerd import erd_detector_jit, enums, histogram_jit
 
 
-def create_erd_buffer(g: oj.Global, additional_multiplier: float = 1.0) -> od.Buffer:
+def create_erd_buffer(g: oj.Global, additional_multiplier: float = 1.0, length: int = None) -> od.Buffer:
     """Create a buffer for ERD output
 
     Args:
         g: global settings. `nsimu` affects the buffer size
         additional_multiplier: additional multiplier for buffer size (for use
             with multithreading).
+        length: buffer size, overrides the size determined from `nsimu`
 
     Returns:
         A buffer object
@@ -28,24 +30,69 @@ def create_erd_buffer(g: oj.Global, additional_multiplier: float = 1.0) -> od.Bu
     elif g.advanced_output:
         raise NotImplementedError
     elif g.output_trackpoints:
-        raise NotImplementedError
+        width = 12
+        types = [t.STR, t.STR, t.STR, t.INT, t.FLOAT, t.INT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT]
+        formats = ["", "", "", "12d", "8.4f", "3d", "6.2f", "10.4f", "14.7e", "10.3f", "7.2f", "7.2f"]
+        names = ["scale", "virtual", "simtype", "trackid", "E", "Z", "A", "depth", "w", "tof", "x", "y"]
     else:
         width = 11
-        types = np.array(
-            [t.STR, t.STR, t.STR, t.FLOAT, t.INT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT])
-        formats = np.array(["", "", "", "8.4f", "3d", "6.2f", "10.4f", "14.7e", "10.3f", "7.2f", "7.2f"], dtype="U5")
+        types = [t.STR, t.STR, t.STR, t.FLOAT, t.INT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT]
+        formats = ["", "", "", "8.4f", "3d", "6.2f", "10.4f", "14.7e", "10.3f", "7.2f", "7.2f"]
+        names = ["scale", "virtual", "simtype", "E", "Z", "A", "depth", "w", "tof", "x", "y"]
 
     # TODO: Figure out a good way to determine length
-    length = int(g.nsimu * 0.2 * additional_multiplier)
+    if length is None:
+        length = int(g.nsimu * 0.2 * additional_multiplier)
 
     dt = od.get_buffer_dtype(length, width)
     erd_buf = np.zeros(1, dtype=dt)[0]
-    erd_buf["types"] = types
-    erd_buf["formats"] = formats
+    lc.set_columns(erd_buf, types, formats, names)
 
     return erd_buf
 
 
+def get_run_info(g: oj.Global) -> dict:
+    """Get run configuration for binary output headers"""
+    return {
+        "seed": int(g["seed"]),
+        "nsimu": int(g["nsimu"]),
+        "npresimu": int(g["npresimu"]),
+        "nscale": int(g["nscale"]),
+        "simtype": enums.SimType(g["simtype"]).name,
+        "recwidth": enums.RecWidth(g["recwidth"]).name,
+        "beamangle": float(g["beamangle"]),
+        "emin": float(g["emin"]),
+        "ionemax": float(g["ionemax"])
+    }
+
+
+def write_erd_buffer(g: oj.Global, erd_buf: od.Buffer, file) -> None:
+    """Write ERD buffer contents to file in the format selected in config"""
+    if config.OUTPUT_FORMAT == "binary":
+        lc.buffer_to_binary_file(erd_buf, file, get_run_info(g))
+    elif config.OUTPUT_FORMAT == "mmap":
+        # Events are written directly to the event file with output_erd_event
+        if erd_buf["row_i"] > 0:
+            raise NotImplementedError("Memory-mapped output is only supported in parallel mode")
+    else:
+        lc.buffer_to_file(erd_buf, file)
+
+
+def create_event_file(g: oj.Global, file, capacity: int) -> lc.EventFile:
+    """Create a memory-mapped event file for ERD output
+
+    Args:
+        g: global settings
+        file: path of the event file
+        capacity: maximum number of events
+
+    Returns:
+        An event file with the same columns as ERD buffers
+    """
+    erd_buf = create_erd_buffer(g, length=0)
+    return lc.EventFile(erd_buf, file, capacity, get_run_info(g))
+
+
 @nb.njit(cache=True, nogil=True)
 def _output_tof(g: oj.Global, cur_ion: oj.Ion, target: oj.Target,
                 detector: oj.Detector, buf: od.Buffer) -> None:
@@ -120,20 +167,69 @@ def _output_gas(g: oj.Global, cur_ion: oj.Ion, target: oj.Target,
     raise NotImplementedError
 
 
+@nb.njit(cache=True, nogil=True)
+def _is_tof_output(g: oj.Global, cur_ion: oj.Ion, target: oj.Target, detector: oj.Detector) -> bool:
+    # Actually output if: a secondary particle (not the primary beam) is either:
+    # 1. In the last layer
+    # 2. In the energy detector or beyond (if we are outputting trackpoints and energy detector layer is given)
+    # 3. The particle missed (exited detector, hit an aperture), but output misses is on.
+    return cur_ion.type == enums.IonType.SECONDARY and (
+        cur_ion.tlayer == target.nlayers or
+        erd_detector_jit.is_in_energy_detector(g, cur_ion, target, detector, True) or
+        cur_ion.status == enums.IonStatus.FIN_OUT_DET and g.output_misses)
+
+
 @nb.njit(cache=True, nogil=True)
 def output_erd(g: oj.Global, cur_ion: oj.Ion, target: oj.Target,
                detector: oj.Detector, erd_buf: od.Buffer) -> None:
     """Output ERD information to master.fperd"""
     if detector.type == enums.DetectorType.TOF:
-        # Actually output if: a secondary particle (not the primary beam) is either:
-        # 1. In the last layer
-        # 2. In the energy detector or beyond (if we are outputting trackpoints and energy detector layer is given)
-        # 3. The particle missed (exited detector, hit an aperture), but output misses is on.
-        if cur_ion.type == enums.IonType.SECONDARY and (
-                cur_ion.tlayer == target.nlayers or
-                erd_detector_jit.is_in_energy_detector(g, cur_ion, target, detector, True) or
-                cur_ion.status == enums.IonStatus.FIN_OUT_DET and g.output_misses):
+        if _is_tof_output(g, cur_ion, target, detector):
+            _output_tof(g, cur_ion, target, detector, erd_buf)
+        return
+    elif detector.type == enums.DetectorType.GAS:
+        _output_gas(g, cur_ion, target, detector)
+    # Other types are ignored, namely DET_FOIL
+
+
+@nb.njit(cache=True, nogil=True)
+def histogram_erd(g: oj.Global, cur_ion: oj.Ion, target: oj.Target,
+                  detector: oj.Detector, hist: od.Histograms) -> None:
+    """Add ERD information to histograms instead of outputting it.
+
+    The same events as in output_erd are added, weighted by cur_ion.w.
+    """
+    if detector.type == enums.DetectorType.TOF:
+        if _is_tof_output(g, cur_ion, target, detector):
+            histogram_jit.add_erd(
+                hist,
+                cur_ion.E / c.C_MEV,
+                (cur_ion.dt[1] - cur_ion.dt[0]) / c.C_NS,
+                cur_ion.hist.tar_recoil.p.z / c.C_NM,
+                cur_ion.w)
+        return
+    elif detector.type == enums.DetectorType.GAS:
+        _output_gas(g, cur_ion, target, detector)
+    # Other types are ignored, namely DET_FOIL
+
+
+@nb.njit(cache=True, nogil=True)
+def output_erd_event(g: oj.Global, cur_ion: oj.Ion, target: oj.Target, detector: oj.Detector,
+                     erd_buf: od.Buffer, event_rows: np.ndarray, event_cursor: np.ndarray) -> None:
+    """Output ERD information directly to a memory-mapped event file.
+
+    The event is formatted into the first row of erd_buf and copied to a
+    row reserved by atomically incrementing event_cursor[0]. Events that
+    don't fit in event_rows are dropped, but still reserve a row.
+    """
+    if detector.type == enums.DetectorType.TOF:
+        if _is_tof_output(g, cur_ion, target, detector):
+            erd_buf["row_i"] = 0
             _output_tof(g, cur_ion, target, detector, erd_buf)
+            erd_buf["row_i"] = 0
+            row_i = threading_info.atomic_add(event_cursor, 0, 1)
+            if row_i < event_rows.shape[0]:
+                event_rows[row_i, :] = erd_buf["buf"][0]
         return
     elif detector.type == enums.DetectorType.GAS:
         _output_gas(g, cur_ion, target, detector)
@@ -153,6 +249,107 @@ def output_data(g: oj.Global) -> None:
         logging.info(f"Calculated {nion} of {nmaxion} ions {100.0 * nion / nmaxion:.0}%")
 
 
-def output_trackpoint(
-        g: oj.Global, cur_ion: oj.Ion, target: oj.Target, detector: oj.Detector, label: str) -> None:
-    raise NotImplementedError
+def create_track_buffer(g: oj.Global) -> od.TrackBuffer:
+    """Create a ring buffer for trackpoints
+
+    The buffer holds config.TRACKPOINT_BUFFER_SIZE points, or none if
+    trackpoint output is disabled.
+    """
+    length = config.TRACKPOINT_BUFFER_SIZE if g.output_trackpoints else 0
+
+    track_buf = np.zeros(1, dtype=od.get_track_buffer_dtype(length))[0]
+    track_buf["sampling"] = config.TRACKPOINT_SAMPLING
+
+    return track_buf
+
+
+@nb.njit(cache=True, nogil=True)
+def get_trackid(g: oj.Global, counters: od.Counters, cur_ion: oj.Ion, track_buf: od.TrackBuffer) -> int:
+    """Get track ID of ion, or 0 if the primary ion is not sampled.
+
+    The last four digits of the ID are the number of the recoil (0 for the
+    primary ion) and the rest is the index of the primary ion plus one.
+    Presimulation ions are not sampled.
+    """
+    if g.simstage == enums.SimStage.PRE or counters.cion % track_buf.sampling != 0:
+        return 0
+    if cur_ion.type == enums.IonType.PRIMARY:
+        return (counters.cion + 1) * 10000
+    return (counters.cion + 1) * 10000 + track_buf.recoil_i % 10000
+
+
+@nb.njit(cache=True, nogil=True)
+def start_track(g: oj.Global, counters: od.Counters, cur_ion: oj.Ion, target: oj.Target,
+                track_buf: od.TrackBuffer) -> None:
+    """Start a new track for a created primary ion or recoil and add its first point"""
+    if cur_ion.type == enums.IonType.PRIMARY:
+        track_buf.recoil_i = 0
+    else:
+        track_buf.recoil_i += 1
+    output_trackpoint(g, counters, cur_ion, target, track_buf, True)
+
+
+@nb.njit(cache=True, nogil=True)
+def output_trackpoint(g: oj.Global, counters: od.Counters, cur_ion: oj.Ion, target: oj.Target,
+                      track_buf: od.TrackBuffer, force: bool) -> None:
+    """Add the current state of a sampled ion to the trackpoint ring buffer.
+
+    A point is added when the ion moves to another layer and whenever the
+    ion has lost TRACKPOINT_INTERVAL of energy since the previous point
+    (TRACKPOINT_INTERVAL_SMALL below TRACKPOINT_LIMIT_SMALL). Use force to
+    add a point regardless, e.g. at the start or end of a track. The
+    oldest points are overwritten if the buffer is full.
+    """
+    trackid = get_trackid(g, counters, cur_ion, track_buf)
+    if trackid == 0:
+        return
+
+    if trackid == track_buf.trackid and cur_ion.tlayer == track_buf.last_layer:
+        if cur_ion.E == track_buf.last_E:
+            return  # Same as the previous point
+        if not force:
+            if cur_ion.E < c.TRACKPOINT_LIMIT_SMALL:
+                interval = c.TRACKPOINT_INTERVAL_SMALL
+            else:
+                interval = c.TRACKPOINT_INTERVAL
+            if track_buf.last_E - cur_ion.E < interval:
+                return
+
+    track_buf.trackid = trackid
+    track_buf.last_E = cur_ion.E
+    track_buf.last_layer = cur_ion.tlayer
+
+    point = track_buf.points[track_buf.count % track_buf.points.shape[0]]
+    point.trackid = trackid
+    point.E = cur_ion.E / c.C_MEV
+    if cur_ion.tlayer < target.ntarget:
+        p = cur_ion.p
+    else:
+        p = cur_ion.lab.p
+    point.x = p.x / c.C_NM
+    point.y = p.y / c.C_NM
+    point.z = p.z / c.C_NM
+    point.time = cur_ion.time / c.C_NS
+    point.layer = cur_ion.tlayer
+
+    track_buf.count += 1
+
+
+def get_track_path(track_file) -> Path:
+    """Get path of binary trackpoint file that corresponds to track output file"""
+    return Path(track_file).with_suffix(".trackb")
+
+
+def write_track_buffer(g: oj.Global, track_buf: od.TrackBuffer, file) -> None:
+    """Append trackpoints from ring buffer to binary file in order and empty the buffer"""
+    length = track_buf["points"].shape[0]
+    count = track_buf["count"]
+    if count > length:
+        logging.warning(f"Trackpoint buffer full, {count - length} oldest points dropped")
+        start = count % length
+        points = np.concatenate((track_buf["points"][start:], track_buf["points"][:start]))
+    else:
+        points = track_buf["points"][:count]
+
+    lc.trackpoints_to_binary_file(points, file, get_run_info(g))
+    track_buf["count"] = 0
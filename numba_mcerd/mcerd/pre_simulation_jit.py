@@ -4,9 +4,11 @@ import numba as nb
 import numpy as np
 
 import numba_mcerd.mcerd.constants as c
+import numba_mcerd.mcerd.objects_dtype as od
 import numba_mcerd.mcerd.objects_jit as oj
+from numba_mcerd import list_conversion as lc, run_log
 from numba_mcerd.mcerd import enums
-from numba_mcerd.mcerd import rotate_jit
+from numba_mcerd.mcerd import ion_simu_jit, rotate_jit
 
 NPRESIMU = 500
 
@@ -16,36 +18,48 @@ class FitError(Exception):
 
 
 @nb.njit(cache=True, nogil=True)
-def finish_presimulation(g: oj.Global, presimus: np.ndarray, detector: oj.Detector, recoil: oj.Ion) -> None:
+def finish_presimulation(g: oj.Global, counters: od.Counters, presimus: np.ndarray, detector: oj.Detector,
+                         recoil: oj.Ion) -> None:
     """In the presimulation stage we save the recoil angle relative to the
     detector when the recoil comes out of the target. Also the recoil
     depth and layer are saved for later use.
     """
+    if g.dircos:
+        ion_simu_jit.update_angles(recoil)
+
     # Recoil direction in the laboratory coordinate system
     theta_lab, fii_lab = rotate_jit.rotate(recoil.lab.theta, recoil.lab.fii, recoil.theta, recoil.fii)
 
     # Recoil direction in the detector coordinate system
     theta, fii = rotate_jit.rotate(detector.angle, c.C_PI, theta_lab, fii_lab)
 
-    presimus[g.cpresimu].depth = recoil.hist.tar_recoil.p.z
-    presimus[g.cpresimu].angle = theta
-    presimus[g.cpresimu].layer = recoil.hist.layer
-    g.cpresimu += 1
+    presimus[counters.cpresimu].depth = recoil.hist.tar_recoil.p.z
+    presimus[counters.cpresimu].angle = theta
+    presimus[counters.cpresimu].layer = recoil.hist.layer
+    counters.cpresimu += 1
 
 
 def _output_to_files(g: oj.Global, master: oj.Master, target: oj.Target, detector: oj.Detector,
-                     depth: np.ndarray, angle: np.ndarray, nlayer: np.ndarray, ab_history: np.ndarray) -> None:
+                     depth: np.ndarray, angle: np.ndarray, nlayer: np.ndarray, ab_history: np.ndarray,
+                     log: run_log.RunLog) -> None:
     """Output analyze_presimulation information to files."""
     out_lines = []
 
     a, b = ab_history[0]
     ab_i = 1
 
+    t = lc.TypeInt
+    point_types = np.array([t.INT, t.FLOAT, t.FLOAT])
+    # C code uses format code 'i' instead of 'd', but Python doesn't
+    # support 'i' for int anymore so 'd' is used instead
+    point_formats = np.array(["3d", "10.4f", "10.4f"])
+
     for i in range(target.ntarget):
-        for j in range(nlayer[i]):
-            # C code uses format code 'i' instead of 'd', but Python doesn't
-            # support 'i' for int anymore so 'd' is used instead
-            out_lines.append(f"{i:3d} {depth[i, j] / c.C_NM:10.4f} {angle[i, j] / c.C_DEG:10.4f}\n")
+        points = np.column_stack((
+            np.full(nlayer[i], i, dtype=np.float64),
+            depth[i, :nlayer[i]] / c.C_NM,
+            angle[i, :nlayer[i]] / c.C_DEG))
+        out_lines.extend(lc.format_rows(points, point_types, point_formats))
 
         out_lines.append("\n")
         out_lines.append(
@@ -63,20 +77,17 @@ def _output_to_files(g: oj.Global, master: oj.Master, target: oj.Target, detecto
         out_lines.append(f"{i:3d} {x_temp:10.5f} {y_temp:10.5f}\n")
         pre_lines.append(f"{x_temp:14.5e} {y_temp:14.5e}\n")
 
-    f = open(master.fpout, "a")
-    f.writelines(out_lines)
-    f.close()
+    log.writelines(master.fpout, out_lines)
 
     # TODO: Move pre_file path to master
-    pre_file = f"{g.basename}.pre"
-    f = open(pre_file, "w")   # mode="w" overwrites
-    f.writelines(pre_lines)
-    f.close()
+    pre_file = lc.add_compression_suffix(f"{g.basename}.pre")
+    log.open(pre_file, "w")  # mode="w" overwrites
+    log.writelines(pre_file, pre_lines)
 
 
 # TODO: finish presimus migration
 def analyze_presimulation(g: oj.Global, presimus: np.ndarray, master: oj.Master, target: oj.Target,
-                          detector: oj.Detector) -> None:
+                          detector: oj.Detector, log: run_log.RunLog) -> None:
     """We determine here the solid angle as function of recoiling depth
     and layer, which contains all but PRESIMU_LEVEL portion of the
     recoils (typically 99%). The result is given as a linear fit
@@ -142,7 +153,7 @@ def analyze_presimulation(g: oj.Global, presimus: np.ndarray, master: oj.Master,
                     5.0 * c.C_DEG + 1.1 * detector.thetamax \
                     * max(1.0, max(detector.vsize[0], detector.vsize[1]))
 
-    _output_to_files(g, master, target, detector, depth, angle, nlayer, ab_history)
+    _output_to_files(g, master, target, detector, depth, angle, nlayer, ab_history, log)
 
     print("Presimulation finished")
     g.simstage = enums.SimStage.REAL
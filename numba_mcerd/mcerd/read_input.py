@@ -8,6 +8,7 @@ import numba_mcerd.mcerd.constants as c
 import numba_mcerd.mcerd.objects as o
 import numba_mcerd.mcerd.symbols as s
 
+from numba_mcerd import config
 from numba_mcerd.config import rand
 from numba_mcerd.mcerd import read_target, read_detector, init_detector, enums
 from numba_mcerd.mcerd.jibal import JibalSelectIsotopes
@@ -282,7 +283,8 @@ def read_input(g: o.Global, primary_ion: o.Ion, secondary_ion: o.Ion, tertiary_i
             nscale, _ = get_float(value)
             g.nscale = int(nscale)
         elif key == SettingsLine.I_TRACKP.value:
-            raise NotImplementedError
+            output_trackpoints, _ = get_word(value)
+            g.output_trackpoints = output_trackpoints.lower() == "true"
         elif key == SettingsLine.I_MISSES.value:
             raise NotImplementedError
         elif key == SettingsLine.I_CASCADES.value:
@@ -298,6 +300,10 @@ def read_input(g: o.Global, primary_ion: o.Ion, secondary_ion: o.Ion, tertiary_i
         else:
             raise NotImplementedError
 
+    if config.SEED is not None:
+        g.seed = config.SEED
+        rand.seed_rnd(g.seed)
+
     p1, p2, p3 = o.Point(), o.Point(), o.Point()
 
     p2.y = 1.0
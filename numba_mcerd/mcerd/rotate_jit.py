@@ -63,3 +63,63 @@ def rotate(theta2, fii2, theta1, fii1) -> Tuple[float, float]:
         fii += 2.0 * PI
 
     return theta, fii
+
+
+@nb.njit(cache=True, nogil=True)
+def get_direction(theta: float, fii: float) -> Tuple[float, float, float]:
+    """Convert direction angles theta, fii to a unit vector (direction cosines)"""
+    sin_theta = math.sin(theta)
+    return sin_theta * math.cos(fii), sin_theta * math.sin(fii), math.cos(theta)
+
+
+@nb.njit(cache=True, nogil=True)
+def get_angles(x: float, y: float, z: float) -> Tuple[float, float]:
+    """Convert a unit vector (direction cosines) to direction angles theta, fii.
+
+    Inverse of get_direction. fii is in [0, 2*PI[.
+    """
+    z = max(min(z, 1.0), -1.0)  # Clamp z to [-1.0, 1.0]
+
+    theta = math.acos(z)
+    if x != 0.0 or y != 0.0:
+        fii = math.atan2(y, x)
+    else:
+        fii = 0.0
+    if fii < 0.0:
+        fii += 2.0 * PI
+
+    return theta, fii
+
+
+@nb.njit(cache=True, nogil=True)
+def rotate_direction(cos_theta2: float, sin_theta2: float, cos_fii2: float, sin_fii2: float,
+                     x: float, y: float, z: float) -> Tuple[float, float, float]:
+    """Same coordinate transform as in rotate, but for a unit vector.
+
+    The angles theta2, fii2 of the second coordinate system are given as
+    sines and cosines, and the direction is given and returned as a unit
+    vector (x, y, z), so no trigonometric functions are evaluated.
+    """
+    cosa1 = cos_theta2
+    sina1 = sin_theta2
+
+    # cos(fii2 + PI / 2) and sin(fii2 + PI / 2)
+    cosa2 = -sin_fii2
+    sina2 = cos_fii2
+
+    cosa3 = cosa2
+    sina3 = -sina2
+
+    rx = (x * (cosa3 * cosa2 - cosa1 * sina2 * sina3)
+          + y * (-sina3 * cosa2 - cosa1 * sina2 * cosa3)
+          + z * sina1 * sina2)
+
+    ry = (x * (cosa3 * sina2 + cosa1 * cosa2 * sina3)
+          + y * (-sina3 * sina2 + cosa1 * cosa2 * cosa3)
+          - z * sina1 * cosa2)
+
+    rz = (x * sina1 * sina3
+          + y * sina1 * cosa3
+          + z * cosa1)
+
+    return rx, ry, rz
@@ -1,4 +1,5 @@
 import math
+from typing import Tuple
 
 import numba as nb
 import numpy as np
@@ -11,7 +12,8 @@ from numba_mcerd.mcerd import ion_simu_jit, enums, misc_jit, rotate_jit, erd_det
 
 @nb.njit(cache=True, nogil=True)
 def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.Detector,
-                         p_virt_lab: oj.Point, p_out_tar: oj.Point) -> None:
+                         p_virt_lab: Tuple[float, float, float],
+                         p_out_tar: Tuple[float, float, float]) -> None:
     """Calculate a random projection point from virtual detector to
     the real detector, and correct the ion energy according to the
     changed kinematics.
@@ -61,21 +63,19 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
 
     # m1 = m2 = dE1 = dw = 0.0
 
-    v_real_foil = oj.Vector()
+    # Vectors are kept in local scalars to avoid allocating temporary objects
 
+    real_foil_x = real_foil_y = 0.0
     if det.vfoil.type == enums.FoilType.CIRC:
         r = det.foil[0]["size_"][0] * math.sqrt(random_jit.rnd(0.0, 1.0, enums.RndPeriod.CLOSED))
         fii = random_jit.rnd(0.0, 2.0 * c.C_PI, enums.RndPeriod.CLOSED)
-        v_real_foil.p.x = r * math.cos(fii)
-        v_real_foil.p.y = r * math.sin(fii)
+        real_foil_x = r * math.cos(fii)
+        real_foil_y = r * math.sin(fii)
     elif det.vfoil.type == enums.FoilType.RECT:
         dx = det.foil[0]["size_"][0]
-        v_real_foil.p.x = random_jit.rnd(-dx, dx, enums.RndPeriod.CLOSED)
+        real_foil_x = random_jit.rnd(-dx, dx, enums.RndPeriod.CLOSED)
         dy = det.foil[0]["size_"][1]
-        v_real_foil.p.y = random_jit.rnd(-dy, dy, enums.RndPeriod.CLOSED)
-    v_real_foil.p.z = 0.0
-    theta = det.angle
-    fii = 0.0
+        real_foil_y = random_jit.rnd(-dy, dy, enums.RndPeriod.CLOSED)
 
     v_recvirt_pri = ion.hist.ion_recoil
     v_rec_tar = ion.hist.tar_recoil
@@ -85,37 +85,31 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
     # given in the coordinates relative to the recoil point. Directions
     # are still in the laboratory coordinates.
 
-    v_virt_lab = oj.Vector()
-
     # Copying and subtraction combined (compared to original)
-    v_virt_lab.p.x = p_virt_lab.x - v_rec_lab.p.x
-    v_virt_lab.p.y = p_virt_lab.y - v_rec_lab.p.y
-    v_virt_lab.p.z = p_virt_lab.z - v_rec_lab.p.z
+    virt_lab_x = p_virt_lab[0] - v_rec_lab.p.x
+    virt_lab_y = p_virt_lab[1] - v_rec_lab.p.y
+    virt_lab_z = p_virt_lab[2] - v_rec_lab.p.z
 
-    r = math.sqrt(v_virt_lab.p.x**2 + v_virt_lab.p.y**2 + v_virt_lab.p.z**2)
-    v_virt_lab.theta = math.acos(v_virt_lab.p.z / r)
-    v_virt_lab.fii = math.atan2(v_virt_lab.p.y, v_virt_lab.p.x)
+    r = math.sqrt(virt_lab_x**2 + virt_lab_y**2 + virt_lab_z**2)
+    virt_lab_theta = math.acos(virt_lab_z / r)
+    virt_lab_fii = math.atan2(virt_lab_y, virt_lab_x)
 
-    v_real_lab = oj.Vector()
-    v_real_lab.p = misc_jit.coord_transform(
-        det.vfoil.center, theta, fii, v_real_foil.p, enums.CoordTransformDirection.FORW)
+    real_lab_x, real_lab_y, real_lab_z = erd_detector_jit.foil_to_lab(det.vfoil, real_foil_x, real_foil_y)
 
-    v_real_lab.p.x -= v_rec_lab.p.x
-    v_real_lab.p.y -= v_rec_lab.p.y
-    v_real_lab.p.z -= v_rec_lab.p.z
+    real_lab_x -= v_rec_lab.p.x
+    real_lab_y -= v_rec_lab.p.y
+    real_lab_z -= v_rec_lab.p.z
 
-    r = math.sqrt(v_real_lab.p.x**2 + v_real_lab.p.y**2 + v_real_lab.p.z**2)
+    r = math.sqrt(real_lab_x**2 + real_lab_y**2 + real_lab_z**2)
 
-    v_real_lab.theta = math.acos(v_real_lab.p.z / r)
-    v_real_lab.fii = math.atan2(v_real_lab.p.y, v_real_lab.p.x)
+    real_lab_theta = math.acos(real_lab_z / r)
+    real_lab_fii = math.atan2(real_lab_y, real_lab_x)
 
-    v_diff_lab = oj.Vector()
-    v_diff_lab.theta, v_diff_lab.fii = rotate_jit.rotate(
-        v_virt_lab.theta, c.C_PI + v_virt_lab.fii, v_real_lab.theta, v_real_lab.fii)
+    diff_lab_theta, diff_lab_fii = rotate_jit.rotate(
+        virt_lab_theta, c.C_PI + virt_lab_fii, real_lab_theta, real_lab_fii)
 
-    v_recreal_pri = oj.Vector()
-    v_recreal_pri.theta, v_recreal_pri.fii = rotate_jit.rotate(
-        v_recvirt_pri.theta, v_recvirt_pri.fii, v_diff_lab.theta, v_diff_lab.fii)
+    recreal_pri_theta, recreal_pri_fii = rotate_jit.rotate(
+        v_recvirt_pri.theta, v_recvirt_pri.fii, diff_lab_theta, diff_lab_fii)
 
     if g.simtype == enums.SimType.RBS:
         raise NotImplementedError
@@ -125,7 +119,7 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
 
     dE1 = 0.0
     if g.simtype == enums.SimType.ERD:
-        dE1 = (math.cos(v_recreal_pri.theta) / math.cos(v_recvirt_pri.theta)) **2 - 1.0
+        dE1 = (math.cos(recreal_pri_theta) / math.cos(v_recvirt_pri.theta)) **2 - 1.0
     elif g.simtype == enums.SimType.RBS:
         raise NotImplementedError
 
@@ -137,34 +131,33 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
     # p_rec_tar is in the coordinates of the target coordinate system
 
     p_rec_tar = misc_jit.coord_transform(
-        v_rec_lab.p, g.beamangle, c.C_PI, v_rec_tar.p, enums.CoordTransformDirection.FORW)
+        v_rec_lab.p.x, v_rec_lab.p.y, v_rec_lab.p.z, g.beamangle, c.C_PI,
+        v_rec_tar.p.x, v_rec_tar.p.y, v_rec_tar.p.z, enums.CoordTransformDirection.FORW)
 
-    v_virt_tar = oj.Vector()
-    v_virt_tar.p.x = p_out_tar.x - p_rec_tar.x
-    v_virt_tar.p.y = p_out_tar.y - p_rec_tar.y
-    v_virt_tar.p.z = p_out_tar.z - p_rec_tar.z
+    virt_tar_x = p_out_tar[0] - p_rec_tar[0]
+    virt_tar_y = p_out_tar[1] - p_rec_tar[1]
+    virt_tar_z = p_out_tar[2] - p_rec_tar[2]
 
-    r = math.sqrt(v_virt_tar.p.x**2 + v_virt_tar.p.y**2 + v_virt_tar.p.z**2)
+    r = math.sqrt(virt_tar_x**2 + virt_tar_y**2 + virt_tar_z**2)
 
-    v_virt_tar.theta = math.acos(v_virt_tar.p.z / r)
-    v_virt_tar.fii = math.atan2(v_virt_tar.p.y, v_virt_tar.p.x)
+    virt_tar_theta = math.acos(virt_tar_z / r)
+    virt_tar_fii = math.atan2(virt_tar_y, virt_tar_x)
 
     # Here v_virt_tar direction is in laboratory coordinates. We now calculate
     # the directions in target coordinates for both virtual and real.
 
-    v_real_tar = oj.Vector()
-    v_real_tar.theta, v_real_tar.fii = rotate_jit.rotate(
-        v_virt_tar.theta, v_virt_tar.fii, v_diff_lab.theta, v_diff_lab.fii)
+    real_tar_theta, real_tar_fii = rotate_jit.rotate(
+        virt_tar_theta, virt_tar_fii, diff_lab_theta, diff_lab_fii)
 
-    v_virt_tar.theta, v_virt_tar.fii = rotate_jit.rotate(
-        g.beamangle, 0.0, v_virt_tar.theta, v_virt_tar.fii)
+    virt_tar_theta, virt_tar_fii = rotate_jit.rotate(
+        g.beamangle, 0.0, virt_tar_theta, virt_tar_fii)
 
-    v_real_tar.theta, v_real_tar.fii = rotate_jit.rotate(
-        g.beamangle, 0.0, v_real_tar.theta, v_real_tar.fii)
+    real_tar_theta, real_tar_fii = rotate_jit.rotate(
+        g.beamangle, 0.0, real_tar_theta, real_tar_fii)
 
     eloss = ion.hist.recoil_E - ion.E
 
-    dE2 = get_eloss_corr(ion, target, dE1, v_virt_tar.theta, v_real_tar.theta)
+    dE2 = get_eloss_corr(ion, target, dE1, virt_tar_theta, real_tar_theta)
 
     dE1 *= ion.hist.recoil_E
     dE2 *= -eloss
@@ -174,7 +167,7 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
 
     dw = 0.0
     if g.simtype == enums.SimType.ERD:
-        dw = (math.cos(v_recvirt_pri.theta) / math.cos(v_recreal_pri.theta))**3
+        dw = (math.cos(v_recvirt_pri.theta) / math.cos(recreal_pri_theta))**3
     elif g.simtype == enums.SimType.RBS:
         raise NotImplementedError
 
@@ -197,17 +190,16 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
         # fprintf(stderr, "Unphysical RBS-scattering in virtual detector\n")
 
     if ion.status == enums.IonStatus.NOT_FINISHED:
-        v_real_lab.p.x += v_rec_lab.p.x
-        v_real_lab.p.y += v_rec_lab.p.y
-        v_real_lab.p.z += v_rec_lab.p.z
+        real_lab_x += v_rec_lab.p.x
+        real_lab_y += v_rec_lab.p.y
+        real_lab_z += v_rec_lab.p.z
 
-        dist = erd_detector_jit.get_distance(p_out_tar, v_real_lab.p)
+        dist = erd_detector_jit.get_distance(p_out_tar, (real_lab_x, real_lab_y, real_lab_z))
         ion.time += dist / math.sqrt(2.0 * ion.E / ion.A)
 
-        # ion.lab.p = v_real_lab.p
-        ion.lab.p.x = v_real_lab.p.x
-        ion.lab.p.y = v_real_lab.p.y
-        ion.lab.p.z = v_real_lab.p.z
+        ion.lab.p.x = real_lab_x
+        ion.lab.p.y = real_lab_y
+        ion.lab.p.z = real_lab_z
         ion.lab.theta = det.angle
         ion.lab.fii = 0.0
 
@@ -215,10 +207,8 @@ def hit_virtual_detector(g: oj.Global, ion: oj.Ion, target: oj.Target, det: oj.D
         ion.p.y = 0.0
         ion.p.z = 0.0
 
-        ion.theta, ion.fii = rotate_jit.rotate(det.angle, c.C_PI, v_real_lab.theta, v_real_lab.fii)
-
-        ion.opt.cos_theta = math.cos(ion.theta)
-        ion.opt.sin_theta = math.sin(ion.theta)
+        theta, fii = rotate_jit.rotate(det.angle, c.C_PI, real_lab_theta, real_lab_fii)
+        ion_simu_jit.set_direction(ion, theta, fii)
 
 
 @nb.njit(cache=True, nogil=True)
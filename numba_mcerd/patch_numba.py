@@ -1,4 +1,5 @@
 import numba
+import numpy as np
 
 
 """Module with patches to Numba"""
@@ -21,12 +22,28 @@ def _new_size(self):
     return self.dtype.bitwidth // 8
 
 
+def needs_nested_array_patch() -> bool:
+    """Check if Numba can't handle arrays of records nested in records"""
+    record = numba.from_dtype(np.dtype([("x", np.float64)], align=True))
+    try:
+        numba.core.types.npytypes.NestedArray(record, (1,))
+    except AttributeError:
+        return True
+    return False
+
+
 def patch_nested_array() -> None:
     """Monkey patch Numba to fix https://github.com/numba/numba/issues/3158
 
     Original issue: Numba can't handle nested custom dtype arrays.
     Error message:
     "AttributeError: 'Record' object has no attribute 'bitwidth'"
+
+    Newer Numba versions support nested record arrays, so they are not
+    patched. They still don't support nested arrays of strings, so records
+    store strings as character codes instead (see objects_dtype.Buffer).
     """
+    if not needs_nested_array_patch():
+        return
     numba.core.types.npytypes.NestedArray.__init__ = _new_init
     numba.core.types.npytypes.NestedArray.size = property(_new_size)
@@ -0,0 +1,105 @@
+"""Run a simulation with a selected engine and runtime settings.
+
+Settings given on the command line override the values in config.py for
+this run only, so runs with different engines and thread counts can be
+scripted without editing the config:
+
+    python run.py ../data/input/O-Default --engine mt --threads 4 --seed 101
+
+Engines:
+    serial: main.py, normal Python
+    jit: main_jit.py, Numba
+    mt: main_jit_mt.py, Numba with multithreading
+    pool: main_jit_pool.py, Numba in a thread pool
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+import numba_mcerd
+
+
+ENGINES = {
+    "serial": "main",
+    "jit": "main_jit",
+    "mt": "main_jit_mt",
+    "pool": "main_jit_pool"
+}
+
+OUTPUT_FORMATS = ("text", "binary", "mmap")
+
+# Random sources of the serial engine. JIT engines always use random_jit.py.
+RANDOM_SOURCES = {
+    "numpy": "numba_mcerd.mcerd.random_numpy",
+    "vanilla": "numba_mcerd.mcerd.random_vanilla"
+}
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run a Numba MCERD simulation")
+    parser.add_argument("command_file", nargs="?", help="MCERD command file, defaults to MAIN_ARGS in config")
+    parser.add_argument("--engine", choices=ENGINES, default="mt", help="simulation engine (default: mt)")
+    parser.add_argument("--threads", type=int, help="number of threads of the mt engine")
+    parser.add_argument("--seed", type=int, help="seed number of the random number generator")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, help="format of ERD output")
+    parser.add_argument("--rng", choices=RANDOM_SOURCES, help="random number source of the serial engine")
+    parser.add_argument("--cache-dir", help="directory of the JIBAL table cache")
+    parser.add_argument("--numba-cache-dir", help="directory of compiled functions")
+    return parser
+
+
+def parse_args(args) -> argparse.Namespace:
+    """Parse and check command line arguments, args[0] is the program name"""
+    parser = create_parser()
+    options = parser.parse_args(args[1:])
+    if options.threads is not None and options.threads < 1:
+        parser.error("--threads must be positive")
+    if options.output_format == "mmap" and options.engine != "mt":
+        parser.error("--output-format mmap is only supported by the mt engine")
+    if options.output_format == "binary" and options.engine == "serial":
+        parser.error("--output-format binary is not supported by the serial engine")
+    return options
+
+
+def configure(options: argparse.Namespace) -> None:
+    """Override config values with the options that were given
+
+    Must be called before importing the engine, because some modules read
+    the config when they are imported.
+    """
+    # Numba reads its environment variables when it is imported
+    if options.numba_cache_dir is not None:
+        os.environ["NUMBA_CACHE_DIR"] = options.numba_cache_dir
+
+    from numba_mcerd import config
+
+    if options.threads is not None:
+        config.PARALLEL_THREAD_COUNT = options.threads
+    if options.seed is not None:
+        config.SEED = options.seed
+    if options.output_format is not None:
+        config.OUTPUT_FORMAT = options.output_format
+    if options.rng is not None:
+        config.rand = importlib.import_module(RANDOM_SOURCES[options.rng])
+    if options.cache_dir is not None:
+        config.CACHE_ROOT = options.cache_dir
+
+
+def main(args):
+    options = parse_args(args)
+    configure(options)
+
+    from numba_mcerd import config
+
+    if options.engine == "serial" and config.OUTPUT_COMPRESSION is not None:
+        create_parser().error("OUTPUT_COMPRESSION in config is not supported by the serial engine")
+    command_file = options.command_file if options.command_file is not None else config.MAIN_ARGS[1]
+    engine = importlib.import_module(f"{numba_mcerd.__name__}.{ENGINES[options.engine]}")
+    engine.main([args[0], command_file])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,78 @@
+"""Buffered writer for run log files, such as .out, .dat and .pre."""
+
+
+from pathlib import Path
+from typing import Dict, Iterable, List, TextIO
+
+from numba_mcerd import config
+from numba_mcerd import list_conversion as lc
+
+
+class RunLog:
+    """Write text to run log files through one handle per file.
+
+    Each file is opened once, on the first write (in append mode) or with
+    `open`, and kept open until the log is closed. Text is collected per
+    file and written in batches of about config.RUN_LOG_BUFFER_SIZE
+    characters, so that small writes don't cause file operations.
+
+    Text written to the same file is kept in order. Other writers must not
+    write to the files while the log holds unwritten text for them.
+    """
+
+    def __init__(self, buffer_size: int = None) -> None:
+        self.buffer_size = buffer_size if buffer_size is not None else config.RUN_LOG_BUFFER_SIZE
+        self._handles: Dict[Path, TextIO] = {}
+        self._pending: Dict[Path, List[str]] = {}
+        self._pending_size: Dict[Path, int] = {}
+
+    def __enter__(self) -> "RunLog":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self, file, mode: str = "a") -> None:
+        """Open file for writing. Use mode="w" to overwrite previous contents."""
+        file = Path(file)
+        if file in self._handles:
+            self.flush(file)
+            self._handles.pop(file).close()
+        self._handles[file] = lc.open_text(file, mode)
+        self._pending[file] = []
+        self._pending_size[file] = 0
+
+    def write(self, file, text: str) -> None:
+        """Write text to file"""
+        self.writelines(file, (text,))
+
+    def writelines(self, file, lines: Iterable[str]) -> None:
+        """Write lines (with line endings) to file"""
+        file = Path(file)
+        if file not in self._handles:
+            self.open(file)
+
+        pending = self._pending[file]
+        for line in lines:
+            pending.append(line)
+            self._pending_size[file] += len(line)
+        if self._pending_size[file] >= self.buffer_size:
+            self.flush(file)
+
+    def flush(self, file=None) -> None:
+        """Write pending text of file, or of all files if file is None"""
+        files = list(self._handles) if file is None else [Path(file)]
+        for file in files:
+            self._handles[file].write("".join(self._pending[file]))
+            self._handles[file].flush()
+            self._pending[file].clear()
+            self._pending_size[file] = 0
+
+    def close(self) -> None:
+        """Write all pending text and close the files"""
+        self.flush()
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+        self._pending.clear()
+        self._pending_size.clear()
@@ -1,69 +1,42 @@
 """Utilities for Numba threading."""
 
 
+from typing import Dict, Tuple
+
 import numba as nb
 import numpy as np
+from numba.core import cgutils
+from numba.extending import intrinsic
 
-
-class ThreadInfoError(Exception):
-    """Error while determining threading information"""
+import numba_mcerd.mcerd.objects_dtype as od
 
 
 @nb.njit(cache=True, nogil=True)
-def insertion_sort(list_):
-    """Sort a list in place using insertion sort"""
-    for i in range(len(list_)):
-        j = i
-        while j > 0 and list_[j - 1] > list_[j]:
-            temp = list_[j]
-            list_[j] = list_[j - 1]
-            list_[j - 1] = temp
-            j -= 1
-
-
-# Would be more accurate as a part of simulation_loop, but doesn't work
-# because the objects must be created outside of Numba.
-# Uncacheable
-@nb.njit(parallel=True, nogil=True)
-def get_thread_ids(iterations_multiplier: int = 4) -> list:
-    """Get a list of thread IDs used by a parallelized function
+def get_slot_range(slot: int, slot_count: int, start: int, stop: int) -> Tuple[int, int]:
+    """Get the part of range(start, stop) that belongs to a thread slot
 
-    Args:
-        iterations_multiplier: how many iterations
-            (iterations_multiplier * thread_count) should be performed
+    Parallel loops can iterate over slots with `nb.prange(slot_count)` and
+    use the slot as an index to per-thread data, instead of thread IDs.
+    Each iteration is run by a single thread, so slots don't share data
+    regardless of the thread count. The range is divided into contiguous
+    parts whose lengths differ by at most one.
 
-    Raises:
-        ThreadInfoError: if the amount of found IDs does not match the amount of
-            threads or if the IDs are not continuous (e.g. 0, 2, 3, 4)
+    Args:
+        slot: index of the slot, from 0 to slot_count - 1
+        slot_count: number of slots, usually the thread count
+        start: start of the whole range
+        stop: stop of the whole range
 
     Returns:
-        Ascending list of thread IDs
+        Start and stop of the slot's part
     """
-    thread_count = get_thread_count()
-    iterations = thread_count * iterations_multiplier
-    thread_ids = np.zeros(iterations, dtype=np.int64)
-
-    for i in nb.prange(iterations):
-        thread_ids[i] = get_thread_id()
-
-    unique_ids = list(set(thread_ids))
-    # Importing a built-in sort function for the first time in Numba seems to
-    # slow down execution by 2-3 seconds
-    insertion_sort(unique_ids)
-    unique_id_count = len(unique_ids)
-    min_id = unique_ids[0]
-    max_id = unique_ids[-1]
+    length = max(stop - start, 0)
+    return start + length * slot // slot_count, start + length * (slot + 1) // slot_count
 
-    if unique_id_count > thread_count:
-        raise ThreadInfoError("Found more unique thread IDs than threads")
 
-    if unique_id_count < thread_count:
-        raise ThreadInfoError("Found fewer unique thread IDs than threads")
-
-    if max_id - min_id + 1 != unique_id_count:
-        raise ThreadInfoError("Found thread IDs were not continuous")
-
-    return unique_ids
+def get_slot_length(slot_count: int, length: int) -> int:
+    """Get the length of the longest slot range when length is divided into slot_count parts"""
+    return -(-length // slot_count)
 
 
 # Uncacheable
@@ -73,17 +46,75 @@ def get_thread_id() -> int:
     return nb.np.ufunc.parallel._get_thread_id()
 
 
-# Uncacheable
-@nb.njit(nogil=True)
 def get_thread_count() -> int:
     """Get number of threads usable by Numba"""
     return nb.get_num_threads()
 
 
+@intrinsic
+def atomic_add(typingctx, array, index, value):
+    """Atomically add value to array[index] and return the previous value.
+
+    Can be used to share a counter between threads in parallel loops.
+    Only integer arrays are supported.
+    """
+    if not isinstance(array, nb.types.Array) or not isinstance(array.dtype, nb.types.Integer):
+        return None
+    sig = array.dtype(array, index, value)
+
+    def codegen(context, builder, signature, args):
+        array_type, index_type, value_type = signature.args
+        array_value, index_value, value_value = args
+        array_struct = context.make_array(array_type)(context, builder, array_value)
+        index_value = context.cast(builder, index_value, index_type, nb.types.intp)
+        pointer = cgutils.get_item_pointer(context, builder, array_type, array_struct, [index_value])
+        value_value = context.cast(builder, value_value, value_type, array_type.dtype)
+        return builder.atomic_rmw("add", pointer, value_value, "seq_cst")
+
+    return sig, codegen
+
+
+def share_records(records: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Copy records and arrays to one buffer for sharing between threads
+
+    Records can't be passed to parallel loops directly, but 1-element arrays
+    can. Each returned array has an extra first dimension of length 1, and
+    its [0] element is a view to the buffer. Changes made through the views
+    (e.g. in presimulation analysis) are seen by the parallel loops, so
+    nothing needs to be copied between stages. The originals should not be
+    used after sharing.
+
+    Each array starts at a cache line boundary.
+
+    Args:
+        records: records or record arrays by name
+
+    Returns:
+        Arrays of shape (1, ...) by name, backed by the same buffer
+    """
+    offsets = {}
+    size = 0
+    for name, record in records.items():
+        offsets[name] = size
+        size += -(-np.asarray(record).nbytes // od.CACHE_LINE_SIZE) * od.CACHE_LINE_SIZE
+
+    buffer = np.zeros(size + od.CACHE_LINE_SIZE, dtype=np.uint8)
+    start = -buffer.ctypes.data % od.CACHE_LINE_SIZE
+
+    shared = {}
+    for name, record in records.items():
+        record = np.asarray(record)
+        offset = start + offsets[name]
+        view = buffer[offset:offset + record.nbytes].view(record.dtype).reshape((1,) + record.shape)
+        view[0] = record
+        shared[name] = view.view(np.recarray)
+    return shared
+
+
 def set_thread_count(thread_count: int) -> None:
     """Set number of threads used by Numba"""
     nb.set_num_threads(thread_count)
 
 
 if __name__ == "__main__":
-    print(get_thread_ids())
+    print(f"{get_thread_count()} threads")
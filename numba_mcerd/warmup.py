@@ -0,0 +1,198 @@
+"""Compile JIT functions before a run and check that they are cached.
+
+Record types of the compiled functions depend on the input (e.g. buffer
+lengths depend on the number of ions), so warm-up uses the same command
+file and engine as the actual run:
+
+    python warmup.py <command file> [--engine main_jit_mt] [--no-verify]
+
+Warm-up initializes the simulation and compiles the simulation loop without
+simulating any ions. Compile times of each function are printed. After that,
+warm-up is repeated in a new process to verify that all cacheable functions
+are loaded from the cache instead of being compiled again.
+"""
+
+import argparse
+import importlib
+import re
+import subprocess
+import sys
+import time
+import warnings
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+from numba.core import event as ev
+from numba.core.errors import NumbaWarning
+from numba.core.caching import NullCache
+from numba.core.registry import CPUDispatcher
+
+import numba_mcerd
+
+
+ENGINES = ("main_jit", "main_jit_mt")
+
+# Numba compiles functions with cache=True but doesn't save them, e.g. if
+# they use dynamic globals
+UNCACHED_WARNING = re.compile(r'Cannot cache compiled function "(\w+)"')
+
+
+class FunctionInfo(NamedTuple):
+    """Compilation information of a JIT function"""
+    name: str
+    signatures: int
+    compile_time: float  # Includes compiling callees that were not compiled yet
+    cacheable: bool
+    cache_hits: int
+    cache_misses: int
+
+
+def find_dispatchers(package_name: str = numba_mcerd.__name__) -> Dict[str, CPUDispatcher]:
+    """Find JIT functions defined in the imported modules of a package
+
+    Returns:
+        Dispatchers by qualified name, e.g. "numba_mcerd.mcerd.rotate_jit.rotate"
+    """
+    dispatchers = {}
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not (module_name == package_name or module_name.startswith(package_name + ".")):
+            continue
+        for value in vars(module).values():
+            if isinstance(value, CPUDispatcher) and value.py_func.__module__ == module_name:
+                dispatchers[f"{module_name}.{value.py_func.__qualname__}"] = value
+    return dispatchers
+
+
+def is_cacheable(dispatcher: CPUDispatcher) -> bool:
+    """Check if compiled versions of dispatcher are saved to the cache"""
+    return not isinstance(dispatcher._cache, NullCache)
+
+
+def get_compile_times(records: Iterable[tuple]) -> Dict[CPUDispatcher, float]:
+    """Sum compile times of each dispatcher from "numba:compile" events
+
+    Args:
+        records: (timestamp, event) pairs, e.g. from the buffer of
+            numba.core.event.install_recorder("numba:compile")
+
+    Returns:
+        Total compile time by dispatcher
+    """
+    started = {}
+    compile_times = {}
+    for timestamp, event in records:
+        dispatcher = event.data["dispatcher"]
+        if event.is_start:
+            started.setdefault(dispatcher, []).append(timestamp)
+        elif event.is_end and started.get(dispatcher):
+            elapsed = timestamp - started[dispatcher].pop()
+            compile_times[dispatcher] = compile_times.get(dispatcher, 0.0) + elapsed
+    return compile_times
+
+
+def find_uncached_names(caught: Iterable[warnings.WarningMessage]) -> Set[str]:
+    """Find names of functions that Numba warned it could not cache"""
+    names = set()
+    for warning in caught:
+        match = UNCACHED_WARNING.search(str(warning.message))
+        if match is not None:
+            names.add(match.group(1))
+    return names
+
+
+def collect_function_info(records: Iterable[tuple], uncached_names: Set[str] = frozenset()) -> List[FunctionInfo]:
+    """Get compilation information of JIT functions that have been used
+
+    Args:
+        records: (timestamp, event) pairs of "numba:compile" events
+        uncached_names: names of functions with cache=True that were not
+            saved to the cache
+
+    Returns:
+        Information of used functions, slowest to compile first
+    """
+    compile_times = get_compile_times(records)
+    infos = []
+    for name, dispatcher in find_dispatchers().items():
+        stats = dispatcher.stats
+        if not dispatcher.signatures and not stats.cache_misses:
+            continue
+        infos.append(FunctionInfo(
+            name=name,
+            signatures=len(dispatcher.signatures),
+            compile_time=compile_times.get(dispatcher, 0.0),
+            cacheable=is_cacheable(dispatcher) and dispatcher.py_func.__name__ not in uncached_names,
+            cache_hits=sum(stats.cache_hits.values()),
+            cache_misses=sum(stats.cache_misses.values())))
+    infos.sort(key=lambda info: (-info.compile_time, info.name))
+    return infos
+
+
+def format_function_info(infos: List[FunctionInfo]) -> str:
+    """Format compilation information as a table"""
+    lines = [f"{'function':<64}{'sigs':>5}{'compile':>10}{'hits':>6}{'misses':>7}  cache"]
+    for info in infos:
+        lines.append(f"{info.name:<64}{info.signatures:>5}{info.compile_time:>9.2f}s"
+                     f"{info.cache_hits:>6}{info.cache_misses:>7}  {'yes' if info.cacheable else 'no'}")
+    return "\n".join(lines)
+
+
+def find_cache_misses(infos: List[FunctionInfo]) -> List[str]:
+    """Find cacheable functions that were compiled instead of loaded"""
+    return [info.name for info in infos if info.cacheable and (info.cache_misses or info.compile_time)]
+
+
+def warm_up(engine: str, command_file: str) -> List[FunctionInfo]:
+    """Compile JIT functions of engine for the command file
+
+    Returns:
+        Compilation information of used functions
+    """
+    module = importlib.import_module(f"{numba_mcerd.__name__}.{engine}")
+    with warnings.catch_warnings(record=True) as caught, ev.install_recorder("numba:compile") as recorder:
+        warnings.simplefilter("always", NumbaWarning)
+        module.main([sys.argv[0], command_file], warmup=True)
+
+    uncached_names = find_uncached_names(caught)
+    for warning in caught:
+        if not UNCACHED_WARNING.search(str(warning.message)):
+            warnings.showwarning(warning.message, warning.category, warning.filename, warning.lineno)
+    return collect_function_info(recorder.buffer, uncached_names)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Compile JIT functions before a run")
+    parser.add_argument("command_file", help="MCERD command file of the run")
+    parser.add_argument("--engine", choices=ENGINES, default="main_jit_mt", help="main module of the run")
+    parser.add_argument("--no-verify", action="store_true", help="skip checking the cache in a new process")
+    parser.add_argument("--verify", action="store_true", help=argparse.SUPPRESS)  # Used for the new process
+    options = parser.parse_args(args[1:])
+
+    start = time.perf_counter()
+    infos = warm_up(options.engine, options.command_file)
+    elapsed = time.perf_counter() - start
+
+    print(format_function_info(infos))
+    uncacheable = [info.name for info in infos if not info.cacheable]
+    print(f"Warm-up took {elapsed:.2f} s, {sum(info.cache_hits for info in infos)} cache hits, "
+          f"{len(uncacheable)} uncacheable functions: {', '.join(uncacheable) or '-'}")
+
+    if options.verify:
+        misses = find_cache_misses(infos)
+        for name in misses:
+            print(f"Not loaded from cache: {name}")
+        return 1 if misses else 0
+
+    if options.no_verify:
+        return 0
+
+    print("Verifying cache in a new process")
+    result = subprocess.run(
+        [sys.executable, __file__, options.command_file, "--engine", options.engine, "--verify"],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    print(result.stdout[result.stdout.find("Warm-up took"):], end="")
+    print("Cache OK" if result.returncode == 0 else "Cache verification failed")
+    return result.returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,50 @@
+import threading
+import unittest
+
+from numba_mcerd import background_writer as bw
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def test_jobs_in_order(self):
+        results = []
+        with bw.BackgroundWriter() as writer:
+            for i in range(100):
+                writer.submit(results.append, i)
+        self.assertEqual(list(range(100)), results)
+
+    def test_join_waits(self):
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def job():
+            started.set()
+            release.wait()
+            results.append(1)
+
+        writer = bw.BackgroundWriter()
+        writer.submit(job)
+        started.wait()
+        self.assertEqual([], results)  # Job runs in the background
+        release.set()
+        writer.join()
+        self.assertEqual([1], results)
+        writer.close()
+
+    def test_error(self):
+        results = []
+        writer = bw.BackgroundWriter()
+        writer.submit(int, "not a number")
+        self.assertRaises(bw.BackgroundWriterError, writer.join)
+        self.assertRaises(bw.BackgroundWriterError, writer.submit, results.append, 1)
+        self.assertRaises(bw.BackgroundWriterError, writer.close)
+        self.assertEqual([], results)
+
+    def test_submit_after_close(self):
+        writer = bw.BackgroundWriter()
+        writer.close()
+        self.assertRaises(bw.BackgroundWriterError, writer.submit, print)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from numba_mcerd import compare_spectra
+
+
+class TestCompareSpectra(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+
+    def test_same_distribution(self):
+        a = self.rng.normal(5.0, 1.0, 5000)
+        b = self.rng.normal(5.0, 1.0, 4000)
+        result = compare_spectra.compare_energies(a, b, bins=(0.0, 10.0, 100))
+        self.assertEqual((5000, 4000), result.counts)
+        self.assertTrue(result.compatible)
+
+    def test_shifted_distribution(self):
+        a = self.rng.normal(5.0, 1.0, 5000)
+        b = self.rng.normal(5.1, 1.0, 5000)
+        result = compare_spectra.compare_energies(a, b, bins=(0.0, 10.0, 100))
+        self.assertLess(result.ks_p_value, compare_spectra.SIGNIFICANCE_LEVEL)
+        self.assertFalse(result.compatible)
+
+    def test_read_erd_energies(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir) / "O-Default.101.erd"
+            file.write_text(
+                "R V R   2.4591   8  15.99   154.0941  2.2758491e+04    106.985    3.72  -11.52\n"
+                "S V R   4.7772   8  15.99     7.6449  1.7901461e+03     82.064   -2.57   13.41\n"
+                "R R R       10001   1.5000   8  15.99   154.0941  2.2758491e+04    106.985    3.72  -11.52\n")
+            np.testing.assert_array_equal([2.4591, 1.5], compare_spectra.read_erd_energies(file))
+
+
+if __name__ == "__main__":
+    unittest.main()
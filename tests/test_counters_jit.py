@@ -0,0 +1,41 @@
+import unittest
+
+import numba as nb
+import numpy as np
+
+from numba_mcerd.mcerd import counters_jit, enums
+from numba_mcerd.mcerd import objects_dtype as od
+
+
+@nb.njit(cache=True)
+def _count(counters_arr):
+    for slot in range(counters_arr.shape[0]):
+        counters = counters_arr[slot]
+        counters.cion = 10 * slot
+        counters.nmc += slot
+        counters.finstat[enums.IonType.PRIMARY, enums.IonStatus.FIN_STOP] += 1
+
+
+class TestCounters(unittest.TestCase):
+    def test_layout(self):
+        self.assertEqual(0, od.Counters.itemsize % od.CACHE_LINE_SIZE)
+        counters_arr = counters_jit.create_counters(3)
+        self.assertEqual(0, counters_arr.ctypes.data % od.CACHE_LINE_SIZE)
+        self.assertTrue(np.all(counters_arr["finstat"] == 0))
+
+    def test_store_counters(self):
+        counters_arr = counters_jit.create_counters(4)
+        _count(counters_arr)
+        counters_arr[1]["cpresimu"] = 5
+
+        g = np.zeros(1, dtype=od.Global)[0].view(np.recarray)
+        counters_jit.store_counters(g, counters_arr)
+        self.assertEqual(30, g.cion)
+        self.assertEqual(6, g.nmc)
+        self.assertEqual(5, g.cpresimu)
+        self.assertEqual(4, g.finstat[enums.IonType.PRIMARY, enums.IonStatus.FIN_STOP])
+        self.assertEqual(4, g.finstat.sum())
+
+
+if __name__ == "__main__":
+    unittest.main()
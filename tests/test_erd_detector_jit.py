@@ -0,0 +1,199 @@
+import copy
+import math
+import unittest
+
+import numpy as np
+
+import numba_mcerd.mcerd.constants as c
+import numba_mcerd.mcerd.objects as o
+import numba_mcerd.mcerd.objects_convert_dtype as ocd
+from numba_mcerd.mcerd import enums, erd_detector, erd_detector_jit, init_detector, misc_jit, rotate
+from numba_mcerd.mcerd import random_jit, random_numpy, rotate_jit
+
+
+def _create_global(virtual: bool) -> o.Global:
+    g = o.Global()
+    g.simtype = enums.SimType.ERD
+    g.simstage = enums.SimStage.REAL
+    g.recwidth = enums.RecWidth.NARROW
+    g.beamprof = enums.BeamProf.NONE
+    g.beamangle = 69.5 * c.C_DEG
+    g.bspot.x = 1.5 * c.C_MM
+    g.bspot.y = 2.5 * c.C_MM
+    g.emin = 0.1 * c.C_MEV
+    g.ionemax = 20.0 * c.C_MEV
+    g.virtualdet = virtual
+    return g
+
+
+def _create_detector(g: o.Global) -> o.Detector:
+    detector = o.Detector()
+    detector.type = enums.DetectorType.TOF
+    detector.angle = 41.12 * c.C_DEG
+    detector.vsize = [2.0, 5.0] if g.virtualdet else [0.0, 0.0]
+    detector.tdet = [1, 2]
+    for foil, diameter, dist in zip(detector.foil, (3.0, 9.0), (618.0, 1306.0)):
+        foil.type = enums.FoilType.CIRC
+        foil.size_[0] = diameter * 0.5 * c.C_MM
+        foil.dist = dist * c.C_MM
+    detector.nfoils = 2
+    init_detector.init_detector(g, detector)
+    if not g.virtualdet:
+        detector.vfoil = copy.deepcopy(detector.foil[0])  # Unused, but needed for conversion
+    return detector
+
+
+def _create_target() -> o.Target:
+    target = o.Target()
+    target.ntarget = 1
+    target.nlayers = 3
+    target.plane.type = enums.PlaneType.Z_PLANE
+    for i, (dlow, dhigh) in enumerate(((0.0, 100.0), (0.0, 50.0), (0.0, 100.0))):
+        layer = target.layer[i]
+        layer.type = enums.TargetType.FILM
+        layer.dlow = dlow * c.C_NM
+        layer.dhigh = dhigh * c.C_NM
+        sto = o.Target_sto()
+        sto.n_sto = 100
+        sto.stodiv = 1.0 / 1.0e5
+        for j in range(sto.n_sto):
+            sto.vel[j] = j * 1.0e5
+            sto.sto[j] = (1.0 + 0.01 * j) * 1.0e-6 * c.C_MEV / c.C_NM
+        layer.sto = [sto]
+    return target
+
+
+def _create_ions(g: o.Global, detector: o.Detector, count: int) -> list:
+    """Create recoils aimed around the first detector foil"""
+    rng = np.random.default_rng(3)
+    ions = []
+    for _ in range(count):
+        ion = o.Ion()
+        ion.A = 16.0 * c.C_U
+        ion.E = 8.0 * c.C_MEV
+        ion.w = 1.0
+        ion.tlayer = -1
+        ion.status = enums.IonStatus.NOT_FINISHED
+        ion.type = enums.IonType.SECONDARY
+        ion.lab.theta = g.beamangle
+        ion.lab.fii = c.C_PI
+        ion.lab.p.x = 1.0e-4
+        ion.lab.p.y = -2.0e-4
+        ion.lab.p.z = ion.lab.p.x / math.tan(c.C_PI / 2.0 - g.beamangle)
+        lab_theta = detector.angle + rng.uniform(-0.02, 0.02)
+        lab_fii = rng.uniform(-0.02, 0.02)
+        ion.theta, ion.fii = rotate.rotate(g.beamangle, 0.0, lab_theta, lab_fii)
+
+        ion.hist.tar_recoil = o.Vector(p=o.Point(x=1.0e-9, y=2.0e-9, z=20.0 * c.C_NM))
+        ion.hist.ion_recoil = o.Vector(p=o.Point(), theta=0.4, fii=1.0)
+        ion.hist.lab_recoil = o.Vector(p=copy.copy(ion.lab.p))
+        ion.hist.recoil_E = 8.5 * c.C_MEV
+        ions.append(ion)
+    return ions
+
+
+class TestFoilAxes(unittest.TestCase):
+    def setUp(self):
+        g = _create_global(virtual=True)
+        self.detector = _create_detector(g)
+        self.detector_jit = ocd.convert_detector(copy.deepcopy(self.detector))
+
+    def test_lab_to_foil(self):
+        for foil in self.detector_jit["foil"][:self.detector.nfoils]:
+            center = foil["center"]
+            for p in ((0.4, 0.01, 0.5), (0.47, -0.002, 0.53), (1.0, 0.0, 0.0)):
+                expected = misc_jit.coord_transform(
+                    center["x"], center["y"], center["z"], self.detector.angle, c.C_PI,
+                    *p, enums.CoordTransformDirection.BACK)
+                result = erd_detector_jit.lab_to_foil(foil, p)
+                for e, r in zip(expected, result):
+                    self.assertAlmostEqual(e, r, places=12)
+
+    def test_foil_to_lab(self):
+        foil = self.detector_jit["vfoil"]
+        center = foil["center"]
+        for x, y in ((0.0, 0.0), (1.0e-3, -2.0e-3), (-3.0e-3, 0.5e-3)):
+            expected = misc_jit.coord_transform(
+                center["x"], center["y"], center["z"], self.detector.angle, 0.0,
+                x, y, 0.0, enums.CoordTransformDirection.FORW)
+            result = erd_detector_jit.foil_to_lab(foil, x, y)
+            for e, r in zip(expected, result):
+                self.assertAlmostEqual(e, r, places=12)
+            # Round trip
+            for e, r in zip((x, y, 0.0), erd_detector_jit.lab_to_foil(foil, result)):
+                self.assertAlmostEqual(e, r, places=12)
+
+    def test_foil_cross(self):
+        foil = self.detector_jit["foil"][0]
+        direction = rotate_jit.get_direction(self.detector.angle, 0.0)
+        is_cross, dist, cross = erd_detector_jit.get_foil_cross(foil, (0.0, 0.0, 0.0), direction)
+        self.assertTrue(is_cross)
+        self.assertAlmostEqual(self.detector.foil[0].dist, dist, places=12)
+        is_cross, dist, cross = erd_detector_jit.get_foil_cross(
+            foil, (0.0, 0.0, 0.0), tuple(-d for d in direction))
+        self.assertTrue(is_cross)
+        self.assertLess(dist, 0.0)
+
+
+class TestMoveToErdDetector(unittest.TestCase):
+    def _assert_close(self, expected: float, result: float, abs_tol: float, msg: str = None) -> None:
+        # Pure Python and Numba may use different math libraries, last bits can differ
+        self.assertTrue(math.isclose(expected, result, rel_tol=1e-9, abs_tol=abs_tol),
+                        msg=f"{msg}: {expected} != {result}")
+
+    def _assert_same_ion(self, ion: o.Ion, ion_jit: np.ndarray, nfoils: int) -> None:
+        self.assertEqual(ion.status.value, ion_jit["status"])
+        self.assertEqual(ion.virtual, ion_jit["virtual"])
+        self.assertEqual(ion.tlayer, ion_jit["tlayer"])
+        for name in ("E", "w", "time"):
+            self._assert_close(getattr(ion, name), ion_jit[name], 0.0, name)
+        for name in ("theta", "fii"):
+            self._assert_close(getattr(ion, name), ion_jit[name], 1e-12, name)
+        for name in ("x", "y", "z"):
+            self._assert_close(getattr(ion.lab.p, name), ion_jit["lab"]["p"][name], 1e-15, name)
+            for i in range(nfoils):
+                self._assert_close(getattr(ion.hit[i], name), ion_jit["hit"][i][name], 1e-15, name)
+        self.assertEqual(ion.lab.theta, ion_jit["lab"]["theta"])
+        for i in range(2):
+            self._assert_close(ion.dt[i], ion_jit["dt"][i], 0.0, "dt")
+
+    def _run_both(self, virtual: bool) -> set:
+        g = _create_global(virtual)
+        detector = _create_detector(g)
+        target = _create_target()
+        ions = _create_ions(g, detector, 200)
+
+        g_jit = ocd.convert_global(copy.deepcopy(g))
+        detector_jit = ocd.convert_detector(copy.deepcopy(detector))
+        target_jit = ocd.convert_target(copy.deepcopy(target))
+
+        random_numpy.seed_rnd(1)
+        random_jit.seed_rnd(1)
+
+        statuses = set()
+        for ion in ions:
+            ion_jit = ocd.convert_ion(copy.deepcopy(ion))
+            while True:
+                erd_detector.move_to_erd_detector(g, ion, target, detector)
+                erd_detector_jit.move_to_erd_detector(g_jit, ion_jit, target_jit, detector_jit)
+                self._assert_same_ion(ion, ion_jit, detector.nfoils)
+                if ion.status != enums.IonStatus.NOT_FINISHED:
+                    break
+                ion.tlayer += 1
+                ion_jit["tlayer"] += 1
+            statuses.add((ion.status, ion.virtual))
+        return statuses
+
+    def test_real_detector(self):
+        statuses = self._run_both(virtual=False)
+        self.assertIn((enums.IonStatus.FIN_DET, False), statuses)
+        self.assertIn((enums.IonStatus.FIN_MISS_DET, False), statuses)
+
+    def test_virtual_detector(self):
+        statuses = self._run_both(virtual=True)
+        self.assertIn((enums.IonStatus.FIN_DET, False), statuses)
+        self.assertIn((enums.IonStatus.FIN_DET, True), statuses)
+
+
+if __name__ == "__main__":
+    unittest.main()
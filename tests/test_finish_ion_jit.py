@@ -0,0 +1,107 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+import numba_mcerd.mcerd.constants as c
+from numba_mcerd import config, list_conversion as lc, patch_numba
+from numba_mcerd.mcerd import enums, finish_ion_jit, histogram_jit
+from numba_mcerd.mcerd import objects_dtype as od
+
+
+def setUpModule():
+    patch_numba.patch_nested_array()  # Ion.hit is an array of records
+
+
+def _create_range_buffer(nsimu: int) -> np.ndarray:
+    g = np.zeros(1, dtype=od.Global)[0].view(np.recarray)
+    g["nsimu"] = nsimu
+    return finish_ion_jit.create_range_buffer(g)
+
+
+def _finish_ions(range_buf: np.ndarray, depths: np.ndarray, energies: np.ndarray) -> None:
+    ion = np.zeros(1, dtype=od.Ion)[0]
+    g = np.zeros(1, dtype=od.Global)[0]
+    for depth, energy in zip(depths, energies):
+        ion["status"] = enums.IonStatus.FIN_STOP
+        ion["p"]["z"] = depth * c.C_NM
+        finish_ion_jit.finish_ion(g, ion, range_buf)
+        ion["status"] = enums.IonStatus.FIN_TRANS
+        ion["E"] = energy * c.C_MEV
+        finish_ion_jit.finish_ion(g, ion, range_buf)
+    ion["status"] = enums.IonStatus.FIN_RECOIL  # Not output
+    finish_ion_jit.finish_ion(g, ion, range_buf)
+
+
+class TestRangeBuffer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.depths = rng.uniform(0.0, 1200.0, 500)
+        self.energies = rng.uniform(0.0, 15.0, 500)
+
+    def test_statistics(self):
+        range_buf = _create_range_buffer(2000)
+        _finish_ions(range_buf, self.depths, self.energies)
+
+        self.assertEqual(1000, range_buf["row_i"])
+        self.assertEqual(ord("R"), range_buf["buf"][0, 0])
+        self.assertAlmostEqual(self.depths[0], range_buf["buf"][0, 1])
+        self.assertEqual(ord("T"), range_buf["buf"][1, 0])
+
+        depth_edges = histogram_jit.get_edges(range_buf["depth_limits"], range_buf["stop_depth"].shape[0])
+        energy_edges = histogram_jit.get_edges(range_buf["energy_limits"], range_buf["trans_energy"].shape[0])
+        np.testing.assert_array_equal(np.histogram(self.depths, depth_edges)[0], range_buf["stop_depth"])
+        np.testing.assert_array_equal(np.histogram(self.energies, energy_edges)[0], range_buf["trans_energy"])
+        self.assertEqual(np.count_nonzero(self.depths >= depth_edges[-1]), range_buf["depth_outside"])
+        self.assertEqual(0, range_buf["energy_outside"])
+        self.assertEqual(0, range_buf["dropped"])
+        self.assertEqual(500, range_buf["stop_count"])
+        self.assertAlmostEqual(self.depths.sum(), range_buf["stop_depth_sum"])
+
+    def test_buffer_size(self):
+        self.assertEqual(2000, _create_range_buffer(2000)["buf"].shape[0])
+        self.assertEqual(config.RANGE_BUFFER_SIZE, _create_range_buffer(10**9)["buf"].shape[0])  # Not nsimu
+        with mock.patch("numba_mcerd.config.RANGE_BUFFER_SIZE", None):
+            self.assertEqual(200_000, _create_range_buffer(200_000)["buf"].shape[0])
+
+    @mock.patch("numba_mcerd.config.RANGE_BUFFER_SIZE", 100)
+    def test_full_buffer(self):
+        range_buf = _create_range_buffer(2000)
+        self.assertEqual(100, range_buf["buf"].shape[0])
+        _finish_ions(range_buf, self.depths, self.energies)
+
+        self.assertEqual(100, range_buf["row_i"])
+        self.assertEqual(900, range_buf["dropped"])
+        self.assertEqual(500, range_buf["trans_count"])
+        self.assertEqual(500, range_buf["trans_energy"].sum())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertLogs(level="WARNING") as logs:
+                finish_ion_jit.write_range_stats(range_buf, Path(tmp_dir) / "O-Default.101.range.npz")
+        self.assertIn("900 range events", logs.output[0])
+
+    def test_combine_and_write(self):
+        range_bufs = np.array([_create_range_buffer(2000) for _ in range(2)])
+        _finish_ions(range_bufs[0], self.depths[:200], self.energies[:200])
+        _finish_ions(range_bufs[1], self.depths[200:], self.energies[200:])
+        combined = finish_ion_jit.combine_range_stats(range_bufs)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            range_file = Path(tmp_dir) / "O-Default.101.range"
+            lc.buffer_to_file(combined, range_file)
+            self.assertEqual(400, len(range_file.read_text().splitlines()))  # Rows of the first buffer
+
+            stats_file = finish_ion_jit.get_range_stats_path(range_file)
+            self.assertEqual("O-Default.101.range.npz", stats_file.name)
+            finish_ion_jit.write_range_stats(combined, stats_file)
+            with np.load(stats_file) as data:
+                self.assertEqual(500, data["stop_count"])
+                self.assertEqual(500, data["trans_energy"].sum() + np.count_nonzero(self.energies >= 20.0))
+                self.assertAlmostEqual(self.depths.mean(), data["stop_depth_mean"])
+                self.assertAlmostEqual(self.energies.std(), data["trans_energy_std"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from numba_mcerd.mcerd import histogram_jit
+
+
+def _create_histograms() -> np.ndarray:
+    return histogram_jit.create_histograms((0.0, 10.0, 20), (0.0, 100.0, 50), (0.0, 500.0, 25))
+
+
+class TestHistograms(unittest.TestCase):
+    def test_get_bin(self):
+        limits = np.array([1.0, 3.0])
+        self.assertEqual(0, histogram_jit.get_bin(1.0, limits, 4))
+        self.assertEqual(1, histogram_jit.get_bin(1.6, limits, 4))
+        self.assertEqual(3, histogram_jit.get_bin(2.9999999999999996, limits, 4))
+        self.assertEqual(-1, histogram_jit.get_bin(3.0, limits, 4))
+        self.assertEqual(-1, histogram_jit.get_bin(0.5, limits, 4))
+
+    def test_same_as_numpy(self):
+        rng = np.random.default_rng(1)
+        energy = rng.uniform(-1.0, 11.0, 1000)
+        tof = rng.uniform(0.0, 110.0, 1000)
+        depth = rng.uniform(0.0, 400.0, 1000)
+        w = rng.uniform(0.5, 2.0, 1000)
+
+        hist = _create_histograms()
+        for i in range(1000):
+            histogram_jit.add_erd(hist, energy[i], tof[i], depth[i], w[i])
+
+        energy_edges = histogram_jit.get_edges(hist["energy_limits"], 20)
+        tof_edges = histogram_jit.get_edges(hist["tof_limits"], 50)
+        depth_edges = histogram_jit.get_edges(hist["depth_limits"], 25)
+        expected_tof_energy = np.histogram2d(tof, energy, bins=(tof_edges, energy_edges), weights=w)[0]
+        expected_depth_energy = np.histogram2d(depth, energy, bins=(depth_edges, energy_edges), weights=w)[0]
+        np.testing.assert_allclose(expected_tof_energy, hist["tof_energy"])
+        np.testing.assert_allclose(expected_depth_energy, hist["depth_energy"])
+
+        outside = (energy < 0.0) | (energy >= 10.0) | (tof >= 100.0)
+        self.assertAlmostEqual(w[outside].sum(), hist["outside"])
+
+    def test_combine_and_write(self):
+        hist_arr = np.array([_create_histograms() for _ in range(3)])
+        for i, hist in enumerate(hist_arr):
+            histogram_jit.add_erd(hist, 5.0, 50.0, 100.0, i + 1.0)
+            histogram_jit.add_erd(hist, 20.0, 50.0, 100.0, 1.0)
+        combined = histogram_jit.combine_histograms(hist_arr)
+        self.assertEqual(6.0, combined["tof_energy"][25, 10])
+        self.assertEqual(6.0, combined["depth_energy"][5, 10])
+        self.assertEqual(3.0, combined["outside"])
+        self.assertEqual(1.0, hist_arr[0]["tof_energy"][25, 10])  # Unchanged
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir) / "out.hist.npz"
+            histogram_jit.write_histograms(combined, file)
+            with np.load(file) as data:
+                np.testing.assert_array_equal(combined["tof_energy"], data["tof_energy"])
+                self.assertEqual(21, len(data["energy_edges"]))
+                self.assertEqual(500.0, data["depth_edges"][-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,27 @@
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
 
-
+from numba_mcerd.mcerd import jibal as jibal_module
 from numba_mcerd.mcerd.jibal import Jibal, JibalSelectIsotopes
 
 
 class TestJibal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_patch = mock.patch("numba_mcerd.config.CACHE_ROOT", self.tmp_dir.name)  # Keep the tree clean
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        self.tmp_dir.cleanup()
+
     def test_jibal(self):
         jibal = Jibal()
         jibal.initialize()
 
-        self.assertEqual(119, len(jibal.elements))  # neutron + 118 elements
+        self.assertEqual(119, jibal.get_element_count())  # neutron + 118 elements
 
         He = jibal.get_element(2)
         self.assertEqual(He, jibal.get_element_by_name("He"))
@@ -73,3 +85,58 @@ class TestJibal(unittest.TestCase):
         self.assertEqual(1, len(Li6.isotopes))
         self.assertEqual(1, len(Li6.concs))
         self.assertEqual(9.988346731904192e-27, Li6.avg_mass)
+
+
+class TestJibalCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_root = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_same_as_parsed(self):
+        with mock.patch("numba_mcerd.config.JIBAL_CACHE", False):
+            parsed = Jibal()
+            parsed.initialize()
+        self.assertEqual(119, len(parsed.elements))
+
+        cached = Jibal()
+        cached.load_cache(cache_root=self.cache_root)
+        self.assertEqual(2, len(list(Path(self.cache_root).glob("jibal-*.npy"))))
+        self.assertEqual([], cached.elements)  # Elements are created on access
+        self.assertEqual(len(parsed.elements), cached.get_element_count())
+
+        for element in parsed.elements:
+            self.assertEqual(element, cached.get_element(element.Z))
+            self.assertIs(cached.get_element(element.Z), cached.get_element_by_name(element.name))
+            for isotope in element.isotopes:
+                self.assertEqual(isotope, cached.get_isotope_by_mass_number(element.Z, isotope.A))
+        self.assertEqual(len(parsed.elements), len(cached.elements))
+
+    def test_missing(self):
+        cached = Jibal()
+        cached.load_cache(cache_root=self.cache_root)
+        self.assertIsNone(cached.get_element(500))
+        self.assertIsNone(cached.get_element(-1))
+        self.assertIsNone(cached.get_element_by_name("Xx"))
+        self.assertIsNone(cached.get_isotope_by_mass_number(2, 100))
+
+    def test_rebuild(self):
+        element_file, _ = jibal_module.build_cache(cache_root=self.cache_root)
+        with mock.patch.object(jibal_module, "build_cache") as build_cache:
+            Jibal().load_cache(cache_root=self.cache_root)
+        build_cache.assert_not_called()
+
+        masses_file = Path(self.cache_root) / "masses.dat"
+        masses_file.write_text(Path(jibal_module.MASSES_FILE).read_text())
+        with masses_file.open("a") as f:
+            f.write("9999 Xx 1 200 201 201.0\n")
+        new_element_file, _ = jibal_module.get_cache_paths(masses_file, cache_root=self.cache_root)
+        self.assertNotEqual(element_file, new_element_file)
+
+        cached = Jibal()
+        cached.load_cache(masses_file=str(masses_file), cache_root=self.cache_root)
+        self.assertTrue(new_element_file.exists())
+        self.assertEqual(200, cached.get_element_by_name("Xx").Z)
+
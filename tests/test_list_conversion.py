@@ -0,0 +1,211 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from numba_mcerd import list_conversion as lc
+from numba_mcerd.mcerd import objects_dtype as od
+
+
+def _create_buffer() -> np.ndarray:
+    t = lc.TypeInt
+    rows = [
+        [ord("S"), ord("V"), ord("R"), 4.75191234, 8, 15.9949, 1.70601, 1791.5455, 82.2821, -5.994, -5.83],
+        [ord("R"), ord("R"), ord("R"), 2.36341, 8, 15.9949, 195.79391, 21477.66, 109.32, 0.9449, 4.5449],
+        [ord("R"), ord("V"), ord("R"), 0.0, 1, 1.008, -0.00004, 1e-300, -0.0, 123.456, -0.005],
+    ]
+
+    buf = np.zeros(1, dtype=od.get_buffer_dtype(5, 11))[0]
+    lc.set_columns(
+        buf,
+        [t.STR, t.STR, t.STR, t.FLOAT, t.INT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT, t.FLOAT],
+        ["", "", "", "8.4f", "3d", "6.2f", "10.4f", "14.7e", "10.3f", "7.2f", "7.2f"],
+        ["scale", "virtual", "simtype", "E", "Z", "A", "depth", "w", "tof", "x", "y"])
+    buf["buf"][:len(rows)] = rows
+    buf["row_i"] = len(rows)
+    return buf
+
+
+def _format_reference(buf: np.ndarray) -> str:
+    """Format buffer cell by cell with format()"""
+    formats = lc.decode_strings(buf["formats"])
+    lines = []
+    for row in buf["buf"][:buf["row_i"]]:
+        formatted = (format(lc.from_float(buf["types"][i], row[i]), formats[i]) for i in range(len(row)))
+        lines.append(" ".join(formatted) + "\n")
+    return "".join(lines)
+
+
+class TestBufferToFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.tmp_dir.name) / "out.erd"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_same_as_format(self):
+        buf = _create_buffer()
+        lc.buffer_to_file(buf, self.file)
+        self.assertEqual(_format_reference(buf), self.file.read_text())
+
+    def test_random_values(self):
+        rng = np.random.default_rng(1)
+        buf = np.zeros(1, dtype=od.get_buffer_dtype(1000, 5))[0]
+        t = lc.TypeInt
+        # Last format is not printf compatible
+        lc.set_columns(buf, [t.STR, t.INT, t.FLOAT, t.FLOAT, t.FLOAT], ["", "3d", "10.4f", "14.7e", ">9.2f"],
+                       [""] * 5)
+        buf["buf"][:, 0] = rng.choice([ord("R"), ord("S"), ord("T")], size=1000)
+        buf["buf"][:, 1] = rng.integers(-5, 120, size=1000)
+        for i in range(2, 5):
+            buf["buf"][:, i] = rng.normal(scale=10.0 ** rng.integers(-8, 8, size=1000))
+        buf["buf"][:5, 2] = [0.00005, -0.00005, 0.00015, -0.0, 2.5e-5]
+        buf["row_i"] = 1000
+
+        lc.buffer_to_file(buf, self.file)
+        self.assertEqual(_format_reference(buf), self.file.read_text())
+
+
+class TestBinaryOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records(self):
+        buf = _create_buffer()
+        records = lc.buffer_to_records(buf)
+        self.assertEqual(3, len(records))
+        self.assertEqual(np.uint8, records.dtype["scale"])
+        self.assertEqual(ord("S"), records["scale"][0])
+        self.assertEqual(8, records["Z"][1])
+        self.assertEqual(buf["buf"][1, 7], records["w"][1])
+
+    def test_read_binary_file(self):
+        buf = _create_buffer()
+        binary_file = self.path / "out.erdb"
+        lc.buffer_to_binary_file(buf, binary_file, {"seed": 101})
+        lc.buffer_to_binary_file(buf, binary_file, {"seed": 101})
+
+        header, records = lc.read_binary_file(binary_file)
+        self.assertEqual(101, header["run"]["seed"])
+        self.assertEqual("14.7e", header["columns"][7]["format"])
+        self.assertEqual(6, len(records))
+        np.testing.assert_array_equal(lc.buffer_to_records(buf), records[3:])
+
+    def test_binary_to_text(self):
+        buf = _create_buffer()
+        text_file = self.path / "out.erd"
+        binary_file = self.path / "out.erdb"
+        converted_file = self.path / "converted.erd"
+        for _ in range(2):
+            lc.buffer_to_file(buf, text_file)
+            lc.buffer_to_binary_file(buf, binary_file)
+
+        lc.binary_to_text(binary_file, converted_file)
+        self.assertEqual(text_file.read_bytes(), converted_file.read_bytes())
+
+        converted_file.unlink()
+        self.assertEqual(0, lc.main(["list_conversion.py", str(binary_file), str(converted_file)]))
+        self.assertEqual(text_file.read_bytes(), converted_file.read_bytes())
+        with mock.patch("sys.stdout"):
+            self.assertEqual(2, lc.main(["list_conversion.py", str(binary_file)]))
+
+    def test_not_binary_file(self):
+        text_file = self.path / "out.erd"
+        lc.buffer_to_file(_create_buffer(), text_file)
+        self.assertRaises(lc.BinaryFileError, lc.read_binary_file, text_file)
+
+
+class TestEventFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.tmp_dir.name) / "out.erdb"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_rows(self):
+        buf = _create_buffer()
+        event_file = lc.EventFile(buf, self.file, 10, {"seed": 101})
+        self.assertEqual(0, event_file.header_length % 8)
+        for row in buf["buf"][:buf["row_i"]]:
+            event_file.rows[event_file.cursor[0]] = row
+            event_file.cursor[0] += 1
+        event_file.close()
+        self.assertEqual(3, event_file.row_count)
+        self.assertEqual(event_file.header_length + 3 * 11 * 8, self.file.stat().st_size)
+
+        header, records = lc.read_binary_file(self.file)
+        self.assertEqual(101, header["run"]["seed"])
+        self.assertEqual(np.float64, records.dtype["Z"])
+        for name in records.dtype.names:
+            np.testing.assert_array_equal(lc.buffer_to_records(buf)[name], records[name])
+
+    def test_dropped_rows(self):
+        buf = _create_buffer()
+        event_file = lc.EventFile(buf, self.file, 2)
+        event_file.cursor[0] = 5  # Rows 2 to 4 didn't fit
+        event_file.close()
+        self.assertEqual(2, event_file.row_count)
+        self.assertEqual(3, event_file.dropped_count)
+        self.assertEqual(2, len(lc.read_binary_file(self.file)[1]))
+
+
+class TestCompressedOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_append(self):
+        buf = _create_buffer()
+        text_file = self.path / "out.erd"
+        for _ in range(3):
+            lc.buffer_to_file(buf, text_file)
+
+        for suffix in (".gz", ".xz", ".bz2"):
+            compressed_file = self.path / f"out.erd{suffix}"
+            with lc.open_text(compressed_file, "w"):  # Empty files are created at initialization
+                pass
+            for _ in range(3):
+                lc.buffer_to_file(buf, compressed_file)
+
+            self.assertNotEqual(text_file.read_bytes()[:10], compressed_file.read_bytes()[:10])
+            with lc.open_text(compressed_file) as f:
+                self.assertEqual(text_file.read_text(), f.read())
+
+    def test_read_chunks(self):
+        file = self.path / "out.range.gz"
+        with lc.open_text(file, "w") as f:
+            f.writelines(f"R {i:10.3f}\n" for i in range(25))
+
+        chunks = list(lc.read_chunks(file, chunk_size=10))
+        self.assertEqual([10, 10, 5], [len(chunk) for chunk in chunks])
+        self.assertEqual("R     24.000\n", chunks[-1][-1])
+
+        empty_file = self.path / "empty.erd.xz"
+        with lc.open_text(empty_file, "w"):
+            pass
+        self.assertEqual([], list(lc.read_chunks(empty_file)))
+
+    def test_compression_suffix(self):
+        self.assertEqual("out.erd", lc.add_compression_suffix("out.erd"))
+        with mock.patch("numba_mcerd.config.OUTPUT_COMPRESSION", "xz"):
+            self.assertEqual("out.erd.xz", lc.add_compression_suffix("out.erd"))
+        with mock.patch("numba_mcerd.config.OUTPUT_COMPRESSION", "zip"):
+            self.assertRaises(ValueError, lc.add_compression_suffix, "out.erd")
+
+        self.assertEqual(Path("O-Default.101.range"), lc.remove_compression_suffix("O-Default.101.range.bz2"))
+        self.assertEqual(Path("O-Default.101.range"), lc.remove_compression_suffix("O-Default.101.range"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from numba_mcerd import manifest, timer
+
+
+def _create_manifest(command_file: Path, main_elapsed: float) -> manifest.RunManifest:
+    run_manifest = manifest.RunManifest("main_jit", command_file)
+    for name, elapsed, ions in (("presimu", 1.0, 100), ("main_simu", main_elapsed, 400)):
+        stage_timer = timer.Timer()
+        stage_timer.start_time = 10.0
+        stage_timer.stop_time = 10.0 + elapsed
+        run_manifest.add_stage(name, stage_timer, ions)
+
+    g = np.zeros(1, dtype=[("finstat", np.int64, (2, 3)), ("nmc", np.int64)])[0].view(np.recarray)
+    g["finstat"][1, 2] = 5
+    g["nmc"] = 1234
+    run_manifest.set_results(g)
+    return run_manifest
+
+
+class TestRunManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+        self.foil_file = self.path / "O-Default.foils"
+        self.foil_file.write_text("Foil type: circular\n")
+        self.detector_file = self.path / "O-Default.erd_detector"
+        self.detector_file.write_text(f"Detector type: TOF\nDescription file for the detector foils: {self.foil_file}\n")
+        self.command_file = self.path / "O-Default"
+        self.command_file.write_text(
+            f"Detector description file: {self.detector_file}\n"
+            f"Presimulation * result file: {self.foil_file}.pre\n"
+            "Number of ions: 400\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_input_files(self):
+        self.assertEqual([self.command_file, self.detector_file, self.foil_file],
+                         manifest.find_input_files(self.command_file))
+        (self.path / "O-Default.foils.pre").write_text("")  # Disabled settings are skipped
+        self.assertEqual(3, len(manifest.find_input_files(self.command_file)))
+
+    def test_write(self):
+        file = manifest.get_manifest_path(self.path / "O-Default.101.out")
+        _create_manifest(self.command_file, 2.0).write(file)
+
+        data = manifest.read_manifest(file)
+        self.assertEqual("O-Default.101.manifest.json", file.name)
+        self.assertEqual(manifest.hash_file(self.foil_file), data["input_files"][str(self.foil_file)])
+        self.assertEqual(200.0, data["stages"]["main_simu"]["ions_per_s"])
+        self.assertEqual(5, data["results"]["finstat"][1][2])
+        self.assertEqual(1234, data["results"]["nmc"])
+        self.assertEqual(manifest.get_config_hash(), data["config_hash"])
+
+    def test_compare(self):
+        files = []
+        for i, main_elapsed in enumerate((2.0, 2.1, 3.0)):
+            files.append(self.path / f"{i}.manifest.json")
+            _create_manifest(self.command_file, main_elapsed).write(files[-1])
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            problems = manifest.compare_manifests(files)
+        self.assertIn("200 ions/s", output.getvalue())
+        self.assertEqual(1, len(problems))
+        self.assertIn("main_simu", problems[0])
+        self.assertIn("+50.0%", problems[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+
+from numba_mcerd.mcerd import constants, enums
+import numba_mcerd.mcerd.objects as o
+import numba_mcerd.mcerd.objects_convert_dtype as ocd
+import numba_mcerd.mcerd.objects_dtype as od
+
+
+class TestRightSizedDtypes(unittest.TestCase):
+    def setUp(self):
+        self.detector = o.Detector(type=enums.DetectorType.TOF, nfoils=3)
+        self.detector.edet[0] = 7
+        for foil in self.detector.foil[:3]:
+            foil.type = enums.FoilType.CIRC
+            foil.plane.type = enums.PlaneType.GENERAL_PLANE
+        self.detector.vfoil.type = enums.FoilType.RECT
+        self.detector.vfoil.plane.type = enums.PlaneType.GENERAL_PLANE
+
+    def test_ion(self):
+        ions = [o.Ion(status=enums.IonStatus.NOT_FINISHED, type=enums.IonType.PRIMARY) for _ in range(2)]
+        ions[1].I.n = 2
+        ions[1].I.A[1] = 2.5
+        ions[1].Ed[2] = 1.5
+        ions[1].hit[2].x = 3.0
+
+        converted = ocd.convert_ions(ions, self.detector)
+
+        self.assertEqual((2,), converted.shape)
+        self.assertEqual((2,), converted.dtype["I"]["A"].shape)
+        self.assertEqual((3,), converted.dtype["hit"].shape)
+        self.assertEqual((2,), converted.dtype["dt"].shape)
+        self.assertLess(converted.dtype.itemsize, od.Ion.itemsize)
+        self.assertEqual(2.5, converted[1]["I"]["A"][1])
+        self.assertEqual(1.5, converted[1]["Ed"][2])
+        self.assertEqual(3.0, converted[1]["hit"][2]["x"])
+
+    def test_detector(self):
+        detector = ocd.convert_detector(self.detector)
+
+        self.assertEqual((3,), detector.foil.shape)
+        self.assertEqual((1,), detector.edet.shape)
+        self.assertEqual(7, detector.edet[0])
+        self.assertEqual(enums.FoilType.CIRC, detector.foil[2].type)
+
+    def test_target_layer(self):
+        layer_dtype = od.get_target_layer_dtype(atom_count=2, sto_count=3, sto_length=10, prefix_length=4)
+        self.assertEqual((3,), layer_dtype["sto"].shape)
+        self.assertEqual((10,), layer_dtype["sto"].base["vel"].shape)
+        self.assertLess(layer_dtype.itemsize, od.Target_layer.itemsize)
+
+        layer = o.Target_layer(natoms=2, type=enums.TargetType.FILM, stofile_prefix="H")
+        layer.N[1] = 5.0
+        layer.sto = [o.Target_sto(vel=[float(i) for i in range(constants.MAXSTO)], n_sto=10) for _ in range(3)]
+        converted = ocd.convert_target_layer(layer, layer_dtype)
+        self.assertEqual(5.0, converted.N[1])
+        np.testing.assert_array_equal(np.arange(10.0), converted.sto[2]["vel"])
+
+    def test_float32_tables(self):
+        sto_dtype = od.get_target_sto_dtype(10, np.float32)
+        self.assertEqual(np.float32, sto_dtype["sto"].base)
+        self.assertEqual(np.float64, sto_dtype["stodiv"])
+
+        sto = o.Target_sto(vel=[0.1 * i for i in range(constants.MAXSTO)], stodiv=10.0, n_sto=10)
+        converted = ocd.convert_target_sto(sto, sto_dtype)
+        np.testing.assert_allclose(0.1 * np.arange(10), converted.vel, rtol=1e-7)
+
+    def test_record_sizes(self):
+        report = od.format_record_sizes({"g": np.zeros(4, dtype=od.Global)})
+        self.assertIn(f"{od.Global.itemsize:>12}{4:>8}{4 * od.Global.itemsize:>14}", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+import numba_mcerd.mcerd.constants as c
+from numba_mcerd import list_conversion as lc
+from numba_mcerd.mcerd import counters_jit, enums, output_jit
+from numba_mcerd.mcerd import objects_dtype as od
+
+
+def _create_global() -> np.ndarray:
+    g = np.zeros(1, dtype=od.Global)[0].view(np.recarray)
+    g["output_trackpoints"] = True
+    g["simtype"] = enums.SimType.ERD
+    g["simstage"] = enums.SimStage.REAL
+    g["recwidth"] = enums.RecWidth.NARROW
+    return g
+
+
+def _create_counters(cion: int) -> np.ndarray:
+    counters = counters_jit.create_counters(1)[0]
+    counters["cion"] = cion
+    return counters
+
+
+def _create_track_buffer(g: np.ndarray, length: int) -> np.ndarray:
+    with mock.patch("numba_mcerd.config.TRACKPOINT_BUFFER_SIZE", length), \
+            mock.patch("numba_mcerd.config.TRACKPOINT_SAMPLING", 10):
+        return output_jit.create_track_buffer(g)
+
+
+def _create_target() -> np.ndarray:
+    target = np.zeros(1, dtype=od.Target)[0]
+    target["ntarget"] = 2
+    return target
+
+
+def _slow_down(g, counters, ion, target, track_buf, energies) -> None:
+    """Add trackpoints for an ion with given energies (MeV)"""
+    for E in energies:
+        ion["E"] = E * c.C_MEV
+        ion["p"]["z"] += 1.0 * c.C_NM
+        output_jit.output_trackpoint(g, counters, ion, target, track_buf, False)
+
+
+class TestTrackpoints(unittest.TestCase):
+    def setUp(self):
+        self.target = _create_target()
+        self.ion = np.zeros(1, dtype=od.Ion)[0]
+        self.ion["type"] = enums.IonType.SECONDARY
+
+    def test_thinning(self):
+        g = _create_global()
+        counters = _create_counters(20)
+        track_buf = _create_track_buffer(g, 100)
+
+        self.ion["E"] = 1.0 * c.C_MEV
+        output_jit.start_track(g, counters, self.ion, self.target, track_buf)
+        # Every third energy is at least an interval lower than the previous point
+        _slow_down(g, counters, self.ion, self.target, track_buf, 1.0 - 0.004 * np.arange(1, 226))  # 10 keV interval
+        _slow_down(g, counters, self.ion, self.target, track_buf, 0.045 - 0.0004 * np.arange(30))  # 1 keV interval
+
+        points = track_buf["points"][:track_buf["count"]]
+        self.assertEqual(1 + 75 + 10, track_buf["count"])
+        self.assertTrue(np.all(points["trackid"] == 21 * 10000 + 1))
+        np.testing.assert_allclose(points["E"][:3], [1.0, 0.988, 0.976], atol=1e-6)
+        np.testing.assert_allclose(points["E"][75:78], [0.1, 0.045, 0.0438], atol=1e-6)
+
+    def test_layer_change(self):
+        g = _create_global()
+        counters = _create_counters(0)
+        track_buf = _create_track_buffer(g, 100)
+
+        output_jit.start_track(g, counters, self.ion, self.target, track_buf)
+        output_jit.output_trackpoint(g, counters, self.ion, self.target, track_buf, True)  # Duplicate is skipped
+        self.ion["tlayer"] = 2  # First detector layer, lab coordinates are used
+        self.ion["lab"]["p"]["x"] = 3.0 * c.C_NM
+        output_jit.output_trackpoint(g, counters, self.ion, self.target, track_buf, False)
+
+        self.assertEqual(2, track_buf["count"])
+        self.assertEqual(2, track_buf["points"][1]["layer"])
+        self.assertAlmostEqual(3.0, track_buf["points"][1]["x"], places=5)
+
+    def test_sampling(self):
+        g = _create_global()
+        track_buf = _create_track_buffer(g, 100)
+        for cion in range(25):
+            output_jit.output_trackpoint(g, _create_counters(cion), self.ion, self.target, track_buf, True)
+        self.assertEqual(3, track_buf["count"])  # Ions 0, 10 and 20
+
+        counters = _create_counters(0)
+        g["simstage"] = enums.SimStage.PRE
+        output_jit.output_trackpoint(g, counters, self.ion, self.target, track_buf, True)
+        self.assertEqual(0, output_jit.get_trackid(g, counters, self.ion, track_buf))
+        self.assertEqual(3, track_buf["count"])
+
+    def test_recoil_tracks(self):
+        g = _create_global()
+        counters = _create_counters(0)
+        track_buf = _create_track_buffer(g, 100)
+        primary_ion = np.zeros(1, dtype=od.Ion)[0]
+        output_jit.start_track(g, counters, primary_ion, self.target, track_buf)
+        for _ in range(2):
+            output_jit.start_track(g, counters, self.ion, self.target, track_buf)
+
+        np.testing.assert_array_equal([10000, 10001, 10002], track_buf["points"]["trackid"][:3])
+
+
+class TestWriteTrackBuffer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file = output_jit.get_track_path(Path(self.tmp_dir.name) / "O-Default.101.track")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ring_buffer(self):
+        g = _create_global()
+        counters = _create_counters(0)
+        track_buf = _create_track_buffer(g, 4)
+        ion = np.zeros(1, dtype=od.Ion)[0]
+        target = _create_target()
+        for i in range(6):
+            ion["E"] = (10 - i) * c.C_MEV
+            ion["time"] = i * c.C_NS
+            output_jit.output_trackpoint(g, counters, ion, target, track_buf, True)
+
+        with self.assertLogs(level="WARNING"):
+            output_jit.write_track_buffer(g, track_buf, self.file)
+        self.assertEqual(0, track_buf["count"])
+        ion["time"] = 6.0 * c.C_NS
+        ion["E"] = 4.0 * c.C_MEV
+        output_jit.output_trackpoint(g, counters, ion, target, track_buf, True)
+        output_jit.write_track_buffer(g, track_buf, self.file)
+
+        header, points = lc.read_track_file(self.file)
+        self.assertEqual(".trackb", self.file.suffix)
+        self.assertEqual(od.Trackpoint, points.dtype)
+        np.testing.assert_allclose([2.0, 3.0, 4.0, 5.0, 6.0], points["time"])
+
+
+if __name__ == "__main__":
+    unittest.main()
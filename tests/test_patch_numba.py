@@ -28,10 +28,12 @@ class MyTestCase(unittest.TestCase):
         point_container = np.zeros(1, PointContainer)[0]
 
         foo.py_func(point_container)
-        self.assertRaisesRegex(
-            AttributeError, "'Record' object has no attribute 'bitwidth'", foo, point_container)
+        if patch_numba.needs_nested_array_patch():
+            self.assertRaisesRegex(
+                AttributeError, "'Record' object has no attribute 'bitwidth'", foo, point_container)
 
         patch_numba.patch_nested_array()
+        self.assertFalse(patch_numba.needs_nested_array_patch())
 
         foo.py_func(point_container)
         foo(point_container)  # No AttributeError
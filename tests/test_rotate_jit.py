@@ -0,0 +1,43 @@
+import math
+import unittest
+
+import numpy as np
+
+from numba_mcerd.mcerd import ion_simu_jit, rotate_jit
+from numba_mcerd.mcerd import objects_dtype as od
+
+
+class TestRotateDirection(unittest.TestCase):
+    def test_get_angles(self):
+        for theta, fii in ((0.3, 5.0), (1.2, 0.1), (math.pi / 2.0, math.pi)):
+            x, y, z = rotate_jit.get_direction(theta, fii)
+            self.assertAlmostEqual(1.0, x**2 + y**2 + z**2)
+            out_theta, out_fii = rotate_jit.get_angles(x, y, z)
+            self.assertAlmostEqual(theta, out_theta)
+            self.assertAlmostEqual(fii, out_fii)
+
+    def test_rotate_direction(self):
+        theta2, fii2 = 0.7, 2.1
+        for theta1, fii1 in ((0.0, 0.0), (0.2, 4.0), (2.5, 1.0)):
+            expected = rotate_jit.get_direction(*rotate_jit.rotate(theta2, fii2, theta1, fii1))
+            result = rotate_jit.rotate_direction(
+                math.cos(theta2), math.sin(theta2), math.cos(fii2), math.sin(fii2),
+                *rotate_jit.get_direction(theta1, fii1))
+            for e, r in zip(expected, result):
+                self.assertAlmostEqual(e, r)
+
+    def test_ion_rotate_dircos(self):
+        ion = np.zeros(1, dtype=od.Ion)[0]
+        ion_dircos = np.zeros(1, dtype=od.Ion)[0]
+        ion_simu_jit.set_direction(ion, 0.3, 5.0)
+        ion_simu_jit.set_direction(ion_dircos, 0.3, 5.0)
+
+        for cos_theta, fii in ((0.99, 1.0), (0.5, 6.0), (-0.2, 3.0), (1.0, 0.0)):
+            ion_simu_jit.ion_rotate(ion, cos_theta, fii)
+            ion_simu_jit.ion_rotate_dircos(ion_dircos, cos_theta, fii)
+        ion_simu_jit.update_angles(ion_dircos)
+
+        self.assertAlmostEqual(ion["theta"], ion_dircos["theta"])
+        self.assertAlmostEqual(ion["fii"], ion_dircos["fii"])
+        self.assertAlmostEqual(ion["opt"]["cos_theta"], ion_dircos["opt"]["cos_theta"])
+        self.assertAlmostEqual(ion["opt"]["sin_theta"], ion_dircos["opt"]["sin_theta"])
@@ -0,0 +1,46 @@
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from numba_mcerd import config, run
+from numba_mcerd.mcerd import random_vanilla
+
+
+class TestRun(unittest.TestCase):
+    def test_defaults(self):
+        options = run.parse_args(["run.py"])
+        self.assertEqual("mt", options.engine)
+        self.assertIsNone(options.command_file)
+        self.assertIsNone(options.threads)
+
+    def test_invalid_options(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                run.parse_args(["run.py", "--engine", "jit", "--output-format", "mmap"])
+            with self.assertRaises(SystemExit):
+                run.parse_args(["run.py", "--engine", "serial", "--output-format", "binary"])
+            with self.assertRaises(SystemExit):
+                run.parse_args(["run.py", "--threads", "0"])
+            with self.assertRaises(SystemExit):
+                run.parse_args(["run.py", "--engine", "process"])
+
+    @mock.patch.multiple(config, PARALLEL_THREAD_COUNT=None, SEED=None, OUTPUT_FORMAT="text",
+                         CACHE_ROOT=config.CACHE_ROOT, rand=config.rand)
+    def test_configure(self):
+        options = run.parse_args(["run.py", "input/O-Default", "--engine", "jit", "--threads", "2",
+                                  "--seed", "7", "--output-format", "binary", "--cache-dir", "/tmp/jibal"])
+        run.configure(options)
+        self.assertEqual(2, config.PARALLEL_THREAD_COUNT)
+        self.assertEqual(7, config.SEED)
+        self.assertEqual("binary", config.OUTPUT_FORMAT)
+        self.assertEqual("/tmp/jibal", config.CACHE_ROOT)
+
+        run.configure(run.parse_args(["run.py", "--engine", "serial", "--rng", "vanilla"]))
+        self.assertIs(random_vanilla, config.rand)
+
+    def test_project_root(self):
+        self.assertTrue((Path(config.PROJECT_ROOT) / "numba_mcerd" / "config.py").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from numba_mcerd import list_conversion as lc, run_log
+
+
+class TestRunLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_buffering(self):
+        out_file = self.path / "O-Default.101.out"
+        out_file.write_text("start\n")
+        dat_file = self.path / "O-Default.101.dat"
+
+        log = run_log.RunLog(buffer_size=10)
+        log.write(out_file, "a\n")
+        log.write(str(dat_file), "b\n")
+        self.assertEqual("start\n", out_file.read_text())  # Not written yet
+        log.writelines(out_file, ["c" * 5 + "\n", "d" * 5 + "\n"])
+        self.assertEqual("start\na\nccccc\nddddd\n", out_file.read_text())
+        log.write(out_file, "e\n")
+        log.close()
+
+        self.assertEqual("start\na\nccccc\nddddd\ne\n", out_file.read_text())
+        self.assertEqual("b\n", dat_file.read_text())
+
+    def test_overwrite(self):
+        pre_file = self.path / "O-Default.101.pre.gz"
+        with lc.open_text(pre_file, "w") as f:
+            f.write("old\n")
+
+        with run_log.RunLog() as log:
+            log.write(pre_file, "skipped\n")
+            log.open(pre_file, "w")
+            log.writelines(pre_file, ["1.0 2.0\n", "3.0 4.0\n"])
+
+        with lc.open_text(pre_file) as f:
+            self.assertEqual("1.0 2.0\n3.0 4.0\n", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+import numba as nb
+import numpy as np
+
+from numba_mcerd import threading_info
+from numba_mcerd.mcerd import objects_dtype as od
+
+
+@nb.njit(parallel=True, nogil=True)
+def _reserve_rows(cursor: np.ndarray, count: int) -> np.ndarray:
+    rows = np.zeros(count, dtype=np.int64)
+    for i in nb.prange(count):
+        rows[i] = threading_info.atomic_add(cursor, 0, 1)
+    return rows
+
+
+class TestAtomicAdd(unittest.TestCase):
+    def test_previous_value(self):
+        cursor = np.array([0, 10], dtype=np.int64)
+        self.assertEqual(10, _reserve_rows(cursor[1:], 1)[0])
+        self.assertEqual(11, cursor[1])
+        self.assertEqual(0, cursor[0])
+
+    def test_unique_rows(self):
+        cursor = np.zeros(1, dtype=np.int64)
+        rows = _reserve_rows(cursor, 100_000)
+        self.assertEqual(100_000, cursor[0])
+        np.testing.assert_array_equal(np.arange(100_000), np.sort(rows))
+
+
+@nb.njit(parallel=True, nogil=True)
+def _fill_slots(slot_count: int, start: int, stop: int) -> np.ndarray:
+    slots = np.full(stop, -1, dtype=np.int64)
+    for slot in nb.prange(slot_count):
+        slot_start, slot_stop = threading_info.get_slot_range(slot, slot_count, start, stop)
+        for i in range(slot_start, slot_stop):
+            slots[i] = slot
+    return slots
+
+
+class TestSlots(unittest.TestCase):
+    def test_slot_range(self):
+        ranges = [threading_info.get_slot_range(slot, 4, 10, 20) for slot in range(4)]
+        self.assertEqual([(10, 12), (12, 15), (15, 17), (17, 20)], ranges)
+        self.assertEqual(3, threading_info.get_slot_length(4, 10))
+        self.assertEqual((5, 5), threading_info.get_slot_range(2, 3, 5, 5))
+
+    def test_parallel_slots(self):
+        for thread_count in {1, threading_info.get_thread_count()}:
+            slots = _fill_slots(thread_count, 3, 1003)
+            np.testing.assert_array_equal(-1, slots[:3])
+            self.assertTrue(np.all(np.diff(slots[3:]) >= 0))  # Contiguous parts in slot order
+            self.assertEqual(thread_count, len(np.unique(slots[3:])))
+
+
+def _get_buffer(array: np.ndarray) -> np.ndarray:
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+@nb.njit(parallel=True, nogil=True)
+def _read_recpar(target_shared: np.ndarray, slot_count: int) -> np.ndarray:
+    values = np.zeros(slot_count)
+    for slot in nb.prange(slot_count):
+        target = target_shared[0]
+        values[slot] = target.recpar[1].y
+    return values
+
+
+class TestShareRecords(unittest.TestCase):
+    def setUp(self):
+        self.target = np.zeros(1, dtype=od.Target)[0].view(np.recarray)
+        self.target.recpar[1].y = 1.0
+        self.scat = np.zeros((2, 3), dtype=od.Scattering).view(np.recarray)
+        self.scat[1, 2].a = 2.0
+
+    def test_layout(self):
+        shared = threading_info.share_records({"target": self.target, "scat": self.scat})
+        self.assertEqual((1,), shared["target"].shape)
+        self.assertEqual((1, 2, 3), shared["scat"].shape)
+        self.assertEqual(1.0, shared["target"][0].recpar[1].y)
+        self.assertEqual(2.0, shared["scat"][0][1, 2].a)
+        self.assertIs(_get_buffer(shared["target"]), _get_buffer(shared["scat"]))
+        for array in shared.values():
+            self.assertEqual(0, array.ctypes.data % od.CACHE_LINE_SIZE)
+
+    def test_updates_are_shared(self):
+        shared = threading_info.share_records({"target": self.target})
+        target = shared["target"][0]
+        self.target.recpar[1].y = 3.0  # The original is not shared
+        target.recpar[1].y = 4.0  # E.g. init_recoiling_angle() between stages
+        np.testing.assert_array_equal(4.0, _read_recpar(shared["target"], threading_info.get_thread_count()))
+
+
+if __name__ == "__main__":
+    unittest.main()
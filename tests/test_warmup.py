@@ -0,0 +1,90 @@
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+from unittest import mock
+
+from numba.core import event as ev
+
+from numba_mcerd import config, threading_info, warmup
+
+
+INPUT_DIR = Path(config.PROJECT_ROOT) / "data" / "input"
+
+
+def _compile_event(dispatcher, status):
+    return ev.Event("numba:compile", status, data={"dispatcher": dispatcher})
+
+
+class TestWarmup(unittest.TestCase):
+    def test_compile_times(self):
+        outer = threading_info.get_slot_range
+        inner = threading_info.get_thread_id
+        records = [
+            (1.0, _compile_event(outer, ev.EventStatus.START)),
+            (2.0, _compile_event(inner, ev.EventStatus.START)),
+            (2.5, _compile_event(inner, ev.EventStatus.END)),
+            (4.0, _compile_event(outer, ev.EventStatus.END)),
+            (5.0, _compile_event(inner, ev.EventStatus.START)),
+            (5.25, _compile_event(inner, ev.EventStatus.END))
+        ]
+        self.assertEqual({outer: 3.0, inner: 0.75}, warmup.get_compile_times(records))
+
+    def test_function_info(self):
+        threading_info.get_thread_count()  # Launches Numba threads, needed by get_thread_id
+        threading_info.get_thread_id()
+        infos = {info.name: info for info in warmup.collect_function_info([])}
+
+        dispatchers = warmup.find_dispatchers()
+        self.assertIs(threading_info.get_slot_range, dispatchers["numba_mcerd.threading_info.get_slot_range"])
+        self.assertTrue(warmup.is_cacheable(threading_info.get_slot_range))
+        info = infos["numba_mcerd.threading_info.get_thread_id"]
+        self.assertFalse(info.cacheable)
+        self.assertEqual(1, info.signatures)
+
+    def test_uncached_names(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            warnings.warn('Cannot cache compiled function "simulation_loop" as it uses dynamic globals')
+            warnings.warn("Unrelated warning")
+        self.assertEqual({"simulation_loop"}, warmup.find_uncached_names(caught))
+
+    def test_cache_misses(self):
+        infos = [
+            warmup.FunctionInfo("loaded", 1, 0.0, True, 1, 0),
+            warmup.FunctionInfo("compiled", 1, 0.5, True, 0, 1),
+            warmup.FunctionInfo("uncacheable", 1, 0.5, False, 0, 1)
+        ]
+        self.assertEqual(["compiled"], warmup.find_cache_misses(infos))
+
+
+class TestWarmupOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+        for file in INPUT_DIR.glob("O-Default*"):
+            text = file.read_text().replace("..\\data\\input\\", f"{self.path}/")
+            text = text.replace("ions: 1000000", "ions: 2000").replace("presimulation: 100000", "presimulation: 400")
+            (self.path / file.name).write_text(text)
+        self.command_file = self.path / "O-Default"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_outputs_unchanged(self):
+        outputs = {self.path / f"O-Default.101{suffix}": f"Previous run {suffix}\n"
+                   for suffix in (".out", ".dat", ".erd", ".range", ".pre", ".track")}
+        for file, text in outputs.items():
+            file.write_text(text)
+        input_files = {file.name for file in self.path.iterdir()}
+
+        with mock.patch.object(config, "CACHE_ROOT", str(self.path / "cache")):
+            warmup.warm_up("main_jit", str(self.command_file))
+
+        for file, text in outputs.items():
+            self.assertEqual(text, file.read_text())
+        self.assertEqual(input_files | {"cache"}, {file.name for file in self.path.iterdir()})
+
+
+if __name__ == "__main__":
+    unittest.main()